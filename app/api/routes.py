@@ -1,14 +1,26 @@
 from fastapi import APIRouter, Request, UploadFile, File, HTTPException
 from app.services.whatsapp_service import WhatsAppService
-from app.services.rag_service import RAGService
-from app.services.function_service import FunctionService
+from app.services.queue_service import create_message_queue, QueueFullError
+from app.services.ingest_jobs import IngestJobManager
+from app.services.session_store import create_session_store
+from app.services.intent_router import IntentRouter
+from app.services.dedup import create_deduplicator
+from app.services.coalescer import MessageCoalescer
+from app.utils.latency import LatencyStats
 from app.core.config import get_settings
+from app.core import metrics
 from typing import Dict, Any, Optional
+import asyncio
 import uuid
 import json
 import logging
 import os
+import signal
+import tempfile
+import time
 from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+import shutil
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,10 +32,26 @@ settings = get_settings()
 # WhatsApp webhook verify token
 VERIFY_TOKEN = "123123123"
 
-# Initialize services
-whatsapp_service = WhatsAppService()
-rag_service = RAGService(None)  # We'll update this when Redis is configured
-function_service = FunctionService()
+# Services are built by start_services() in the application lifespan, not on
+# import, so importing the app does not pull in langchain or load the index
+whatsapp_service = None
+rag_service = None
+function_service = None
+intent_router = None
+deduplicator = None
+ingest_jobs = None
+coalescer = None
+message_queue = None
+
+# Startup phase durations; /ready reports 503 until warmup has finished
+startup: Dict[str, Any] = {"ready": False, "build_ms": None, "warmup_ms": {}}
+warmup_task: Optional[asyncio.Task] = None
+
+# Time from starting to process a message to its first reply being sent
+reply_ttfm = LatencyStats()
+
+# Uploads are copied to disk in 1 MiB chunks
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 @router.get("/webhook/whatsapp")
 async def verify_webhook(request: Request):
@@ -35,79 +63,301 @@ async def verify_webhook(request: Request):
         return PlainTextResponse(params.get("hub.challenge"))
     return PlainTextResponse("Verification token mismatch", status_code=403)
 
+async def process_message(job: Dict[str, Any]):
+    """Generate and send the reply for a queued WhatsApp message"""
+    from_number = job["from_number"]
+    message_text = job["message_text"]
+    
+    # Generate session ID using just the phone number for consistent conversation
+    session_id = from_number
+    logger.info(f"Processing message with session ID: {session_id}")
+    
+    # Classify once and answer through a single handler; long answers arrive
+    # paragraph by paragraph and are sent in order while the rest is generated
+    start = time.perf_counter()
+    sent = 0
+    replies = intent_router.route_stream(message_text, session_id)
+    try:
+        async for reply in replies:
+            result = await whatsapp_service.send_message(from_number, reply)
+            if result["status"] == "error":
+                logger.error(f"Failed to send WhatsApp message: {result['error']}")
+                return
+            if not sent:
+                reply_ttfm.add(time.perf_counter() - start)
+            sent += 1
+    finally:
+        # Release the LLM stream if sending stopped early
+        await replies.aclose()
+    
+    logger.info(f"Response sent successfully to {from_number} in {sent} message(s)")
+
+def build_services():
+    """Import and construct the services; the langchain and FAISS imports happen here"""
+    global whatsapp_service, rag_service, function_service, intent_router
+    global deduplicator, ingest_jobs, coalescer, message_queue
+    from app.services.rag_service import RAGService
+    from app.services.function_service import FunctionService
+
+    whatsapp_service = WhatsAppService()
+    rag_service = RAGService()
+    function_service = FunctionService()
+    intent_router = IntentRouter(
+        rag_service,
+        function_service,
+        create_session_store(),
+        stream_replies=settings.STREAM_REPLIES,
+        max_message_chars=settings.WHATSAPP_MAX_BODY_CHARS
+    )
+    deduplicator = create_deduplicator()
+    ingest_jobs = IngestJobManager(rag_service)
+    
+    # Webhook messages are acknowledged immediately and processed by queue workers;
+    # rapid-fire messages from one sender are merged into a single reply
+    coalescer = MessageCoalescer(
+        process_message,
+        window_seconds=settings.COALESCE_WINDOW_SECONDS,
+        max_wait_seconds=settings.COALESCE_MAX_WAIT_SECONDS,
+        max_concurrency=settings.QUEUE_WORKERS
+    )
+    message_queue = create_message_queue(coalescer.submit)
+
+async def ping_redis():
+    """Open a connection in the shared Redis pool if any backend uses Redis"""
+    backends = (
+        settings.QUEUE_BACKEND,
+        settings.DEDUP_BACKEND,
+        settings.SESSION_STORE_BACKEND,
+        settings.CHAT_HISTORY_BACKEND,
+        settings.SEMANTIC_CACHE_BACKEND
+    )
+    if "redis" in backends:
+        from app.core.redis import get_async_redis
+        await get_async_redis().ping()
+
+async def warmup():
+    """Pre-touch the index and open connection pools, then report ready"""
+    async def timed(name: str, step):
+        start = time.perf_counter()
+        try:
+            await step
+        except Exception as e:
+            # A cold first request is better than never becoming ready
+            logger.warning(f"Warmup step {name} failed: {e}")
+        startup["warmup_ms"][name] = round(1000 * (time.perf_counter() - start), 1)
+    
+    start = time.perf_counter()
+    await asyncio.gather(
+        timed("index", asyncio.to_thread(rag_service.warmup)),
+        timed("whatsapp", whatsapp_service.warmup()),
+        timed("redis", ping_redis())
+    )
+    startup["warmup_ms"]["total"] = round(1000 * (time.perf_counter() - start), 1)
+    startup["ready"] = True
+    logger.info(f"Warmup finished in {startup['warmup_ms']['total']}ms")
+
+def startup_status() -> Dict[str, Any]:
+    """Readiness and startup phase durations"""
+    return {"status": "ready" if startup["ready"] else "starting", **startup}
+
+# Wakes the reload loop early when the process receives SIGHUP
+reload_event: Optional[asyncio.Event] = None
+reload_task: Optional[asyncio.Task] = None
+
+async def reload_vector_store_loop():
+    """Pick up newly published vector store snapshots in mmap mode"""
+    interval = settings.VECTOR_STORE_RELOAD_INTERVAL or None
+    while True:
+        try:
+            await asyncio.wait_for(reload_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        reload_event.clear()
+        try:
+            await rag_service.areload_vector_store()
+        except Exception as e:
+            logger.error(f"Error reloading vector store: {e}")
+
+async def start_services():
+    """Build the services, start background workers and warm up; called from the application lifespan"""
+    global reload_event, reload_task, warmup_task
+    start = time.perf_counter()
+    build_services()
+    startup["build_ms"] = round(1000 * (time.perf_counter() - start), 1)
+    logger.info(f"Services built in {startup['build_ms']}ms")
+    await message_queue.start()
+    if settings.VECTOR_STORE_MODE == "mmap":
+        reload_event = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_event.set)
+        except (NotImplementedError, AttributeError, RuntimeError):
+            # Windows, or an event loop outside the main thread
+            logger.warning("SIGHUP reload is unavailable; relying on VECTOR_STORE_RELOAD_INTERVAL")
+        reload_task = asyncio.create_task(reload_vector_store_loop())
+    # Requests are served while warming up; /ready tells load balancers when it is done
+    if settings.WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(warmup())
+    else:
+        startup["ready"] = True
+
+async def stop_services():
+    """Stop background workers; called from the application lifespan"""
+    if warmup_task:
+        warmup_task.cancel()
+    if reload_task:
+        reload_task.cancel()
+    await coalescer.aclose()
+    await message_queue.stop()
+    await rag_service.aflush_history()
+    await whatsapp_service.aclose()
+
 @router.post("/webhook/whatsapp")
 async def whatsapp_webhook(request: Request):
-    """Handle incoming WhatsApp messages"""
-    try:
-        # Parse incoming data
-        data = await request.json()
-        logger.info(f"Received webhook data: {json.dumps(data, indent=2)}")
-        
-        # Extract message
-        message = data["entry"][0]["changes"][0]["value"]["messages"][0]
-        from_number = message["from"]
-        message_text = message["text"]["body"]
+    """Validate and enqueue incoming WhatsApp messages"""
+    body = await request.body()
+    # Status callbacks (sent, delivered, read) carry no messages; drop them before parsing
+    if b'"messages"' not in body:
+        return {"status": "ignored"}
+    
+    with metrics.track(metrics.WEBHOOK_PARSE):
+        try:
+            # Parse incoming data
+            data = json.loads(body)
+            logger.debug(f"Received webhook data: {body!r}")
+        except json.JSONDecodeError:
+            logger.error("Invalid JSON in webhook data")
+            raise HTTPException(status_code=400, detail="Invalid JSON data")
         
-        # Generate session ID using just the phone number for consistent conversation
-        session_id = from_number
-        logger.info(f"Processing message with session ID: {session_id}")
+        # A batched delivery can carry several messages across entries and changes
+        jobs = [
+            {
+                "from_number": message["from_number"],
+                "message_text": message["message"],
+                "message_id": message["message_id"]
+            }
+            for message in whatsapp_service.parse_webhook(data)
+        ]
+    if not jobs:
+        # Non-text messages carry nothing to answer
+        return {"status": "ignored"}
+    
+    queued = duplicates = 0
+    for job in jobs:
+        # Meta redelivers webhooks it considers unacknowledged; answer each message once
+        message_id = job["message_id"]
+        if message_id and await deduplicator.is_duplicate(message_id):
+            logger.info(f"Ignoring duplicate delivery of message {message_id}")
+            duplicates += 1
+            continue
         
-        # Check if it's a simple greeting
-        greetings = ["hi", "hello", "hey", "greetings"]
-        if message_text.lower().strip() in greetings:
-            response = "Hello! How can I assist you with your travel plans today?"
-        else:
-            # Process with RAG
-            rag_response = rag_service.get_response(message_text, session_id)
-            if not rag_response:
-                rag_response = "I apologize, but I'm having trouble processing your request at the moment."
-            
-            # Only use RAG response for general queries
-            response = rag_response
-            
-            # Only use function service for specific actions like booking
-            if any(keyword in message_text.lower() for keyword in ["book", "reserve", "schedule"]):
-                function_response = await function_service.process_message(message_text, session_id)
-                if isinstance(function_response, dict):
-                    function_response = str(function_response.get("output", ""))
-                if function_response and function_response.strip():
-                    response = function_response
-        
-        # Send response back to WhatsApp
-        result = await whatsapp_service.send_message(from_number, response)
-        if result["status"] == "error":
-            logger.error(f"Failed to send WhatsApp message: {result['error']}")
-            raise HTTPException(status_code=500, detail=f"Failed to send response: {result['error']}")
-        
-        logger.info(f"Response sent successfully to {from_number}")
-        return {"status": "success"}
-        
-    except json.JSONDecodeError:
-        logger.error("Invalid JSON in webhook data")
-        raise HTTPException(status_code=400, detail="Invalid JSON data")
-    except Exception as e:
-        logger.error(f"Error processing webhook: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        try:
+            await message_queue.enqueue(job)
+            queued += 1
+        except Exception as e:
+            # Release only this message's claim so the redelivered batch processes it; later
+            # messages were never claimed, and the ones already queued are recognised as duplicates
+            if message_id:
+                await deduplicator.release(message_id)
+            if isinstance(e, QueueFullError):
+                logger.error(f"Rejecting webhook: {e}")
+                raise HTTPException(status_code=503, detail="Message queue is full")
+            logger.error(f"Error enqueuing webhook message: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return {"status": "queued" if queued else "duplicate", "queued": queued, "duplicates": duplicates}
+
+@router.get("/queue/stats")
+async def queue_stats():
+    """Report queue depth, wait-time and burst coalescing statistics"""
+    return {**await message_queue.stats(), "coalescing": coalescer.stats()}
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Report semantic response cache hit rate"""
+    if not rag_service.response_cache:
+        return {"enabled": False}
+    return {"enabled": True, **rag_service.response_cache.stats()}
+
+@router.get("/context/stats")
+async def context_stats():
+    """Report prompt tokens saved by context assembly"""
+    assembler = rag_service.pipeline.assembler
+    if not assembler:
+        return {"enabled": False}
+    return {"enabled": True, **assembler.stats()}
 
-@router.post("/upload/pdf")
+@router.get("/models/stats")
+async def model_stats():
+    """Report per-tier latency, hit ratio, tokens and cost of RAG answers"""
+    cascade = rag_service.pipeline.cascade
+    if not cascade:
+        return {"enabled": False}
+    return {"enabled": True, **cascade.stats()}
+
+@router.get("/webhook/stats")
+async def webhook_stats():
+    """Report duplicate webhook deliveries suppressed"""
+    return deduplicator.stats()
+
+@router.get("/router/stats")
+async def router_stats():
+    """Report per-intent message counts and handler latency"""
+    return intent_router.stats()
+
+@router.get("/delivery/stats")
+async def delivery_stats():
+    """Report time to the LLM's first token and to the first reply message sent"""
+    return {
+        "streaming": settings.STREAM_REPLIES,
+        "ttfb_ms": rag_service.ttfb.summary(),
+        "ttfm_ms": reply_ttfm.summary()
+    }
+
+@router.get("/sessions/stats")
+async def session_stats():
+    """Report resident conversation sessions and history size"""
+    return rag_service.memory.stats()
+
+@router.post("/upload/pdf", status_code=202)
 async def upload_pdf(file: UploadFile = File(...)):
-    """Upload a PDF file for processing"""
+    """Stream a PDF to disk and ingest it in a background job"""
+    if settings.VECTOR_STORE_MODE == "mmap":
+        raise HTTPException(status_code=409, detail="Vector store is read-only in mmap mode; ingest with ingest.py")
+    filename = os.path.basename(file.filename or "")
+    if not filename.lower().endswith(".pdf") or filename.startswith("."):
+        raise HTTPException(status_code=400, detail="Upload needs a filename ending in .pdf")
+    tmp_path = None
     try:
         # Create uploads directory if it doesn't exist
         os.makedirs("data/uploads", exist_ok=True)
         
-        # Save the uploaded file
-        file_path = f"data/uploads/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Process the PDF
-        success = rag_service.add_document(file_path)
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to process PDF")
+        # Stream the upload to its own temporary file in chunks instead of reading it into memory,
+        # so concurrent uploads of the same name never write to the same file
+        file_path = os.path.join("data/uploads", filename)
+        with tempfile.NamedTemporaryFile(dir="data/uploads", prefix=f".{filename}.", suffix=".part", delete=False) as buffer:
+            tmp_path = buffer.name
+            await run_in_threadpool(shutil.copyfileobj, file.file, buffer, UPLOAD_CHUNK_SIZE)
+        os.replace(tmp_path, file_path)
+        tmp_path = None
         
-        return {"message": "PDF processed successfully"}
+        # Process the PDF in the background
+        job = ingest_jobs.submit(file_path)
+        return {
+            "message": "PDF accepted for processing",
+            "job_id": job["job_id"],
+            "status_url": f"/api/upload/status/{job['job_id']}"
+        }
     except Exception as e:
         logger.error(f"Error processing PDF: {e}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+@router.get("/upload/status/{job_id}")
+async def upload_status(job_id: str):
+    """Report progress of a background ingestion job"""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job ID")
+    return job
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import weakref
+from contextlib import aclosing
+from typing import AsyncIterator
+from app.core import metrics
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Marks the end of a buffered LLM stream
+_DONE = object()
+
+# One semaphore per event loop: an asyncio.Semaphore binds to the first loop
+# that waits on it, and the sync entry points run their own loops via asyncio.run()
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_llm_semaphores_lock = threading.Lock()
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """Cap on concurrent LLM calls within the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _llm_semaphores_lock:
+        semaphore = _llm_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = _llm_semaphores[loop] = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        return semaphore
+
+async def stream_llm(stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Run an LLM stream under the LLM semaphore and yield its chunks outside it
+
+    The model is drained into a queue by a background task, so the slot is
+    released as soon as generation finishes, however long the caller takes
+    to send each chunk on. Closing the generator early cancels the model call.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async with aclosing(stream), get_llm_semaphore():
+                with metrics.track(metrics.LLM):
+                    async for chunk in stream:
+                        queue.put_nowait(chunk)
+        finally:
+            queue.put_nowait(_DONE)
+
+    task = asyncio.create_task(pump())
+    try:
+        while (chunk := await queue.get()) is not _DONE:
+            yield chunk
+        # Re-raise the model's error, if it failed
+        await task
+    finally:
+        task.cancel()
@@ -13,23 +13,120 @@ class Settings(BaseSettings):
     
     # Redis Configuration
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    REDIS_MAX_CONNECTIONS: int = 50
     
     # Vector Store Configuration
     VECTOR_STORE_PATH: str = "data/vector_store"
+    VECTOR_STORE_MAX_SHARDS: int = 32
+    # "readwrite" loads a private index; "mmap" serves the published snapshot read-only
+    VECTOR_STORE_MODE: str = "readwrite"
+    VECTOR_STORE_RELOAD_INTERVAL: float = 30.0
+    
+    # FAISS index type: flat, ivf_flat, ivf_pq or hnsw
+    FAISS_INDEX_TYPE: str = "flat"
+    FAISS_NLIST: int = 100
+    FAISS_NPROBE: int = 10
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_CONSTRUCTION: int = 200
+    FAISS_HNSW_EF_SEARCH: int = 64
+    FAISS_PQ_BYTES: int = 16
     
     # WhatsApp Configuration
     WHATSAPP_ACCESS_TOKEN: str = os.getenv("WHATSAPP_ACCESS_TOKEN", "")
     WHATSAPP_PHONE_NUMBER_ID: str = os.getenv("WHATSAPP_PHONE_NUMBER_ID", "")
     WHATSAPP_WEBHOOK_SECRET: str = os.getenv("WHATSAPP_WEBHOOK_SECRET", "")
+    WHATSAPP_API_BASE_URL: str = "https://graph.facebook.com/v17.0"
+    
+    # Outbound HTTP client (shared connection pool to the Graph API)
+    WHATSAPP_HTTP2: bool = True
+    WHATSAPP_MAX_CONNECTIONS: int = 100
+    WHATSAPP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    WHATSAPP_KEEPALIVE_EXPIRY: float = 60.0
+    WHATSAPP_CONNECT_TIMEOUT: float = 5.0
+    WHATSAPP_READ_TIMEOUT: float = 20.0
+    # Longer replies are split into several messages
+    WHATSAPP_MAX_BODY_CHARS: int = 4096
+    # Send RAG answers paragraph by paragraph while they are generated
+    STREAM_REPLIES: bool = True
     
     # LLM Configuration
     MODEL_NAME: str = "gpt-4-turbo-preview"
+    # RAG answers try the fast model first and escalate to MODEL_NAME when needed
+    MODEL_CASCADE_ENABLED: bool = True
+    FAST_MODEL_NAME: str = "gpt-3.5-turbo"
+    # Below this top dense cosine similarity questions go straight to MODEL_NAME (BM25 scores are not compared)
+    CASCADE_MIN_RETRIEVAL_SCORE: float = 0.3
+    # Characters of the fast answer checked for "I don't know" before it is sent
+    CASCADE_PROBE_CHARS: int = 200
+    # USD per 1K tokens, for cost counters
+    MODEL_INPUT_COST_PER_1K: float = 0.01
+    MODEL_OUTPUT_COST_PER_1K: float = 0.03
+    FAST_MODEL_INPUT_COST_PER_1K: float = 0.0005
+    FAST_MODEL_OUTPUT_COST_PER_1K: float = 0.0015
     EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    LLM_MAX_CONCURRENCY: int = 16
+    
+    # Message Queue Configuration
+    QUEUE_BACKEND: str = "redis" if os.getenv("REDIS_URL") else "memory"
+    QUEUE_WORKERS: int = 4
+    QUEUE_MAX_SIZE: int = 1000
+    QUEUE_STREAM_KEY: str = "whatsapp:queue:messages"
+    QUEUE_CONSUMER_GROUP: str = "whatsapp-workers"
+    # Redis entries unacknowledged this long are redelivered to another worker; also the reclaim interval
+    QUEUE_CLAIM_IDLE_MS: int = 60000
+    # Messages from one sender within this window are answered together (0 disables)
+    COALESCE_WINDOW_SECONDS: float = 1.0
+    COALESCE_MAX_WAIT_SECONDS: float = 5.0
     
     # RAG Configuration
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
     
+    # Hybrid retrieval: BM25 + dense candidates merged by reciprocal-rank fusion
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_CANDIDATES: int = 20
+    HYBRID_RRF_K: int = 60
+    # A BM25 top hit matching this much of the query (0 disables) and this far ahead skips the embedding call
+    LEXICAL_FAST_PATH_MIN_COVERAGE: float = 0.8
+    LEXICAL_FAST_PATH_MARGIN: float = 1.5
+    
+    # Context assembly: chunks retrieved per question, merged and trimmed to a token budget
+    RETRIEVAL_K: int = 8
+    CONTEXT_ASSEMBLY_ENABLED: bool = True
+    CONTEXT_TOKEN_BUDGET: int = 1500
+    CONTEXT_MMR_LAMBDA: float = 0.7
+    
+    # Webhook deduplication on WhatsApp message ID
+    DEDUP_BACKEND: str = "redis" if os.getenv("REDIS_URL") else "memory"
+    DEDUP_TTL_SECONDS: int = 86400
+    DEDUP_MAX_LOCAL_ENTRIES: int = 10000
+    
+    # Session counters (first message vs returning customer)
+    SESSION_STORE_BACKEND: str = "redis" if os.getenv("REDIS_URL") else "memory"
+    SESSION_STORE_TTL_SECONDS: int = 2592000
+    
+    # Conversation Memory ("redis" shares history across workers and nodes)
+    CHAT_HISTORY_BACKEND: str = "redis" if os.getenv("REDIS_URL") else "memory"
+    SESSION_MAX_SESSIONS: int = 10000
+    SESSION_TTL_SECONDS: int = 86400
+    HISTORY_MAX_TOKENS: int = 1000
+    HISTORY_MAX_TURNS: int = 20
+    # Fold turns trimmed from the history into a running LLM summary
+    HISTORY_SUMMARY_ENABLED: bool = False
+    
+    # Semantic Response Cache
+    SEMANTIC_CACHE_ENABLED: bool = True
+    # "redis" shares cached answers across workers and nodes
+    SEMANTIC_CACHE_BACKEND: str = "memory"
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000
+    SEMANTIC_CACHE_TTL_SECONDS: int = 86400
+    
+    # Startup: pre-touch the index and open connection pools before /ready reports ready
+    WARMUP_ENABLED: bool = True
+    
     class Config:
         case_sensitive = True
 
@@ -0,0 +1,128 @@
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import get_buffer_string
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from app.utils.tokens import count_tokens
+import os
+import time
+
+# Pipeline stages timed for every message; "queue" is the time a job waits for a
+# worker, and its errors are jobs whose handler failed
+WEBHOOK_PARSE = "webhook_parse"
+QUEUE = "queue"
+SESSION = "session"
+ROUTING = "routing"
+EMBED = "embed"
+SEARCH = "search"
+LLM = "llm"
+TOOL = "tool"
+SEND = "send"
+STAGES = (WEBHOOK_PARSE, QUEUE, SESSION, ROUTING, EMBED, SEARCH, LLM, TOOL, SEND)
+
+# From sub-millisecond stages (routing, search) up to long LLM generations
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "travelbot_stage_duration_seconds",
+    "Time spent in each message-handling stage",
+    ["stage"],
+    buckets=BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "travelbot_stage_errors_total",
+    "Failures in each message-handling stage",
+    ["stage"]
+)
+MESSAGES = Counter(
+    "travelbot_messages_total",
+    "Messages answered, by intent and outcome",
+    ["intent", "outcome"]
+)
+LLM_TOKENS = Counter(
+    "travelbot_llm_tokens_total",
+    "LLM tokens used by every model call, by model and direction",
+    ["model", "direction"]
+)
+QUEUE_DEPTH = Gauge(
+    "travelbot_queue_depth",
+    "Messages waiting in the queue",
+    multiprocess_mode="livemax"
+)
+
+# Label lookups are done once, so timing a stage costs one observe() call
+_stage_seconds = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+_stage_errors = {stage: STAGE_ERRORS.labels(stage) for stage in STAGES}
+
+
+def observe(stage: str, seconds: float):
+    _stage_seconds[stage].observe(seconds)
+
+
+def record_error(stage: str):
+    _stage_errors[stage].inc()
+
+
+@contextmanager
+def track(stage: str):
+    """Time a block as one stage, counting an error if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        _stage_errors[stage].inc()
+        raise
+    finally:
+        _stage_seconds[stage].observe(time.perf_counter() - start)
+
+
+def record_tokens(model: str, input_tokens: int, output_tokens: int):
+    LLM_TOKENS.labels(model, "input").inc(input_tokens)
+    LLM_TOKENS.labels(model, "output").inc(output_tokens)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Records the tokens of every call made by the chat model it is attached to
+
+    Covers answers, condensing, history summaries and agent steps alike. The
+    provider's usage is used when it reports one; streamed calls are counted
+    locally, including the partial output of a stream closed early.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        # run_id -> (model, input tokens)
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or "unknown"
+        self._runs[run_id] = (model, count_tokens(get_buffer_string(messages[0]), model))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._record(run_id, response)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._record(run_id, kwargs.get("response"))
+
+    def _record(self, run_id, response):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        model, input_tokens = run
+        usage = (response.llm_output or {}).get("token_usage") if response else None
+        if usage:
+            record_tokens(model, usage.get("prompt_tokens", input_tokens), usage.get("completion_tokens", 0))
+            return
+        output = "".join(g.text for generations in response.generations for g in generations) if response else ""
+        record_tokens(model, input_tokens, count_tokens(output, model))
+
+
+def render_metrics() -> bytes:
+    """Metrics in the Prometheus text format, aggregated across workers in multiprocess mode"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
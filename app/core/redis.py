@@ -0,0 +1,13 @@
+import redis.asyncio as aioredis
+from functools import lru_cache
+from app.core.config import get_settings
+
+settings = get_settings()
+
+@lru_cache()
+def get_async_redis() -> aioredis.Redis:
+    """Shared asyncio Redis client backed by a single connection pool"""
+    return aioredis.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS
+    )
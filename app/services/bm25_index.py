@@ -0,0 +1,133 @@
+from collections import Counter
+from typing import Dict, Any, Hashable, Iterable, List, Tuple
+import json
+import logging
+import math
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Keeps clause numbers ("4.2.1"), flight codes ("EK-501") and prices intact
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have how i in is it me my of on or "
+    "our so that the their there this to was we what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Hashable]], k: int = 60) -> List[Hashable]:
+    """Merge ranked key lists, scoring each key by the sum of 1 / (k + rank)"""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over chunk texts, keyed by docstore ID.
+
+    Only term frequencies are kept, never the texts themselves; matching chunks
+    are fetched from the vector store's docstore. Keys are the langchain docstore
+    IDs, so a hit can be fused with dense results and resolved the same way.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        self.lengths: Dict[Hashable, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def add(self, keys: List[Hashable], texts: List[str]):
+        self.add_term_counts(keys, [Counter(tokenize(text)) for text in texts])
+
+    def add_term_counts(self, keys: List[Hashable], term_counts: List[Dict[str, int]]):
+        for key, counts in zip(keys, term_counts):
+            if key in self.lengths:
+                self.remove([key])
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[key] = tf
+            length = sum(counts.values())
+            self.lengths[key] = length
+            self.total_length += length
+
+    def remove(self, keys: Iterable[Hashable]):
+        keys = {key for key in keys if key in self.lengths}
+        if not keys:
+            return
+        for term in list(self.postings):
+            posting = self.postings[term]
+            for key in keys & posting.keys():
+                del posting[key]
+            if not posting:
+                del self.postings[term]
+        for key in keys:
+            self.total_length -= self.lengths.pop(key)
+
+    def term_counts(self, keys: List[Hashable]) -> List[Dict[str, int]]:
+        """Per-key term frequencies, for persisting or re-keying a subset"""
+        wanted = set(keys)
+        counts: Dict[Hashable, Dict[str, int]] = {key: {} for key in keys}
+        for term, posting in self.postings.items():
+            for key in wanted & posting.keys():
+                counts[key][term] = posting[key]
+        return [counts[key] for key in keys]
+
+    def _idf(self, term: str) -> float:
+        n = len(self.lengths)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 20, normalize: bool = False) -> List[Tuple[Hashable, float]]:
+        """Top-k (key, score) pairs for a query, best first
+
+        With normalize=True scores are divided by the sum of the query terms'
+        IDFs, roughly what a chunk of average length containing every term once
+        would score, so ~1.0 means a full match regardless of corpus size.
+        """
+        n = len(self.lengths)
+        if not n:
+            return []
+        avg_length = self.total_length / n
+        terms = set(tokenize(query))
+        scores: Dict[Hashable, float] = {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = self._idf(term)
+            for key, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[key] / avg_length)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        hits = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        if normalize and hits:
+            weight = sum(self._idf(term) for term in terms)
+            hits = [(key, score / weight) for key, score in hits]
+        return hits
+
+    def save(self, path: str, keys: List[Hashable] = None):
+        """Write the term counts of the given keys (default all) atomically"""
+        keys = list(self.lengths) if keys is None else keys
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"keys": keys, "term_counts": self.term_counts(keys)}, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """Add the term counts stored in a file written by save()"""
+        with open(path) as f:
+            data = json.load(f)
+        self.add_term_counts(data["keys"], data["term_counts"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"chunks": len(self.lengths), "terms": len(self.postings)}
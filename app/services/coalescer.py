@@ -0,0 +1,107 @@
+from typing import Dict, Any, Awaitable, Callable
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class MessageCoalescer:
+    """Merges bursts of messages from one sender into a single job.
+
+    A sender's messages are held until none has arrived for window_seconds,
+    or max_wait_seconds after the first, then handled as one job whose text is
+    the messages joined by newlines. submit() returns at once with a future
+    that resolves when the merged job has been handled, so a queue worker is
+    free for other senders during the window and acknowledges the message only
+    once it has been answered. At most max_concurrency merged jobs are handled
+    at a time. A window of 0 handles every message on its own.
+
+    Bursts are merged per process: with several workers, only messages that
+    reach the same process are combined.
+    """
+
+    def __init__(self, handler: MessageHandler, window_seconds: float = 1.0, max_wait_seconds: float = 5.0, max_concurrency: int = 4):
+        self.handler = handler
+        self.window_seconds = window_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        # from_number -> {"jobs", "future", "started", "timer"}
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        self._tasks: set = set()
+        self._stats = {
+            "messages": 0,
+            "batches": 0,
+            "coalesced": 0
+        }
+
+    async def submit(self, job: Dict[str, Any]) -> asyncio.Future:
+        """Add a message to its sender's burst; the returned future resolves once the burst is handled"""
+        self._stats["messages"] += 1
+        loop = asyncio.get_running_loop()
+        if self.window_seconds <= 0:
+            self._stats["batches"] += 1
+            future = loop.create_future()
+            self._start(job, future)
+            return future
+
+        now = time.monotonic()
+        sender = job["from_number"]
+        batch = self._batches.get(sender)
+        if batch is None:
+            batch = {"jobs": [], "future": loop.create_future(), "started": now, "timer": None}
+            self._batches[sender] = batch
+        else:
+            batch["timer"].cancel()
+        batch["jobs"].append(job)
+
+        delay = max(0.0, min(self.window_seconds, batch["started"] + self.max_wait_seconds - now))
+        batch["timer"] = loop.call_later(delay, self._flush, sender)
+        return batch["future"]
+
+    def _flush(self, sender: str):
+        batch = self._batches.pop(sender, None)
+        if batch is None:
+            return
+        batch["timer"].cancel()
+        jobs = batch["jobs"]
+        merged = dict(jobs[0])
+        if len(jobs) > 1:
+            merged["message_text"] = "\n".join(job["message_text"] for job in jobs)
+            merged["message_ids"] = [job.get("message_id", "") for job in jobs]
+            logger.info(f"Coalesced {len(jobs)} messages from {sender}")
+        self._stats["batches"] += 1
+        self._stats["coalesced"] += len(jobs) - 1
+
+        self._start(merged, batch["future"])
+
+    def _start(self, job: Dict[str, Any], future: asyncio.Future):
+        task = asyncio.create_task(self._run(job, future))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: Dict[str, Any], future: asyncio.Future):
+        try:
+            async with self._slots:
+                await self.handler(job)
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved in case no worker is waiting any more (e.g. after shutdown)
+            future.exception()
+
+    async def aclose(self):
+        """Handle any bursts still inside their window and wait for them"""
+        for sender in list(self._batches):
+            self._flush(sender)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_seconds": self.window_seconds,
+            **self._stats,
+            "pending_senders": len(self._batches)
+        }
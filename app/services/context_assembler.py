@@ -0,0 +1,163 @@
+from langchain_core.documents import Document
+from app.services.bm25_index import tokenize
+from app.utils.tokens import count_tokens, truncate_tokens
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n"
+
+# Shorter shared runs of text are treated as coincidence, not chunk overlap
+MIN_OVERLAP_CHARS = 20
+
+
+def _overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right"""
+    for size in range(min(len(left), len(right), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_text(first: str, second: str, max_overlap: int) -> Optional[str]:
+    """Join two chunks of the same page if one contains or overlaps the other"""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    size = _overlap(first, second, max_overlap)
+    if size:
+        return first + second[size:]
+    size = _overlap(second, first, max_overlap)
+    if size:
+        return second + first[size:]
+    return None
+
+
+def _page(doc: Document) -> Tuple[Any, Any]:
+    return doc.metadata.get("source"), doc.metadata.get("page")
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextAssembler:
+    """Builds the prompt context from retrieved chunks within a token budget.
+
+    Chunks of the same source page that overlap (the splitter repeats up to
+    CHUNK_OVERLAP characters) or contain one another are merged, so shared text
+    is sent once. The merged passages are then picked by maximal marginal
+    relevance: relevance comes from the retrieval rank and redundancy from
+    term overlap with passages already picked, so no extra embedding calls are
+    made. Passages are added until the token budget is full.
+    """
+
+    def __init__(self, token_budget: int = 1500, mmr_lambda: float = 0.7, max_overlap: int = 1000, model: str = "gpt-4"):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.max_overlap = max_overlap
+        self.model = model
+        self._stats = {
+            "requests": 0,
+            "tokens_in": 0,
+            "tokens_out": 0
+        }
+
+    def merge(self, docs: List[Document]) -> List[Document]:
+        """Merge overlapping chunks of the same page into the best-ranked chunk of each group"""
+        merged: List[Document] = []
+        for doc in docs:
+            page = _page(doc)
+            text = doc.page_content
+            slot = None
+            # A grown passage may overlap ones it did not before, so repeat until nothing changes
+            changed = True
+            while changed:
+                changed = False
+                for i, other in enumerate(merged):
+                    if i == slot or _page(other) != page:
+                        continue
+                    joined = _merge_text(other.page_content, text, self.max_overlap)
+                    if joined is None:
+                        continue
+                    text = joined
+                    if slot is None:
+                        slot = i
+                    elif i < slot:
+                        merged.pop(slot)
+                        slot = i
+                    else:
+                        merged.pop(i)
+                    changed = True
+                    break
+            if slot is None:
+                merged.append(Document(page_content=text, metadata=doc.metadata))
+            else:
+                merged[slot] = Document(page_content=text, metadata=merged[slot].metadata)
+        return merged
+
+    def select(self, docs: List[Document]) -> List[Document]:
+        """Pick passages by MMR until the token budget is spent"""
+        candidates = [
+            (doc, frozenset(tokenize(doc.page_content)), count_tokens(doc.page_content, self.model))
+            for doc in docs
+        ]
+        relevance = {id(doc): 1.0 - rank / len(docs) for rank, doc in enumerate(docs)}
+        separator_tokens = count_tokens(SEPARATOR, self.model)
+        selected: List[Tuple[Document, frozenset]] = []
+        used = 0
+        while candidates:
+            def score(candidate):
+                doc, terms, _ = candidate
+                redundancy = max((_similarity(terms, picked) for _, picked in selected), default=0.0)
+                return self.mmr_lambda * relevance[id(doc)] - (1 - self.mmr_lambda) * redundancy
+
+            best = max(candidates, key=score)
+            candidates.remove(best)
+            doc, terms, tokens = best
+            cost = tokens + (separator_tokens if selected else 0)
+            if used + cost <= self.token_budget:
+                selected.append((doc, terms))
+                used += cost
+            elif not selected:
+                # Even the best passage is over budget: send as much of it as fits
+                text = truncate_tokens(doc.page_content, self.token_budget, self.model)
+                selected.append((Document(page_content=text, metadata=doc.metadata), terms))
+                used = self.token_budget
+        return [doc for doc, _ in selected]
+
+    def assemble(self, docs: List[Document]) -> Tuple[str, Dict[str, Any]]:
+        """Return the prompt context for retrieved chunks and what assembly saved"""
+        raw = SEPARATOR.join(doc.page_content for doc in docs)
+        selected = self.select(self.merge(docs))
+        context = SEPARATOR.join(doc.page_content for doc in selected)
+        tokens_in = count_tokens(raw, self.model)
+        tokens_out = count_tokens(context, self.model)
+        stats = {
+            "chunks_in": len(docs),
+            "chunks_out": len(selected),
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_saved": tokens_in - tokens_out
+        }
+        self._stats["requests"] += 1
+        self._stats["tokens_in"] += tokens_in
+        self._stats["tokens_out"] += tokens_out
+        logger.info(
+            f"Context assembled: {len(docs)} chunks -> {len(selected)} passages, "
+            f"{tokens_in} -> {tokens_out} tokens ({tokens_in - tokens_out} saved)"
+        )
+        return context, stats
+
+    def stats(self) -> Dict[str, Any]:
+        tokens_saved = self._stats["tokens_in"] - self._stats["tokens_out"]
+        return {
+            "token_budget": self.token_budget,
+            **self._stats,
+            "tokens_saved": tokens_saved,
+            "avg_tokens_saved": round(tokens_saved / self._stats["requests"], 1) if self._stats["requests"] else 0.0
+        }
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from app.core.config import get_settings
+from typing import Dict, Any
+import logging
+import time
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class MessageDeduplicator:
+    """Suppresses redelivered webhook messages by WhatsApp message ID.
+
+    A bounded in-process LRU answers hot duplicates without a network call;
+    IDs it has not seen are claimed in Redis with SET NX EX, so a redelivery
+    that lands on another worker or node is caught too. Without Redis only
+    the local LRU is used. If Redis is unreachable the message is let through,
+    since a rare duplicate reply is better than a dropped one.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = 86400,
+        max_local_entries: int = 10000,
+        redis_client=None,
+        key_prefix: str = "dedup"
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_local_entries = max_local_entries
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        # message_id -> first-seen time, oldest first
+        self._local: "OrderedDict[str, float]" = OrderedDict()
+        self._stats = {
+            "checked": 0,
+            "duplicates_local": 0,
+            "duplicates_redis": 0,
+            "errors": 0
+        }
+
+    def _remember(self, message_id: str, now: float):
+        self._local[message_id] = now
+        self._local.move_to_end(message_id)
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+    async def is_duplicate(self, message_id: str) -> bool:
+        """Claim a message ID; True if it was already claimed within the TTL"""
+        self._stats["checked"] += 1
+        now = time.time()
+        seen_at = self._local.get(message_id)
+        if seen_at is not None and now - seen_at < self.ttl_seconds:
+            self._stats["duplicates_local"] += 1
+            return True
+
+        if self.redis is not None:
+            try:
+                claimed = await self.redis.set(f"{self.key_prefix}:{message_id}", 1, nx=True, ex=self.ttl_seconds)
+                if not claimed:
+                    self._remember(message_id, now)
+                    self._stats["duplicates_redis"] += 1
+                    return True
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"Error checking message {message_id} for duplicates: {e}")
+
+        self._remember(message_id, now)
+        return False
+
+    async def release(self, message_id: str):
+        """Forget a claimed ID so a redelivery is processed, e.g. when it could not be queued"""
+        self._local.pop(message_id, None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(f"{self.key_prefix}:{message_id}")
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"Error releasing message {message_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if self.redis is not None else "memory",
+            **self._stats,
+            "local_entries": len(self._local)
+        }
+
+
+def create_deduplicator() -> MessageDeduplicator:
+    """Build the deduplicator for the configured backend"""
+    redis_client = None
+    if settings.DEDUP_BACKEND == "redis":
+        from app.core.redis import get_async_redis
+        redis_client = get_async_redis()
+    return MessageDeduplicator(
+        ttl_seconds=settings.DEDUP_TTL_SECONDS,
+        max_local_entries=settings.DEDUP_MAX_LOCAL_ENTRIES,
+        redis_client=redis_client
+    )
@@ -0,0 +1,124 @@
+from langchain_core.embeddings import Embeddings
+from typing import Dict, List
+import asyncio
+import hashlib
+import logging
+import numpy as np
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# SQLite caps the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed, persistent cache in front of an embeddings model.
+
+    Vectors are stored in SQLite keyed by (model, sha256(text)), so re-ingesting
+    unchanged chunks, or rebuilding the index from scratch, makes no embedding
+    API calls for text that has been embedded before. Only document chunks are
+    cached; queries go straight to the underlying model, so user messages are
+    never written to disk and the cache only grows with the corpus.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, path: str = "data/embedding_cache.sqlite3"):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), _SQL_BATCH):
+                batch = hashes[i:i + _SQL_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype="float32").tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [
+                    (self.model_name, text_hash, np.asarray(vector, dtype="float32").tobytes())
+                    for text_hash, vector in items.items()
+                ]
+            )
+            self._conn.commit()
+
+    def _missing(self, texts: List[str], hashes: List[str], found: Dict[str, List[float]]) -> Dict[str, str]:
+        """Texts to embed, keyed by hash and deduplicated"""
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in found:
+                missing.setdefault(text_hash, text)
+        self.hits += len(texts) - sum(1 for h in hashes if h in missing)
+        self.misses += len(missing)
+        return missing
+
+    @staticmethod
+    def _as_float32(missing: Dict[str, str], vectors: List[List[float]]) -> Dict[str, List[float]]:
+        """Round fresh vectors to float32 so hits and misses return identical values"""
+        array = np.asarray(vectors, dtype="float32")
+        return dict(zip(missing.keys(), array.tolist()))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self._hash(text) for text in texts]
+        found = self._lookup(hashes)
+        missing = self._missing(texts, hashes, found)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            new = self._as_float32(missing, vectors)
+            self._store(new)
+            found.update(new)
+        return [found[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self._hash(text) for text in texts]
+        found = await asyncio.to_thread(self._lookup, hashes)
+        missing = self._missing(texts, hashes, found)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            new = self._as_float32(missing, vectors)
+            await asyncio.to_thread(self._store, new)
+            found.update(new)
+        return [found[text_hash] for text_hash in hashes]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
+
+    def stats(self) -> Dict[str, int]:
+        """Cache hit and miss counts since startup"""
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,141 @@
+from typing import Dict, Any, Iterable, List
+import faiss
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# faiss warns below this many training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+DEFAULT_INDEX_SPEC = {
+    "type": "flat",
+    "nlist": 100,
+    "nprobe": 10,
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64,
+    "pq_bytes": 16
+}
+
+
+def index_spec_from_settings(settings) -> Dict[str, Any]:
+    """FAISS index type and parameters from Settings"""
+    return {
+        "type": settings.FAISS_INDEX_TYPE,
+        "nlist": settings.FAISS_NLIST,
+        "nprobe": settings.FAISS_NPROBE,
+        "hnsw_m": settings.FAISS_HNSW_M,
+        "ef_construction": settings.FAISS_HNSW_EF_CONSTRUCTION,
+        "ef_search": settings.FAISS_HNSW_EF_SEARCH,
+        "pq_bytes": settings.FAISS_PQ_BYTES
+    }
+
+
+def index_type(index: faiss.Index) -> str:
+    """Name of the configured type an index corresponds to"""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def is_lossless(index: faiss.Index) -> bool:
+    """Whether stored vectors can be reconstructed exactly"""
+    return index_type(index) != "ivf_pq"
+
+
+def _pq_subquantizers(dim: int, pq_bytes: int) -> int:
+    """Largest divisor of dim not above pq_bytes"""
+    for m in range(min(pq_bytes, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(vectors: np.ndarray, spec: Dict[str, Any]) -> faiss.Index:
+    """Create, train and fill an L2 index of the requested type
+
+    IVF list counts and PQ code sizes are clamped to what the number of
+    training vectors can support, so small corpora still build.
+    """
+    n, dim = vectors.shape
+    kind = spec["type"]
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{kind}', expected one of {INDEX_TYPES}")
+    if n == 0 and kind.startswith("ivf"):
+        logger.warning("No vectors to train an IVF index on, building a flat index instead")
+        kind = "flat"
+
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec["hnsw_m"])
+        index.hnsw.efConstruction = spec["ef_construction"]
+    else:
+        nlist = max(1, min(spec["nlist"], n // MIN_POINTS_PER_CENTROID))
+        if nlist != spec["nlist"]:
+            logger.warning(f"Clamping nlist from {spec['nlist']} to {nlist} for {n} vectors")
+        quantizer = faiss.IndexFlatL2(dim)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            m = _pq_subquantizers(dim, spec["pq_bytes"])
+            # Each sub-quantizer needs at least 2^nbits training points
+            nbits = max(1, min(8, int(np.log2(max(n, 2)))))
+            if m != spec["pq_bytes"] or nbits != 8:
+                logger.warning(f"Using PQ with {m} sub-quantizers x {nbits} bits for {n} vectors of dim {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits)
+        index.train(vectors)
+
+    if len(vectors):
+        index.add(vectors)
+    configure_search(index, spec)
+    return index
+
+
+def configure_search(index: faiss.Index, spec: Dict[str, Any], direct_map: bool = True):
+    """Apply query-time parameters, which are not all persisted with the index
+
+    direct_map=False skips building the reconstruction map, for read-only
+    indexes that are only ever searched.
+    """
+    kind = index_type(index)
+    if kind in ("ivf_flat", "ivf_pq"):
+        index.nprobe = min(spec["nprobe"], index.nlist)
+        if direct_map and kind == "ivf_flat" and index.direct_map.type == faiss.DirectMap.NoMap:
+            # Needed to reconstruct vectors when merging shards or rebuilding
+            index.make_direct_map()
+    elif kind == "hnsw":
+        index.hnsw.efSearch = spec["ef_search"]
+
+
+def stored_vectors(store, positions: List[int], embeddings) -> np.ndarray:
+    """Vectors for the given index positions of a langchain FAISS store
+
+    Lossless indexes are reconstructed directly; PQ codes are approximate, so
+    their chunks are re-embedded (served from the embedding cache when enabled).
+    """
+    if not positions:
+        return np.zeros((0, store.index.d), dtype="float32")
+    if is_lossless(store.index):
+        return np.vstack([store.index.reconstruct(int(i)) for i in positions]).astype("float32")
+    texts = [store.docstore.search(store.index_to_docstore_id[i]).page_content for i in positions]
+    return np.asarray(embeddings.embed_documents(texts), dtype="float32")
+
+
+def rebuild_store(store, spec: Dict[str, Any], embeddings, drop_ids: Iterable[str] = ()):
+    """Rebuild a langchain FAISS store's index in place as the given type, optionally dropping chunks"""
+    drop = set(drop_ids)
+    keep = [(i, doc_id) for i, doc_id in sorted(store.index_to_docstore_id.items()) if doc_id not in drop]
+    vectors = stored_vectors(store, [i for i, _ in keep], embeddings)
+    store.index = build_index(vectors, spec)
+    store.index_to_docstore_id = {n: doc_id for n, (_, doc_id) in enumerate(keep)}
+    if drop:
+        store.docstore.delete(list(drop))
+    logger.info(f"Rebuilt vector index as {spec['type']} with {store.index.ntotal} vectors")
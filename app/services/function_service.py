@@ -2,7 +2,9 @@ from langchain.tools import Tool
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from app.core import metrics
 from app.core.config import get_settings
+from app.core.concurrency import get_llm_semaphore
 from typing import Dict, Any
 import json
 
@@ -13,7 +15,8 @@ class FunctionService:
         self.llm = ChatOpenAI(
             model_name=settings.MODEL_NAME,
             temperature=0,
-            openai_api_key=settings.OPENAI_API_KEY
+            openai_api_key=settings.OPENAI_API_KEY,
+            callbacks=[metrics.TokenUsageCallback()]
         )
         self.tools = self._create_tools()
         self.agent = self._create_agent()
@@ -53,10 +56,11 @@ class FunctionService:
     async def process_message(self, message: str, session_id: str) -> Dict[str, Any]:
         """Process a message and determine if function calling is needed"""
         try:
-            result = await self.agent.ainvoke({
-                "input": message,
-                "chat_history": []  # You might want to load this from Redis
-            })
+            async with get_llm_semaphore():
+                result = await self.agent.ainvoke({
+                    "input": message,
+                    "chat_history": []  # You might want to load this from Redis
+                })
             return result
         except Exception as e:
             return {"error": str(e)}
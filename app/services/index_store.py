@@ -0,0 +1,354 @@
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from app.services.bm25_index import BM25Index
+from app.services.faiss_index import DEFAULT_INDEX_SPEC, configure_search, index_type, rebuild_store
+from app.services.mmap_store import publish_snapshot
+from typing import Dict, Any, Callable, List, Optional
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+SHARDS_DIR = "shards"
+LEXICAL_DIR = "lexical"
+
+
+def file_sha256(file_path: str) -> str:
+    """Content hash of a file, read in 1 MiB blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentManifest:
+    """Record of every ingested file: content hash, chunk IDs and where its vectors are persisted.
+
+    "shard" names the delta directory holding the document's vectors, or is None
+    once they have been compacted into the base index. A file byte-identical to
+    one already ingested has no chunks of its own; "duplicate_of" names the file
+    that holds them. "deleted_ids" lists chunks that were replaced but are still
+    present in the base index.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.deleted_ids: List[str] = []
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.documents = data.get("documents", {})
+            self.deleted_ids = data.get("deleted_ids", [])
+
+    def save(self):
+        """Write atomically so a crash never leaves a truncated manifest"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"documents": self.documents, "deleted_ids": self.deleted_ids}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def find_by_hash(self, sha256: str, exclude: Optional[str] = None) -> Optional[str]:
+        """The file holding the chunks for this content, other than exclude"""
+        for key, entry in self.documents.items():
+            if key != exclude and entry["sha256"] == sha256 and not entry.get("duplicate_of"):
+                return key
+        return None
+
+
+class IndexStore:
+    """Owns the on-disk layout of the FAISS vector store.
+
+    The base index (index.faiss/index.pkl) is a full snapshot. Each ingested file
+    is additionally persisted as a small delta shard, so an upload writes only
+    its own chunks; shards are folded into the base snapshot by compact() once
+    there are more than max_shards of them. Every compaction also publishes a
+    read-only snapshot for workers serving in mmap mode.
+
+    A BM25 index over the same chunks is kept alongside for lexical search. Its
+    term counts are persisted per document under lexical/, so an upload writes
+    only its own.
+
+    Readers must hold `lock` while searching; upserts take it only for the
+    in-memory mutation, never while parsing or embedding.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embeddings,
+        index_spec: Optional[Dict[str, Any]] = None,
+        max_shards: int = 32,
+        embedding_batch_size: int = 64
+    ):
+        self.path = path
+        self.embeddings = embeddings
+        # Index type written by compact(); None keeps whatever type the index already has
+        self.index_spec = index_spec
+        self.max_shards = max_shards
+        self.embedding_batch_size = embedding_batch_size
+        self.lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self.manifest = DocumentManifest(os.path.join(path, MANIFEST_FILE))
+        self.vector_store: Optional[FAISS] = None
+        self.lexical = BM25Index()
+
+    def _load_faiss(self, folder: str) -> FAISS:
+        return FAISS.load_local(folder, self.embeddings, allow_dangerous_deserialization=True)
+
+    def _shard_path(self, shard: str) -> str:
+        return os.path.join(self.path, SHARDS_DIR, shard)
+
+    def _lexical_path(self, sha256: str) -> str:
+        return os.path.join(self.path, LEXICAL_DIR, f"{sha256[:16]}.json")
+
+    def _save_lexical(self, sha256: str, ids: List[str]):
+        os.makedirs(os.path.join(self.path, LEXICAL_DIR), exist_ok=True)
+        self.lexical.save(self._lexical_path(sha256), ids)
+
+    def _load_lexical(self):
+        """Rebuild the BM25 index from per-document term counts
+
+        Documents ingested before lexical search existed are tokenized from the
+        docstore once and their term counts saved.
+        """
+        self.lexical = BM25Index()
+        present = set(self.vector_store.index_to_docstore_id.values())
+        for key, entry in self.manifest.documents.items():
+            if entry.get("duplicate_of"):
+                continue
+            path = self._lexical_path(entry["sha256"])
+            if os.path.exists(path):
+                self.lexical.load(path)
+                continue
+            ids = [doc_id for doc_id in entry["chunk_ids"] if doc_id in present]
+            if ids:
+                logger.info(f"Building lexical index for {key}")
+                self.lexical.add(ids, [self.vector_store.docstore.search(doc_id).page_content for doc_id in ids])
+                self._save_lexical(entry["sha256"], ids)
+        logger.info(f"Loaded lexical index: {self.lexical.stats()}")
+
+    def _merge_shard(self, store: FAISS, shard: FAISS):
+        """Append a shard's vectors and documents to the store"""
+        ids = [shard.index_to_docstore_id[i] for i in range(shard.index.ntotal)]
+        docs = [shard.docstore.search(doc_id) for doc_id in ids]
+        vectors = shard.index.reconstruct_n(0, shard.index.ntotal)
+        store.add_embeddings(
+            [(doc.page_content, vector) for doc, vector in zip(docs, vectors)],
+            metadatas=[doc.metadata for doc in docs],
+            ids=ids
+        )
+
+    def _delete_present(self, ids: List[str]):
+        if self.vector_store is None:
+            return
+        present = set(self.vector_store.index_to_docstore_id.values())
+        to_delete = [doc_id for doc_id in ids if doc_id in present]
+        if not to_delete:
+            return
+        if index_type(self.vector_store.index) == "flat":
+            self.vector_store.delete(to_delete)
+        else:
+            # IVF keeps stale positions and HNSW cannot remove at all, so rebuild without them
+            rebuild_store(self.vector_store, self._current_spec(), self.embeddings, drop_ids=to_delete)
+
+    def _current_spec(self) -> Dict[str, Any]:
+        """Spec for rebuilding the loaded index as its own type"""
+        return {**(self.index_spec or DEFAULT_INDEX_SPEC), "type": index_type(self.vector_store.index)}
+
+    def load(self, seed_texts: List[str]) -> FAISS:
+        """Load the base snapshot, apply tombstones and replay delta shards"""
+        self.vector_store = None
+        if os.path.exists(os.path.join(self.path, "index.faiss")):
+            self.vector_store = self._load_faiss(self.path)
+
+        shards = []
+        for key, entry in self.manifest.documents.items():
+            if not entry.get("shard"):
+                continue
+            try:
+                shards.append((key, self._load_faiss(self._shard_path(entry["shard"]))))
+            except Exception as e:
+                logger.error(f"Error loading shard for {key}: {e}")
+
+        # Chunk IDs derive from content, so a re-uploaded earlier version reuses IDs
+        # still in the base; tombstones and those stale copies go before shards merge
+        shard_ids = [doc_id for _, shard in shards for doc_id in shard.index_to_docstore_id.values()]
+        self._delete_present(self.manifest.deleted_ids + shard_ids)
+
+        for key, shard in shards:
+            if self.vector_store is None:
+                self.vector_store = shard
+                continue
+            try:
+                self._merge_shard(self.vector_store, shard)
+            except ValueError as e:
+                logger.error(f"Skipping shard for {key}: {e}")
+
+        if self.vector_store is None:
+            logger.info("No existing vector store found, creating a new one")
+            self.vector_store = FAISS.from_texts(seed_texts, self.embeddings)
+
+        store = self.vector_store
+        if self.index_spec:
+            configure_search(store.index, self.index_spec)
+        self._load_lexical()
+        return store
+
+    def is_unchanged(self, file_path: str, sha256: str) -> bool:
+        """True if this file was last ingested with exactly this content"""
+        entry = self.manifest.documents.get(os.path.normpath(file_path))
+        if entry and entry["sha256"] == sha256:
+            logger.info(f"Skipping {file_path}: unchanged since it was last ingested")
+            return True
+        return False
+
+    def is_duplicate(self, file_path: str, sha256: str) -> bool:
+        """True if another file with exactly this content already holds its chunks"""
+        return self.manifest.find_by_hash(sha256, exclude=os.path.normpath(file_path)) is not None
+
+    def upsert(
+        self,
+        file_path: str,
+        sha256: str,
+        chunks: List[Document],
+        progress: Optional[Callable[..., None]] = None
+    ) -> int:
+        """Add a file's chunks, replacing any chunks from a previous version of it
+
+        Returns the number of chunks added.
+        """
+        key = os.path.normpath(file_path)
+        if self.is_duplicate(file_path, sha256):
+            # Recorded as a duplicate; its content is already indexed
+            chunks = []
+        ids = [f"{sha256[:16]}:{i}" for i in range(len(chunks))]
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        vectors = []
+        for i in range(0, len(texts), self.embedding_batch_size):
+            vectors.extend(self.embeddings.embed_documents(texts[i:i + self.embedding_batch_size]))
+            if progress:
+                progress(chunks_embedded=len(vectors))
+
+        # Persist only the delta: this document's vectors in their own shard
+        shard_name = sha256[:16]
+        if chunks:
+            shard = FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings, metadatas=metadatas, ids=ids)
+            shard.save_local(self._shard_path(shard_name))
+
+        with self.lock:
+            self._apply(key, sha256, ids, texts, metadatas, vectors, shard_name if chunks else None)
+            self.manifest.save()
+
+            shard_count = sum(1 for entry in self.manifest.documents.values() if entry.get("shard"))
+            if shard_count > self.max_shards:
+                self.compact()
+        return len(chunks)
+
+    def bulk_upsert(self, documents: List[Dict[str, Any]]) -> int:
+        """Apply many pre-embedded documents and write the index once
+
+        Each document is a dict with file_path, sha256, chunks and vectors.
+        Documents without chunks, and duplicates of content already ingested
+        under another file, are recorded by hash so they are not parsed again.
+        Returns the total number of chunks added.
+        """
+        added = 0
+        with self.lock:
+            for doc in documents:
+                chunks = doc["chunks"]
+                ids = [f"{doc['sha256'][:16]}:{i}" for i in range(len(chunks))]
+                self._apply(
+                    os.path.normpath(doc["file_path"]),
+                    doc["sha256"],
+                    ids,
+                    [chunk.page_content for chunk in chunks],
+                    [chunk.metadata for chunk in chunks],
+                    doc["vectors"],
+                    None
+                )
+                added += len(chunks)
+            self.compact()
+        return added
+
+    def _apply(self, key, sha256, ids, texts, metadatas, vectors, shard_name):
+        """Swap a document's chunks in memory and record it in the manifest; caller holds the lock"""
+        previous = self.manifest.documents.get(key)
+        heirs = [other for other, entry in self.manifest.documents.items() if entry.get("duplicate_of") == key]
+        if previous and heirs:
+            # Identical files still need the old chunks: the first of them takes them over
+            logger.info(f"Handing chunks from previous version of {key} over to duplicate {heirs[0]}")
+            self.manifest.documents[heirs[0]] = {**previous, "ingested_at": time.time()}
+            for other in heirs[1:]:
+                self.manifest.documents[other]["duplicate_of"] = heirs[0]
+        elif previous and not previous.get("duplicate_of"):
+            logger.info(f"Replacing {len(previous['chunk_ids'])} chunks from previous version of {key}")
+            self._delete_present(previous["chunk_ids"])
+            self.lexical.remove(previous["chunk_ids"])
+            if os.path.exists(self._lexical_path(previous["sha256"])):
+                os.remove(self._lexical_path(previous["sha256"]))
+            if previous.get("shard"):
+                shutil.rmtree(self._shard_path(previous["shard"]), ignore_errors=True)
+            else:
+                # Old chunks live in the base snapshot; drop them on every load until compaction
+                self.manifest.deleted_ids.extend(previous["chunk_ids"])
+
+        owner = self.manifest.find_by_hash(sha256, exclude=key)
+        if owner:
+            logger.info(f"{key} is identical to {owner}, recording it as a duplicate")
+            self.manifest.documents[key] = {
+                "sha256": sha256,
+                "chunk_ids": [],
+                "shard": None,
+                "duplicate_of": owner,
+                "ingested_at": time.time()
+            }
+            return
+
+        if ids and self.manifest.deleted_ids:
+            # Re-adding content whose chunks were tombstoned: keep the new copies
+            added = set(ids)
+            self.manifest.deleted_ids = [doc_id for doc_id in self.manifest.deleted_ids if doc_id not in added]
+
+        if texts:
+            if self.vector_store is None:
+                self.vector_store = FAISS.from_embeddings(
+                    list(zip(texts, vectors)), self.embeddings, metadatas=metadatas, ids=ids
+                )
+            else:
+                self.vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+            self.lexical.add(ids, texts)
+            self._save_lexical(sha256, ids)
+
+        self.manifest.documents[key] = {
+            "sha256": sha256,
+            "chunk_ids": ids,
+            "shard": shard_name,
+            "ingested_at": time.time()
+        }
+
+    def compact(self):
+        """Write the full index as the base snapshot, drop all delta shards and publish it"""
+        with self.lock:
+            if self.vector_store is None:
+                # Only empty documents so far: nothing to write but the manifest
+                self.manifest.save()
+                return
+            logger.info(f"Compacting vector store at {self.path}")
+            if self.index_spec and index_type(self.vector_store.index) != self.index_spec["type"]:
+                rebuild_store(self.vector_store, self.index_spec, self.embeddings)
+            self.vector_store.save_local(self.path)
+            for entry in self.manifest.documents.values():
+                entry["shard"] = None
+            self.manifest.deleted_ids = []
+            self.manifest.save()
+            shutil.rmtree(os.path.join(self.path, SHARDS_DIR), ignore_errors=True)
+            publish_snapshot(self.vector_store, self.path, lexical=self.lexical)
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class IngestJobManager:
+    """Runs document ingestion as background jobs and tracks their progress.
+
+    Jobs run one at a time (or up to max_concurrent) in worker threads so parsing,
+    embedding and persisting never block the event loop. Finished jobs are kept
+    for status queries until more than max_jobs have accumulated.
+    """
+
+    def __init__(self, rag_service, max_concurrent: int = 1, max_jobs: int = 1000):
+        self.rag_service = rag_service
+        self.max_concurrent = max_concurrent
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks: set = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def submit(self, file_path: str) -> Dict[str, Any]:
+        """Queue a file for ingestion and return its job record"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "file": file_path,
+            "status": "queued",
+            "pages_parsed": 0,
+            "chunks_total": None,
+            "chunks_embedded": 0,
+            "index_persisted": False,
+            "skipped": False,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None
+        }
+        self.jobs[job["job_id"]] = job
+        self._prune()
+
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_jobs"""
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if self.jobs[job_id]["status"] in ("completed", "failed"):
+                del self.jobs[job_id]
+
+    async def _run(self, job: Dict[str, Any]):
+        async with self._semaphore:
+            job["status"] = "running"
+            logger.info(f"Ingest job {job['job_id']} started for {job['file']}")
+            try:
+                success = await self.rag_service.aadd_document(job["file"], progress=job.update)
+                if success:
+                    job["status"] = "completed"
+                else:
+                    job["status"] = "failed"
+                    job["error"] = "Failed to process document"
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+            job["finished_at"] = time.time()
+            logger.info(f"Ingest job {job['job_id']} {job['status']} in {job['finished_at'] - job['created_at']:.1f}s")
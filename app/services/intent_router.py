@@ -0,0 +1,180 @@
+from collections import deque
+from app.core import metrics
+from app.services.session_store import is_first_message
+from app.utils.message_chunks import WHATSAPP_MAX_BODY_CHARS, stream_paragraphs
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+GREETING = "greeting"
+BOOKING_LINK = "booking_link"
+FUNCTION_AGENT = "function_agent"
+RAG = "rag"
+INTENTS = (GREETING, BOOKING_LINK, FUNCTION_AGENT, RAG)
+
+BOOKING_BASE_URL = "https://www.reindeerholidays.com/destination"
+
+WELCOME_MESSAGE = """Hi! 👋 Welcome to Reindeer Holidays 🦌
+
+Thanks for reaching out!
+We create personalized travel packages to make your trips unforgettable 🌍✈️
+Let us know your destination, travel dates, and interests — and we'll get started with the perfect plan for you!
+
+Looking forward to planning your next adventure! 😊"""
+
+WELCOME_BACK_MESSAGE = """Welcome back! 👋
+
+How can I help you with your travel plans today? 🌍"""
+
+FALLBACK_MESSAGE = "I apologize, but I'm having trouble processing your request at the moment."
+
+GREETING_PATTERN = re.compile(r"^\s*(hi|hello|hey|greetings|start)\s*[!.]*\s*$", re.IGNORECASE)
+
+# "book ... trip/holiday/vacation/package to X" and "want/need/looking to book ... to X"
+BOOKING_PATTERN = re.compile(
+    r"book.*(?:trip|holiday|vacation|package).*to\s+(\w+)"
+    r"|(?:want|need|looking).*to.*book.*to\s+(\w+)",
+    re.IGNORECASE
+)
+
+ACTION_PATTERN = re.compile(r"book|reserve|schedule", re.IGNORECASE)
+
+# Questions that need planning or comparison rather than a policy lookup
+COMPLEX_PATTERN = re.compile(
+    r"itinerar|day[- ]by[- ]day|\bplan\b|compar|versus|\bvs\.?\s|difference|recommend|customi[sz]e",
+    re.IGNORECASE
+)
+# Longer questions usually bundle several asks
+COMPLEX_MIN_WORDS = 40
+
+
+def booking_url(destination: str) -> str:
+    """Booking page for a destination"""
+    return f"{BOOKING_BASE_URL}/{destination.lower().replace(' ', '-')}"
+
+
+def is_complex(text: str) -> bool:
+    """Whether a question should go straight to the strongest model"""
+    return bool(COMPLEX_PATTERN.search(text)) or len(text.split()) >= COMPLEX_MIN_WORDS or text.count("?") > 1
+
+
+class IntentRouter:
+    """Classifies each message once with precompiled rules and runs exactly one handler.
+
+    Greetings and booking links are answered without any LLM call; requests to
+    book, reserve or schedule go to the function-calling agent; everything else
+    goes through RAG. Per-intent counts and handler latency are kept for stats().
+
+    route_stream() yields the reply as separate messages; with stream_replies,
+    RAG answers are yielded paragraph by paragraph as they are generated, each
+    at most max_message_chars long.
+    """
+
+    def __init__(
+        self,
+        rag_service,
+        function_service,
+        session_store,
+        stream_replies: bool = False,
+        max_message_chars: int = WHATSAPP_MAX_BODY_CHARS
+    ):
+        self.rag_service = rag_service
+        self.function_service = function_service
+        self.session_store = session_store
+        self.stream_replies = stream_replies
+        self.max_message_chars = max_message_chars
+        self._latencies: Dict[str, deque] = {intent: deque(maxlen=1000) for intent in INTENTS}
+        self._counts = {intent: 0 for intent in INTENTS}
+        self._errors = {intent: 0 for intent in INTENTS}
+
+    def classify(self, text: str) -> Tuple[str, Optional[str]]:
+        """Return (intent, destination); destination is only set for booking links"""
+        if GREETING_PATTERN.match(text):
+            return GREETING, None
+        match = BOOKING_PATTERN.search(text)
+        if match:
+            return BOOKING_LINK, (match.group(1) or match.group(2)).strip()
+        if ACTION_PATTERN.search(text):
+            return FUNCTION_AGENT, None
+        return RAG, None
+
+    async def route(self, text: str, session_id: str) -> str:
+        """Answer a message through the single handler for its intent"""
+        with metrics.track(metrics.ROUTING):
+            intent, destination = self.classify(text)
+        return await self._route(intent, destination, text, session_id)
+
+    async def _route(self, intent: str, destination: Optional[str], text: str, session_id: str) -> str:
+        start = time.perf_counter()
+        try:
+            if intent == GREETING:
+                with metrics.track(metrics.SESSION):
+                    first = await is_first_message(self.session_store, session_id)
+                response = WELCOME_MESSAGE if first else WELCOME_BACK_MESSAGE
+            elif intent == BOOKING_LINK:
+                response = f"I'll help you book your trip to {destination.title()}. You can view and book packages here: {booking_url(destination)}"
+            elif intent == FUNCTION_AGENT:
+                with metrics.track(metrics.TOOL):
+                    result = await self.function_service.process_message(text, session_id)
+                    if "error" in result:
+                        raise RuntimeError(result["error"])
+                response = str(result.get("output", "")).strip()
+            else:
+                response = await self.rag_service.aget_response(text, session_id)
+        except Exception as e:
+            self._errors[intent] += 1
+            logger.error(f"Error handling {intent} message: {e}")
+            response = None
+        finally:
+            self._counts[intent] += 1
+            self._latencies[intent].append(time.perf_counter() - start)
+
+        metrics.MESSAGES.labels(intent, "ok" if response else "error").inc()
+        logger.info(f"Routed message from {session_id} as {intent}")
+        return response or FALLBACK_MESSAGE
+
+    async def route_stream(self, text: str, session_id: str) -> AsyncIterator[str]:
+        """Answer a message through the single handler for its intent, yielding each message to send"""
+        with metrics.track(metrics.ROUTING):
+            intent, destination = self.classify(text)
+        if intent != RAG or not self.stream_replies:
+            yield await self._route(intent, destination, text, session_id)
+            return
+
+        start = time.perf_counter()
+        yielded = False
+        try:
+            paragraphs = stream_paragraphs(self.rag_service.astream_response(text, session_id), self.max_message_chars)
+            async for paragraph in paragraphs:
+                yielded = True
+                yield paragraph
+        except Exception as e:
+            self._errors[intent] += 1
+            logger.error(f"Error handling {intent} message: {e}")
+        finally:
+            self._counts[intent] += 1
+            self._latencies[intent].append(time.perf_counter() - start)
+
+        metrics.MESSAGES.labels(intent, "ok" if yielded else "error").inc()
+        logger.info(f"Routed message from {session_id} as {intent} (streamed)")
+        if not yielded:
+            yield FALLBACK_MESSAGE
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-intent message counts, errors and handler latency"""
+        stats = {}
+        for intent in INTENTS:
+            latencies = sorted(self._latencies[intent])
+            stats[intent] = {
+                "count": self._counts[intent],
+                "errors": self._errors[intent],
+                "latency_ms": {
+                    "avg": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                    "p95": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else 0.0,
+                    "max": round(1000 * latencies[-1], 2) if latencies else 0.0
+                }
+            }
+        return stats
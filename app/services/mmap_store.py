@@ -0,0 +1,188 @@
+from collections.abc import Mapping
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from app.services.bm25_index import BM25Index
+from app.services.faiss_index import DEFAULT_INDEX_SPEC, configure_search
+from typing import Dict, Any, Iterator, Optional, Tuple
+import faiss
+import json
+import logging
+import mmap
+import numpy as np
+import os
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED_DIR = "published"
+CURRENT_FILE = "CURRENT"
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "offsets.npy"
+LEXICAL_FILE = "bm25.json"
+
+# Flat and HNSW indexes are only shared page cache when opened with MMAP_IFC;
+# older faiss builds only have IO_FLAG_MMAP, which still maps IVF inverted lists
+MMAP_FLAGS = [
+    getattr(faiss, name) | faiss.IO_FLAG_READ_ONLY
+    for name in ("IO_FLAG_MMAP_IFC", "IO_FLAG_MMAP")
+    if hasattr(faiss, name)
+]
+
+
+def published_root(path: str) -> str:
+    return os.path.join(path, PUBLISHED_DIR)
+
+
+def current_version(path: str) -> Optional[str]:
+    """Version name of the latest published snapshot, if any"""
+    try:
+        with open(os.path.join(published_root(path), CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class PositionIds(Mapping):
+    """Identity index-to-docstore mapping, so workers never build a per-process dict"""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, position: int) -> int:
+        if not 0 <= position < self.size:
+            raise KeyError(position)
+        return position
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.size))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class MmapDocstore(Docstore):
+    """Read-only docstore over a published chunks file, looked up by index position.
+
+    Chunk records are JSON documents packed back to back in chunks.bin, with
+    their byte offsets in offsets.npy. Both are memory-mapped, so every worker
+    shares the same page cache instead of unpickling its own copy.
+    """
+
+    def __init__(self, folder: str):
+        self.offsets = np.load(os.path.join(folder, OFFSETS_FILE), mmap_mode="r")
+        self._file = open(os.path.join(folder, CHUNKS_FILE), "rb")
+        # mmap refuses empty files; an empty snapshot has no chunks to read anyway
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def search(self, search) -> Document:
+        position = int(search)
+        if not 0 <= position < len(self):
+            return f"ID {search} not found."
+        record = json.loads(self._data[self.offsets[position]:self.offsets[position + 1]])
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def prefetch(self):
+        """Ask the kernel to read the chunks file in ahead of the first lookups"""
+        if isinstance(self._data, mmap.mmap) and hasattr(mmap, "MADV_WILLNEED"):
+            self._data.madvise(mmap.MADV_WILLNEED)
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+def publish_snapshot(store: FAISS, path: str, keep: int = 2, lexical: Optional[BM25Index] = None) -> str:
+    """Write the store as a versioned read-only snapshot and point CURRENT at it
+
+    The BM25 index, if given, is re-keyed by index position to match the
+    published docstore.
+
+    Readers only ever see complete snapshots: each version is written to a
+    temporary directory, renamed into place, and then CURRENT is swapped
+    atomically. The newest `keep` versions are retained; older ones can be
+    removed safely because workers still mapping them keep the inodes alive.
+    """
+    root = published_root(path)
+    os.makedirs(root, exist_ok=True)
+    version = str(time.time_ns())
+    tmp_dir = os.path.join(root, f"{version}.tmp")
+    os.makedirs(tmp_dir)
+
+    offsets = [0]
+    with open(os.path.join(tmp_dir, CHUNKS_FILE), "wb") as f:
+        for position in range(store.index.ntotal):
+            doc_id = store.index_to_docstore_id[position]
+            doc = store.docstore.search(doc_id)
+            record = json.dumps({"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata}).encode()
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(os.path.join(tmp_dir, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+    faiss.write_index(store.index, os.path.join(tmp_dir, INDEX_FILE))
+    if lexical is not None:
+        positions = [p for p in range(store.index.ntotal) if store.index_to_docstore_id[p] in lexical.lengths]
+        published = BM25Index(lexical.k1, lexical.b)
+        published.add_term_counts(
+            positions,
+            lexical.term_counts([store.index_to_docstore_id[p] for p in positions])
+        )
+        published.save(os.path.join(tmp_dir, LEXICAL_FILE))
+    os.replace(tmp_dir, os.path.join(root, version))
+
+    current_tmp = os.path.join(root, f"{CURRENT_FILE}.tmp")
+    with open(current_tmp, "w") as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(root, CURRENT_FILE))
+
+    versions = sorted(name for name in os.listdir(root) if name.isdigit())
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    logger.info(f"Published vector store snapshot {version} with {store.index.ntotal} vectors")
+    return version
+
+
+def _read_index_mmap(index_path: str) -> faiss.Index:
+    for flags in MMAP_FLAGS:
+        try:
+            return faiss.read_index(index_path, flags)
+        except RuntimeError:
+            continue
+    logger.warning(f"Could not memory-map {index_path}, loading a private copy")
+    return faiss.read_index(index_path)
+
+
+def load_published(
+    path: str,
+    embeddings,
+    index_spec: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[FAISS], Optional[str]]:
+    """Open the current published snapshot memory-mapped and read-only
+
+    Returns (store, version), or (None, None) if nothing has been published.
+    """
+    version = current_version(path)
+    if version is None:
+        return None, None
+    folder = os.path.join(published_root(path), version)
+    index = _read_index_mmap(os.path.join(folder, INDEX_FILE))
+    configure_search(index, index_spec or DEFAULT_INDEX_SPEC, direct_map=False)
+    docstore = MmapDocstore(folder)
+    store = FAISS(embeddings, index, docstore, PositionIds(len(docstore)))
+    logger.info(f"Memory-mapped vector store snapshot {version} with {index.ntotal} vectors")
+    return store, version
+
+
+def load_published_lexical(path: str, version: str) -> Optional[BM25Index]:
+    """BM25 index of a published snapshot, keyed by index position"""
+    lexical_path = os.path.join(published_root(path), version, LEXICAL_FILE)
+    if not os.path.exists(lexical_path):
+        return None
+    lexical = BM25Index()
+    lexical.load(lexical_path)
+    return lexical
@@ -0,0 +1,158 @@
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from app.core.concurrency import stream_llm
+from app.utils.latency import LatencyStats
+from app.utils.tokens import count_tokens
+from typing import Any, AsyncIterator, Dict, Optional
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Answers in which the model admits the context did not cover the question
+UNKNOWN_ANSWER_PATTERN = re.compile(
+    r"\b(?:i\s+(?:don'?t|do\s+not)\s+know"
+    r"|i'?m\s+not\s+sure"
+    r"|i\s+(?:don'?t|do\s+not)\s+have\s+(?:that|this|enough|any)\s+information"
+    r"|(?:not|isn'?t)\s+(?:mentioned|provided|covered|specified)\s+in\s+the\s+(?:context|documents?))",
+    re.IGNORECASE
+)
+
+ESCALATION_REASONS = ("low_retrieval_score", "complex", "empty", "unknown", "error")
+
+
+class ModelTier:
+    """One model behind the answer prompt, with latency, token and cost counters"""
+
+    def __init__(self, name: str, llm, prompt: PromptTemplate, model: str, input_cost_per_1k: float = 0.0, output_cost_per_1k: float = 0.0):
+        self.name = name
+        self.model = model
+        self.prompt = prompt
+        self.chain = prompt | llm | StrOutputParser()
+        self.input_cost_per_1k = input_cost_per_1k
+        self.output_cost_per_1k = output_cost_per_1k
+        self.latency = LatencyStats()
+        self._stats = {
+            "calls": 0,
+            "answered": 0,
+            "input_tokens": 0,
+            "output_tokens": 0
+        }
+
+    def hit(self):
+        """Count an answer served by this tier"""
+        self._stats["answered"] += 1
+
+    def record(self, input_tokens: int, output: str, seconds: float):
+        output_tokens = count_tokens(output, self.model)
+        self._stats["calls"] += 1
+        self._stats["input_tokens"] += input_tokens
+        self._stats["output_tokens"] += output_tokens
+        self.latency.add(seconds)
+
+    def cost(self) -> float:
+        return (
+            self._stats["input_tokens"] * self.input_cost_per_1k
+            + self._stats["output_tokens"] * self.output_cost_per_1k
+        ) / 1000
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            **self._stats,
+            "cost_usd": round(self.cost(), 4),
+            "latency_ms": self.latency.summary()
+        }
+
+
+class ModelCascade:
+    """Answers with a fast model first and escalates to the strong model only when needed.
+
+    A question goes straight to the strong tier when its top dense similarity
+    is below min_retrieval_score or it is flagged as complex. Otherwise the
+    fast tier answers; the first probe_chars of its stream are held back and,
+    if the answer is empty or admits not knowing, it is discarded and the strong
+    tier answers instead, as it does if the fast tier fails before the probe
+    completes. Once the probe passes, the fast answer streams through
+    unchanged, so an admission later in a long answer is not caught.
+    """
+
+    def __init__(self, strong: ModelTier, fast: Optional[ModelTier] = None, min_retrieval_score: float = 0.3, probe_chars: int = 200):
+        self.strong = strong
+        self.fast = fast
+        self.min_retrieval_score = min_retrieval_score
+        self.probe_chars = probe_chars
+        self._escalations = {reason: 0 for reason in ESCALATION_REASONS}
+        self._requests = 0
+
+    def _escalation_reason(self, retrieval_score: Optional[float], complex_query: bool) -> Optional[str]:
+        if complex_query:
+            return "complex"
+        if retrieval_score is not None and retrieval_score < self.min_retrieval_score:
+            return "low_retrieval_score"
+        return None
+
+    async def _amodel_stream(self, tier: ModelTier, inputs: Dict[str, str], input_tokens: int) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        output = ""
+        try:
+            async for chunk in tier.chain.astream(inputs):
+                output += chunk
+                yield chunk
+        finally:
+            tier.record(input_tokens, output, time.perf_counter() - start)
+
+    def _astream_tier(self, tier: ModelTier, inputs: Dict[str, str], input_tokens: int) -> AsyncIterator[str]:
+        # The LLM slot is held only while the model generates, not while chunks are sent on
+        return stream_llm(self._amodel_stream(tier, inputs, input_tokens))
+
+    async def astream(self, inputs: Dict[str, str], retrieval_score: Optional[float] = None, complex_query: bool = False) -> AsyncIterator[str]:
+        """Stream the answer from the cheapest tier that can give one"""
+        self._requests += 1
+        input_tokens = count_tokens(self.strong.prompt.format(**inputs), self.strong.model)
+        reason = self._escalation_reason(retrieval_score, complex_query) if self.fast else None
+
+        if self.fast and reason is None:
+            stream = self._astream_tier(self.fast, inputs, input_tokens)
+            head = ""
+            try:
+                async for chunk in stream:
+                    head += chunk
+                    if len(head) >= self.probe_chars:
+                        break
+            except Exception as e:
+                logger.error(f"Error from {self.fast.model}: {e}")
+                reason = "error"
+            if reason is None and not head.strip():
+                reason = "empty"
+            elif reason is None and UNKNOWN_ANSWER_PATTERN.search(head):
+                reason = "unknown"
+            if reason is None:
+                self.fast.hit()
+                yield head
+                async for chunk in stream:
+                    yield chunk
+                return
+            await stream.aclose()
+
+        if reason:
+            self._escalations[reason] += 1
+            logger.info(f"Escalating to {self.strong.model}: {reason}")
+        self.strong.hit()
+        async for chunk in self._astream_tier(self.strong, inputs, input_tokens):
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        tiers = [tier for tier in (self.fast, self.strong) if tier]
+        tier_stats = {}
+        for tier in tiers:
+            stats = tier.stats()
+            stats["hit_ratio"] = round(stats["answered"] / self._requests, 3) if self._requests else 0.0
+            tier_stats[tier.name] = stats
+        return {
+            "requests": self._requests,
+            "tiers": tier_stats,
+            "escalations": self._escalations,
+            "cost_usd": round(sum(tier.cost() for tier in tiers), 4)
+        }
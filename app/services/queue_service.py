@@ -0,0 +1,309 @@
+from app.core.config import get_settings
+from app.core import metrics
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple
+from collections import deque
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# A handler either finishes the job before returning, or returns a future that
+# resolves when it is done; the job is acknowledged only then, without holding a worker
+MessageHandler = Callable[[Dict[str, Any]], Awaitable[Optional[asyncio.Future]]]
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be enqueued because the queue is at capacity"""
+
+
+# Add a job only while the stream, which keeps entries until they are acknowledged,
+# holds fewer than ARGV[1]; checked atomically so concurrent producers cannot overshoot
+_BOUNDED_XADD = """
+if tonumber(ARGV[1]) > 0 and redis.call('XLEN', KEYS[1]) >= tonumber(ARGV[1]) then
+    return false
+end
+return redis.call('XADD', KEYS[1], '*', 'job', ARGV[2])
+"""
+
+
+class InMemoryMessageQueue:
+    """Process-local queue backed by asyncio.Queue
+
+    maxsize bounds jobs until they are acknowledged, not just those waiting,
+    so jobs held by workers count against the same capacity.
+    """
+
+    backend = "memory"
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._unacked = 0
+
+    async def start(self):
+        # Created lazily so the queue binds to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+
+    async def put(self, job: Dict[str, Any]):
+        if self.maxsize and self._unacked >= self.maxsize:
+            raise QueueFullError(f"Queue is full ({self.maxsize} jobs)")
+        self._queue.put_nowait(job)
+        self._unacked += 1
+
+    async def get(self) -> Tuple[Optional[str], Dict[str, Any]]:
+        job = await self._queue.get()
+        return None, job
+
+    async def ack(self, token: Optional[str]):
+        self._unacked -= 1
+        self._queue.task_done()
+
+    async def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def close(self):
+        pass
+
+
+class RedisStreamMessageQueue:
+    """Queue shared across workers and nodes, backed by a Redis stream and consumer group
+
+    Entries stay in the stream until acknowledged, so maxsize bounds waiting and
+    in-flight jobs together. Entries left pending by a consumer that died or was
+    stopped mid-job are reclaimed every claim_idle_ms by whichever worker polls next.
+    """
+
+    backend = "redis"
+
+    def __init__(self, redis_client, stream_key: str, group: str, claim_idle_ms: int = 60000, maxsize: int = 0):
+        self.redis = redis_client
+        self.stream_key = stream_key
+        self.group = group
+        self.claim_idle_ms = claim_idle_ms
+        self.maxsize = maxsize
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._claimed: deque = deque()
+        self._next_claim = 0.0
+        self._xadd = redis_client.register_script(_BOUNDED_XADD)
+
+    async def start(self):
+        try:
+            await self.redis.xgroup_create(self.stream_key, self.group, id="0", mkstream=True)
+        except Exception as e:
+            # BUSYGROUP means another worker already created it
+            if "BUSYGROUP" not in str(e):
+                raise
+        await self._reclaim()
+
+    async def _reclaim(self):
+        """Take over entries left pending by consumers that died or stopped mid-job"""
+        self._next_claim = time.monotonic() + self.claim_idle_ms / 1000
+        try:
+            _, entries, *_ = await self.redis.xautoclaim(
+                self.stream_key, self.group, self.consumer, self.claim_idle_ms, count=100
+            )
+            self._claimed.extend(entries)
+            if entries:
+                logger.info(f"Reclaimed {len(entries)} pending messages from stale consumers")
+        except Exception as e:
+            logger.error(f"Error reclaiming pending messages: {e}")
+
+    async def put(self, job: Dict[str, Any]):
+        entry_id = await self._xadd(keys=[self.stream_key], args=[self.maxsize, json.dumps(job)])
+        if entry_id is None:
+            raise QueueFullError(f"Queue is full ({self.maxsize} jobs)")
+
+    async def get(self) -> Tuple[Optional[str], Dict[str, Any]]:
+        while True:
+            if not self._claimed and time.monotonic() >= self._next_claim:
+                await self._reclaim()
+            if self._claimed:
+                entry_id, fields = self._claimed.popleft()
+            else:
+                response = await self.redis.xreadgroup(
+                    self.group, self.consumer, {self.stream_key: ">"}, count=1, block=5000
+                )
+                if not response:
+                    continue
+                entry_id, fields = response[0][1][0]
+            if not fields:
+                # Entry was deleted from the stream while pending
+                await self.ack(entry_id)
+                continue
+            return entry_id, json.loads(fields[b"job"])
+
+    async def ack(self, token: Optional[str]):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xack(self.stream_key, self.group, token)
+        pipe.xdel(self.stream_key, token)
+        await pipe.execute()
+
+    async def depth(self) -> int:
+        return await self.redis.xlen(self.stream_key)
+
+    async def close(self):
+        pass
+
+
+class MessageQueueService:
+    """Accepts webhook jobs and drains them with a pool of async workers
+
+    At most max_pending jobs are taken off the queue and not yet acknowledged,
+    counting those whose handler deferred completion. Both backends count these
+    jobs against their own capacity until acknowledged, so this adds none.
+    A job whose handler is cancelled on shutdown is left unacknowledged, for the
+    Redis backend to redeliver.
+    """
+
+    def __init__(self, queue, handler: MessageHandler, concurrency: int = 4, max_pending: int = 1000):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self._pending = asyncio.Semaphore(max(self.concurrency, max_pending))
+        self._workers: list = []
+        self._finishing: set = set()
+        self._wait_times: deque = deque(maxlen=1000)
+        self._in_flight = 0
+        self._processed = 0
+        self._failed = 0
+
+    async def start(self):
+        """Start the worker pool"""
+        await self.queue.start()
+        for n in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._worker(n)))
+        logger.info(f"Started {self.concurrency} queue workers ({self.queue.backend} backend)")
+
+    async def stop(self):
+        """Cancel the workers and release the queue"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Deferred jobs still being answered are acknowledged when they finish
+        if self._finishing:
+            await asyncio.gather(*self._finishing, return_exceptions=True)
+        await self.queue.close()
+
+    async def enqueue(self, job: Dict[str, Any]):
+        """Add a job to the queue, stamping it with the enqueue time"""
+        job["enqueued_at"] = time.time()
+        await self.queue.put(job)
+
+    async def _worker(self, n: int):
+        while True:
+            await self._pending.acquire()
+            try:
+                token, job = await self.queue.get()
+            except asyncio.CancelledError:
+                self._pending.release()
+                raise
+            except Exception as e:
+                self._pending.release()
+                logger.error(f"Queue worker {n} failed to fetch a job: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            wait = time.time() - job.get("enqueued_at", time.time())
+            self._wait_times.append(wait)
+            metrics.observe(metrics.QUEUE, wait)
+            self._in_flight += 1
+            try:
+                completion = await self.handler(job)
+            except asyncio.CancelledError:
+                self._release()
+                raise
+            except Exception as e:
+                self._record_failure(n, e)
+                await self._ack(n, token)
+                continue
+
+            if asyncio.isfuture(completion):
+                # Finished later (e.g. a coalesced burst); this worker moves on to the next job
+                task = asyncio.create_task(self._complete(n, token, completion))
+                self._finishing.add(task)
+                task.add_done_callback(self._finishing.discard)
+            else:
+                self._processed += 1
+                await self._ack(n, token)
+
+    async def _complete(self, n: int, token: Optional[str], completion: asyncio.Future):
+        """Acknowledge a deferred job once its handler has finished it"""
+        try:
+            await asyncio.shield(completion)
+            self._processed += 1
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        except Exception as e:
+            self._record_failure(n, e)
+        await self._ack(n, token)
+
+    def _record_failure(self, n: int, error: Exception):
+        self._failed += 1
+        metrics.record_error(metrics.QUEUE)
+        logger.error(f"Queue worker {n} failed to process job: {error}")
+
+    def _release(self):
+        self._in_flight -= 1
+        self._pending.release()
+
+    async def _ack(self, n: int, token: Optional[str]):
+        self._release()
+        try:
+            await self.queue.ack(token)
+        except Exception as e:
+            logger.error(f"Queue worker {n} failed to ack job: {e}")
+
+    async def depth(self) -> Optional[int]:
+        """Jobs waiting in the queue, or None if it cannot be read"""
+        try:
+            return await self.queue.depth()
+        except Exception as e:
+            logger.error(f"Error reading queue depth: {e}")
+            return None
+
+    async def stats(self) -> Dict[str, Any]:
+        """Queue depth, worker utilisation and wait-time statistics"""
+        waits = sorted(self._wait_times)
+        depth = await self.depth()
+        return {
+            "backend": self.queue.backend,
+            "workers": self.concurrency,
+            "depth": depth,
+            "in_flight": self._in_flight,
+            "processed": self._processed,
+            "failed": self._failed,
+            "wait_time_ms": {
+                "avg": round(1000 * sum(waits) / len(waits), 2) if waits else 0.0,
+                "p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 2) if waits else 0.0,
+                "max": round(1000 * waits[-1], 2) if waits else 0.0
+            }
+        }
+
+
+def create_message_queue(handler: MessageHandler) -> MessageQueueService:
+    """Build the queue service for the configured backend"""
+    if settings.QUEUE_BACKEND == "redis":
+        from app.core.redis import get_async_redis
+        queue = RedisStreamMessageQueue(
+            get_async_redis(),
+            settings.QUEUE_STREAM_KEY,
+            settings.QUEUE_CONSUMER_GROUP,
+            claim_idle_ms=settings.QUEUE_CLAIM_IDLE_MS,
+            maxsize=settings.QUEUE_MAX_SIZE
+        )
+    else:
+        queue = InMemoryMessageQueue(maxsize=settings.QUEUE_MAX_SIZE)
+    return MessageQueueService(
+        queue,
+        handler,
+        concurrency=settings.QUEUE_WORKERS,
+        max_pending=settings.QUEUE_MAX_SIZE
+    )
@@ -0,0 +1,231 @@
+from langchain.prompts import PromptTemplate
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, get_buffer_string
+from langchain_core.output_parsers import StrOutputParser
+from app.core import metrics
+from app.core.concurrency import get_llm_semaphore, stream_llm
+from app.services.bm25_index import reciprocal_rank_fusion
+from typing import AsyncIterator, Dict, Any, Hashable, List, Optional, Tuple
+import asyncio
+import contextlib
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANSWER_TEMPLATE = """You are a helpful travel assistant for Reindeer Holidays. Use the following pieces of context to answer the user's question.
+If you don't know the answer, just say that you don't know, don't try to make up an answer.
+Always maintain a friendly and professional tone, and include relevant emojis where appropriate.
+
+Context: {context}
+Chat History: {chat_history}
+Question: {question}
+Answer:"""
+
+ANSWER_PROMPT = PromptTemplate(
+    input_variables=["context", "chat_history", "question"],
+    template=ANSWER_TEMPLATE
+)
+
+
+class RAGPipeline:
+    """Retrieval and generation pipeline built once per process and shared by all sessions.
+
+    Conversation history is passed in per call, so the same prompt, LLM client
+    and retriever serve every conversation.
+
+    With a BM25 index, retrieval is hybrid: lexical and dense candidates are
+    merged by reciprocal-rank fusion, and a decisive lexical match (normalized
+    BM25 score at least lexical_min_coverage and lexical_margin times the
+    runner-up) is returned directly without embedding the question or searching
+    the vector index.
+
+    With a ContextAssembler, retrieved chunks are merged, diversified and
+    trimmed to a token budget before they go into the prompt. With a
+    ModelCascade, answers come from the cheapest model tier that can give one,
+    using the top dense similarity to decide when to go straight to the
+    strong model.
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        llm,
+        embeddings=None,
+        prompt: PromptTemplate = ANSWER_PROMPT,
+        k: int = 4,
+        lock=None,
+        lexical=None,
+        candidates: int = 20,
+        rrf_k: int = 60,
+        lexical_min_coverage: float = 0.8,
+        lexical_margin: float = 1.5,
+        assembler=None,
+        cascade=None
+    ):
+        self.llm = llm
+        self.prompt = prompt
+        self.k = k
+        self.vector_store = vector_store
+        self.lexical = lexical
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.lexical_min_coverage = lexical_min_coverage
+        self.lexical_margin = lexical_margin
+        self.assembler = assembler
+        self.cascade = cascade
+        self.embeddings = embeddings or vector_store.embeddings
+        # Held while searching so ingestion never mutates the index mid-search
+        self.lock = lock or contextlib.nullcontext()
+        self.condense_chain = CONDENSE_QUESTION_PROMPT | llm | StrOutputParser()
+        self.answer_chain = prompt | llm | StrOutputParser()
+
+    async def acondense(self, question: str, chat_history: List[BaseMessage]) -> str:
+        """Rephrase a follow-up question into a standalone one"""
+        if not chat_history:
+            return question
+        async with get_llm_semaphore():
+            with metrics.track(metrics.LLM):
+                return await self.condense_chain.ainvoke({
+                    "question": question,
+                    "chat_history": get_buffer_string(chat_history)
+                })
+
+    async def aretrieve(self, question: str, embedding: Optional[List[float]] = None) -> List[Document]:
+        """Fetch the chunks most relevant to a standalone question
+
+        Pass the question's embedding when it is already known to skip a second embedding call.
+        """
+        docs, _ = await self.aretrieve_scored(question, embedding)
+        return docs
+
+    async def aretrieve_scored(
+        self,
+        question: str,
+        embedding: Optional[List[float]] = None,
+        lexical_hits: Optional[List[Tuple[Hashable, float]]] = None
+    ) -> Tuple[List[Document], Optional[float]]:
+        """Fetch the most relevant chunks and the best retrieval score
+
+        The score is the top dense cosine similarity only: normalized BM25
+        scores are on a different scale, so they never feed a cosine threshold.
+        It is None if no dense search ran, including on the lexical fast path,
+        where a decisive keyword match already counts as confident retrieval.
+        Pass lexical_hits from alexical_search when they are already known.
+        """
+        if lexical_hits is None:
+            lexical_hits = await self.alexical_search(question)
+        if self.is_decisive(lexical_hits):
+            logger.info(f"Lexical fast path for query: {question}")
+            docs = await asyncio.to_thread(self._fetch, [key for key, _ in lexical_hits[:self.k]])
+            return docs, None
+        if embedding is None:
+            with metrics.track(metrics.EMBED):
+                embedding = await self.embeddings.aembed_query(question)
+        return await asyncio.to_thread(self._search, embedding, [key for key, _ in lexical_hits])
+
+    async def alexical_search(self, question: str) -> List[Tuple[Hashable, float]]:
+        """BM25 candidates for a question, or none without a lexical index"""
+        if self.lexical is None:
+            return []
+        return await asyncio.to_thread(self._lexical_search, question)
+
+    def is_decisive(self, hits: List[Tuple[Hashable, float]]) -> bool:
+        """True if the top BM25 hit is strong enough to answer from without an embedding"""
+        if not hits or not self.lexical_min_coverage or hits[0][1] < self.lexical_min_coverage:
+            return False
+        return len(hits) == 1 or hits[0][1] >= self.lexical_margin * hits[1][1]
+
+    def _lexical_search(self, question: str) -> List[Tuple[Hashable, float]]:
+        with self.lock, metrics.track(metrics.SEARCH):
+            return self.lexical.search(question, k=self.candidates, normalize=True)
+
+    def _search(
+        self, embedding: List[float], lexical_keys: Optional[List[Hashable]] = None
+    ) -> Tuple[List[Document], Optional[float]]:
+        with self.lock, metrics.track(metrics.SEARCH):
+            store = self.vector_store
+            n = min(self.candidates if lexical_keys else self.k, store.index.ntotal)
+            if n == 0:
+                return [], None
+            distances, positions = store.index.search(np.asarray([embedding], dtype="float32"), n)
+            dense_keys = [store.index_to_docstore_id[int(p)] for p in positions[0] if p != -1]
+            keys = reciprocal_rank_fusion([dense_keys, lexical_keys], k=self.rrf_k) if lexical_keys else dense_keys
+            score = self._similarity(float(distances[0][0])) if dense_keys else None
+            return self._fetch(keys[:self.k]), score
+
+    def _similarity(self, distance: float) -> float:
+        """Cosine similarity for a FAISS distance, assuming unit-length embeddings"""
+        if self.vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+            return distance
+        # Squared L2 distance between unit vectors is 2 - 2 * cosine
+        return 1.0 - distance / 2
+
+    def _fetch(self, keys: List[Hashable]) -> List[Document]:
+        """Resolve docstore keys to documents, skipping any no longer present"""
+        with self.lock:
+            docs = [self.vector_store.docstore.search(key) for key in keys]
+        return [doc for doc in docs if isinstance(doc, Document)]
+
+    async def acontext(self, docs: List[Document]) -> str:
+        """Prompt context for retrieved chunks, assembled within the token budget if configured"""
+        if self.assembler is None:
+            return "\n\n".join(doc.page_content for doc in docs)
+        context, _ = await asyncio.to_thread(self.assembler.assemble, docs)
+        return context
+
+    async def agenerate(
+        self,
+        question: str,
+        docs: List[Document],
+        chat_history: List[BaseMessage],
+        retrieval_score: Optional[float] = None,
+        complex_query: bool = False
+    ) -> str:
+        """Answer a question from retrieved context"""
+        if self.cascade is not None:
+            return "".join([
+                chunk async for chunk in self.astream_generate(question, docs, chat_history, retrieval_score, complex_query)
+            ])
+        context = await self.acontext(docs)
+        async with get_llm_semaphore():
+            with metrics.track(metrics.LLM):
+                return await self.answer_chain.ainvoke({
+                    "context": context,
+                    "chat_history": get_buffer_string(chat_history),
+                    "question": question
+                })
+
+    async def astream_generate(
+        self,
+        question: str,
+        docs: List[Document],
+        chat_history: List[BaseMessage],
+        retrieval_score: Optional[float] = None,
+        complex_query: bool = False
+    ) -> AsyncIterator[str]:
+        """Answer a question from retrieved context, yielding text as the LLM produces it"""
+        inputs = {
+            "context": await self.acontext(docs),
+            "chat_history": get_buffer_string(chat_history),
+            "question": question
+        }
+        if self.cascade is not None:
+            async for chunk in self.cascade.astream(inputs, retrieval_score, complex_query):
+                yield chunk
+            return
+        async for chunk in stream_llm(self.answer_chain.astream(inputs)):
+            yield chunk
+
+    async def arun(self, question: str, chat_history: List[BaseMessage]) -> Dict[str, Any]:
+        """Condense, retrieve and answer in one call"""
+        standalone = await self.acondense(question, chat_history)
+        docs, score = await self.aretrieve_scored(standalone)
+        answer = await self.agenerate(standalone, docs, chat_history, score)
+        return {
+            "question": standalone,
+            "answer": answer,
+            "source_documents": docs
+        }
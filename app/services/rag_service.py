@@ -1,212 +1,381 @@
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.chat_message_histories import RedisChatMessageHistory
 from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationalRetrievalChain
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.prompts import PromptTemplate
+from app.services.rag_pipeline import ANSWER_PROMPT, RAGPipeline
+from app.services.model_cascade import ModelCascade, ModelTier
+from app.services.semantic_cache import SemanticCache
+from app.services.context_assembler import ContextAssembler
+from app.services.session_memory import create_session_memory
+from app.services.intent_router import FALLBACK_MESSAGE, WELCOME_MESSAGE, is_complex
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.index_store import IndexStore, file_sha256
+from app.services.faiss_index import index_spec_from_settings
+from app.services.mmap_store import MmapDocstore, current_version, load_published, load_published_lexical
+from app.utils.latency import LatencyStats
+from app.utils.tokens import count_tokens
+from app.core.config import get_settings
+from app.core import metrics
+import asyncio
+import numpy as np
 import os
 import logging
-from typing import Dict
-import re
-import json
+import time
+from typing import AsyncIterator, Dict, Callable, Optional
 
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
-class RAGService:
-    def __init__(self, redis_client):
-        self.embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-small",
-            openai_api_key=os.getenv("OPENAI_API_KEY")
+def create_embeddings():
+    """Embeddings model used for indexing and queries, behind the on-disk cache if enabled"""
+    embeddings = OpenAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
+        openai_api_key=os.getenv("OPENAI_API_KEY")
+    )
+    if settings.EMBEDDING_CACHE_ENABLED:
+        # Unchanged chunks are never re-embedded on re-ingestion or rebuilds
+        embeddings = CachedEmbeddings(
+            embeddings,
+            settings.EMBEDDING_MODEL,
+            settings.EMBEDDING_CACHE_PATH
         )
-        self.redis_client = redis_client
+    return embeddings
+
+class RAGService:
+    def __init__(self):
+        self.embeddings = create_embeddings()
+        
+        # Seeds an empty vector store
+        self.welcome_message = WELCOME_MESSAGE
+        
         self.vector_store = self.initialize_vector_store()
-        # Dictionary to store conversation memories
-        self.conversation_memories: Dict[str, ConversationBufferMemory] = {}
         
-        # Base URL for Reindeer Holidays
-        self.base_url = "https://www.reindeerholidays.com/destination"
+        # The LLM clients, prompt and retriever are built once and shared by every session;
+        # the fast model also condenses follow-ups and summarizes history
+        self.llm = ChatOpenAI(
+            model=settings.MODEL_NAME,
+            temperature=0.7,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            callbacks=[metrics.TokenUsageCallback()]
+        )
+        self.fast_llm = ChatOpenAI(
+            model=settings.FAST_MODEL_NAME,
+            temperature=0.7,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            callbacks=[metrics.TokenUsageCallback()]
+        ) if settings.MODEL_CASCADE_ENABLED else self.llm
+        self.pipeline = RAGPipeline(
+            self.vector_store,
+            self.fast_llm,
+            embeddings=self.embeddings,
+            lock=self.index_store.lock,
+            lexical=self.index_store.lexical if settings.HYBRID_SEARCH_ENABLED else None,
+            candidates=settings.HYBRID_CANDIDATES,
+            rrf_k=settings.HYBRID_RRF_K,
+            lexical_min_coverage=settings.LEXICAL_FAST_PATH_MIN_COVERAGE,
+            lexical_margin=settings.LEXICAL_FAST_PATH_MARGIN,
+            k=settings.RETRIEVAL_K,
+            assembler=self._create_context_assembler(),
+            cascade=self._create_model_cascade()
+        )
+        self.response_cache = self._create_response_cache()
         
-        # Welcome messages
-        self.welcome_message = """Hi! 👋 Welcome to Reindeer Holidays 🦌
-
-Thanks for reaching out!
-We create personalized travel packages to make your trips unforgettable 🌍✈️
-Let us know your destination, travel dates, and interests — and we'll get started with the perfect plan for you!
-
-Looking forward to planning your next adventure! 😊"""
-
-        self.welcome_back_message = """Welcome back! 👋 
-
-How can I help you with your travel plans today? 🌍"""
+        # Bounded, token-windowed conversation history per session, in memory or shared via Redis
+        self.memory = create_session_memory(summary_llm=self.fast_llm)
+        # Latest background history append per session, awaited before that session's next read
+        self._pending_history: Dict[str, asyncio.Task] = {}
+        # Event loop reused by the synchronous wrappers; async Redis clients bind to the first loop they run on
+        self._sync_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Time from starting a query to the LLM's first token
+        self.ttfb = LatencyStats()
         
+    def _create_model_cascade(self):
+        """Create the fast-then-strong model cascade, if enabled"""
+        if not settings.MODEL_CASCADE_ENABLED:
+            return None
+        return ModelCascade(
+            strong=ModelTier(
+                "strong",
+                self.llm,
+                ANSWER_PROMPT,
+                settings.MODEL_NAME,
+                settings.MODEL_INPUT_COST_PER_1K,
+                settings.MODEL_OUTPUT_COST_PER_1K
+            ),
+            fast=ModelTier(
+                "fast",
+                self.fast_llm,
+                ANSWER_PROMPT,
+                settings.FAST_MODEL_NAME,
+                settings.FAST_MODEL_INPUT_COST_PER_1K,
+                settings.FAST_MODEL_OUTPUT_COST_PER_1K
+            ),
+            min_retrieval_score=settings.CASCADE_MIN_RETRIEVAL_SCORE,
+            probe_chars=settings.CASCADE_PROBE_CHARS
+        )
+    
+    def _create_context_assembler(self):
+        """Create the token-budgeted context assembler, if enabled"""
+        if not settings.CONTEXT_ASSEMBLY_ENABLED:
+            return None
+        return ContextAssembler(
+            token_budget=settings.CONTEXT_TOKEN_BUDGET,
+            mmr_lambda=settings.CONTEXT_MMR_LAMBDA,
+            max_overlap=settings.CHUNK_OVERLAP
+        )
+    
+    def _create_response_cache(self):
+        """Create the semantic response cache, if enabled"""
+        if not settings.SEMANTIC_CACHE_ENABLED:
+            return None
+        redis_client = None
+        if settings.SEMANTIC_CACHE_BACKEND == "redis":
+            from app.core.redis import get_async_redis
+            redis_client = get_async_redis()
+        return SemanticCache(
+            self.embeddings,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+            redis_client=redis_client
+        )
+    
     def initialize_vector_store(self):
         """Initialize or load the FAISS vector store"""
-        vector_store_path = "data/vector_store"
-        os.makedirs(vector_store_path, exist_ok=True)
-        
+        self.index_store = IndexStore(
+            settings.VECTOR_STORE_PATH,
+            self.embeddings,
+            index_spec=index_spec_from_settings(settings),
+            max_shards=settings.VECTOR_STORE_MAX_SHARDS
+        )
+        self.index_version = None
+        if settings.VECTOR_STORE_MODE == "mmap":
+            # Share one page-cached copy of the published snapshot across workers
+            try:
+                store, self.index_version = load_published(
+                    settings.VECTOR_STORE_PATH,
+                    self.embeddings,
+                    self.index_store.index_spec
+                )
+                if store is not None:
+                    self.index_store.vector_store = store
+                    self.index_store.lexical = load_published_lexical(settings.VECTOR_STORE_PATH, self.index_version)
+                    return store
+                logger.warning("No published vector store snapshot found, loading a private copy")
+            except Exception as e:
+                logger.error(f"Error memory-mapping published vector store: {e}")
         try:
-            # Try to load existing vector store
-            return FAISS.load_local(
-                vector_store_path,
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
+            # Load the base snapshot plus any delta shards
+            return self.index_store.load([self.welcome_message])
         except Exception as e:
             logger.info(f"No existing vector store found or error loading: {e}")
             # Create new vector store with welcome message
-            return FAISS.from_texts(
+            self.index_store.vector_store = FAISS.from_texts(
                 [self.welcome_message],
                 self.embeddings
             )
+            return self.index_store.vector_store
     
-    def add_document(self, file_path: str):
-        """Add a new document to the vector store"""
+    def reload_vector_store(self) -> bool:
+        """Swap in a newer published snapshot in mmap mode; returns True if one was loaded"""
+        if settings.VECTOR_STORE_MODE != "mmap":
+            return False
+        version = current_version(settings.VECTOR_STORE_PATH)
+        if version is None or version == self.index_version:
+            return False
         try:
+            store, version = load_published(settings.VECTOR_STORE_PATH, self.embeddings, self.index_store.index_spec)
+            lexical = load_published_lexical(settings.VECTOR_STORE_PATH, version)
+        except Exception as e:
+            logger.error(f"Error reloading published vector store {version}: {e}")
+            return False
+        
+        with self.index_store.lock:
+            previous = self.vector_store
+            self.vector_store = store
+            self.pipeline.vector_store = store
+            self.index_store.vector_store = store
+            self.index_store.lexical = lexical
+            if settings.HYBRID_SEARCH_ENABLED:
+                self.pipeline.lexical = lexical
+        self.index_version = version
+        if isinstance(previous.docstore, MmapDocstore):
+            previous.docstore.close()
+        logger.info(f"Reloaded vector store snapshot {version}")
+        return True
+    
+    async def areload_vector_store(self) -> bool:
+        """Reload the published snapshot off the event loop, dropping cached answers if it changed"""
+        reloaded = await asyncio.to_thread(self.reload_vector_store)
+        if reloaded and self.response_cache:
+            await self.response_cache.ainvalidate()
+        return reloaded
+    
+    def warmup(self):
+        """Touch the index, docstore, lexical index and tokenizer once, so the first query does not pay for it"""
+        with self.index_store.lock:
+            store = self.pipeline.vector_store
+            index = store.index
+            if index.ntotal:
+                # A flat index scans every vector, faulting in all of a memory-mapped snapshot
+                index.search(np.zeros((1, index.d), dtype="float32"), min(self.pipeline.k, index.ntotal))
+            if isinstance(store.docstore, MmapDocstore):
+                store.docstore.prefetch()
+            if self.pipeline.lexical is not None:
+                self.pipeline.lexical.search(self.welcome_message)
+        count_tokens(self.welcome_message, settings.MODEL_NAME)
+    
+    def add_document(self, file_path: str, progress: Optional[Callable[..., None]] = None):
+        """Add a new document to the vector store, skipping files already ingested
+        
+        progress, if given, is called with keyword updates (pages_parsed, chunks_total,
+        chunks_embedded, index_persisted, skipped) as ingestion advances.
+        """
+        progress = progress or (lambda **kwargs: None)
+        if settings.VECTOR_STORE_MODE == "mmap":
+            logger.error(f"Vector store is read-only in mmap mode; ingest {file_path} with ingest.py and reload")
+            return False
+        try:
+            sha256 = file_sha256(file_path)
+            if self.index_store.is_unchanged(file_path, sha256):
+                progress(skipped=True)
+                return True
+            
             loader = PyPDFLoader(file_path)
-            documents = loader.load()
+            documents = []
+            for page in loader.lazy_load():
+                documents.append(page)
+                progress(pages_parsed=len(documents))
             
             # Split documents into chunks
             text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
+                chunk_size=settings.CHUNK_SIZE,
+                chunk_overlap=settings.CHUNK_OVERLAP
             )
             chunks = text_splitter.split_documents(documents)
+            progress(chunks_total=len(chunks))
             
-            # Add to vector store
-            self.vector_store.add_documents(chunks)
-            
-            # Save vector store
-            self.vector_store.save_local("data/vector_store")
+            # Add to vector store, replacing chunks from a previous version, and persist the delta
+            added = self.index_store.upsert(file_path, sha256, chunks, progress=progress)
+            progress(index_persisted=True)
+            logger.info(f"Added {added} chunks from {file_path}")
             return True
         except Exception as e:
             logger.error(f"Error adding document: {e}")
             return False
     
-    def get_memory(self, session_id: str) -> ConversationBufferMemory:
-        """Get or create memory for a session"""
-        if session_id not in self.conversation_memories:
-            self.conversation_memories[session_id] = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True
-            )
-        return self.conversation_memories[session_id]
-    
-    def _is_booking_request(self, query: str) -> tuple[bool, str]:
-        """Check if the query is a booking request and extract destination"""
-        # Common booking-related phrases
-        booking_phrases = [
-            r"book.*trip.*to\s+(\w+)",
-            r"book.*holiday.*to\s+(\w+)",
-            r"book.*vacation.*to\s+(\w+)",
-            r"book.*package.*to\s+(\w+)",
-            r"want.*to.*book.*to\s+(\w+)",
-            r"need.*to.*book.*to\s+(\w+)",
-            r"looking.*to.*book.*to\s+(\w+)"
-        ]
-        
-        query = query.lower()
-        for pattern in booking_phrases:
-            match = re.search(pattern, query)
-            if match:
-                destination = match.group(1).strip()
-                return True, destination
-        return False, ""
-    
-    def _get_booking_url(self, destination: str) -> str:
-        """Generate the booking URL for a destination"""
-        # Convert destination to URL format
-        destination = destination.lower().replace(" ", "-")
-        return f"{self.base_url}/{destination}"
-    
-    def _is_first_message(self, session_id: str) -> bool:
-        """Check if this is the user's first message using Redis"""
-        if not self.redis_client:
-            return True  # If no Redis, treat as first message
-            
+    async def aadd_document(self, file_path: str, progress: Optional[Callable[..., None]] = None):
+        """Add a document off the event loop, dropping cached answers if the corpus changed"""
+        changed = False
+        
+        def track(**update):
+            nonlocal changed
+            changed = changed or bool(update.get("index_persisted"))
+            if progress:
+                progress(**update)
+        
+        success = await asyncio.to_thread(self.add_document, file_path, progress=track)
+        if changed and self.response_cache:
+            await self.response_cache.ainvalidate()
+        return success
+    
+    def _run_sync(self, coroutine):
+        """Run a coroutine for a synchronous caller, always on the same event loop"""
+        if self._sync_loop is None or self._sync_loop.is_closed():
+            self._sync_loop = asyncio.new_event_loop()
+        return self._sync_loop.run_until_complete(coroutine)
+    
+    def get_response(self, query: str, session_id: str):
+        """Synchronous wrapper around aget_response for scripts and the CLI"""
+        async def run():
+            response = await self.aget_response(query, session_id)
+            await self.aflush_history()
+            return response
+        return self._run_sync(run())
+    
+    def _record_turn(self, session_id: str, query: str, answer: str):
+        """Append a turn to the history in the background so the reply is not held up"""
+        previous = self._pending_history.get(session_id)
+        task = asyncio.create_task(self._append_turn(previous, session_id, query, answer))
+        self._pending_history[session_id] = task
+        
+        def forget(done: asyncio.Task):
+            if self._pending_history.get(session_id) is done:
+                del self._pending_history[session_id]
+        task.add_done_callback(forget)
+    
+    async def _append_turn(self, previous: Optional[asyncio.Task], session_id: str, query: str, answer: str):
+        # Keep a session's turns in order even if appends overlap
+        if previous:
+            await asyncio.gather(previous, return_exceptions=True)
+        await self.memory.aappend(session_id, query, answer)
+    
+    async def aflush_history(self):
+        """Wait for pending history appends, e.g. before shutdown"""
+        if self._pending_history:
+            await asyncio.gather(*self._pending_history.values(), return_exceptions=True)
+    
+    async def _astream_answer(self, query: str, session_id: str) -> AsyncIterator[str]:
+        """Answer a question with RAG, yielding the answer as it is generated"""
+        logger.info(f"Processing query: {query}")
+        start = time.perf_counter()
+        pending = self._pending_history.get(session_id)
+        if pending:
+            await asyncio.gather(pending, return_exceptions=True)
+        with metrics.track(metrics.SESSION):
+            chat_history = await self.memory.ahistory(session_id)
+        standalone = await self.pipeline.acondense(query, chat_history)
+        
+        # A decisive keyword match is answered from its chunks without embedding the question,
+        # so it skips the semantic cache, which is keyed on embeddings
+        lexical_hits = await self.pipeline.alexical_search(standalone)
+        
+        # Serve near-duplicate questions from the semantic cache
+        embedding = None
+        if self.response_cache and not self.pipeline.is_decisive(lexical_hits):
+            cached, embedding = await self.response_cache.alookup(standalone)
+            if cached is not None:
+                self._record_turn(session_id, query, cached)
+                yield cached
+                return
+        
+        docs, score = await self.pipeline.aretrieve_scored(standalone, embedding, lexical_hits)
+        answer = ""
+        async for chunk in self.pipeline.astream_generate(standalone, docs, chat_history, score, is_complex(standalone)):
+            if chunk and not answer:
+                self.ttfb.add(time.perf_counter() - start)
+            answer += chunk
+            yield chunk
+        if not answer.strip():
+            raise ValueError(f"Empty answer for query: {query}")
+        
+        # Only first-turn answers are cached; later ones may lean on the conversation
+        if self.response_cache and not chat_history and embedding is not None:
+            await self.response_cache.astore(standalone, answer, embedding)
+        
+        self._record_turn(session_id, query, answer)
+    
+    async def astream_response(self, query: str, session_id: str) -> AsyncIterator[str]:
+        """Answer a question with RAG, yielding text chunks as the LLM produces them
+        
+        If generation fails part-way, the apology follows what was already yielded.
+        """
         try:
-            # Check if session exists in Redis
-            session_key = f"session:{session_id}"
-            session_data = self.redis_client.get(session_key)
-            
-            if not session_data:
-                # First time user, create session
-                self.redis_client.set(session_key, json.dumps({"message_count": 1}))
-                return True
-            else:
-                # Update message count
-                data = json.loads(session_data)
-                data["message_count"] += 1
-                self.redis_client.set(session_key, json.dumps(data))
-                return False
-                
+            async for chunk in self._astream_answer(query, session_id):
+                yield chunk
         except Exception as e:
-            logger.error(f"Error checking session: {e}")
-            return True  # On error, treat as first message
+            logger.error(f"RAG processing error: {str(e)}")
+            yield FALLBACK_MESSAGE
     
-    def get_response(self, query: str, session_id: str):
-        """Get response using RAG or handle booking request"""
+    async def aget_response(self, query: str, session_id: str):
+        """Answer a question with RAG, using the session's conversation history"""
         try:
-            # Check if it's a greeting
-            if query.lower() in ["hi", "hello", "hey", "greetings", "start"]:
-                if self._is_first_message(session_id):
-                    return self.welcome_message
-                else:
-                    return self.welcome_back_message
-            
-            # Check if it's a booking request
-            is_booking, destination = self._is_booking_request(query)
-            if is_booking:
-                booking_url = self._get_booking_url(destination)
-                return f"I'll help you book your trip to {destination.title()}. You can view and book packages here: {booking_url}"
-            
-            # If not a booking request, use RAG
-            memory = self.get_memory(session_id)
-            
-            template = """You are a helpful travel assistant for Reindeer Holidays. Use the following pieces of context to answer the user's question.
-            If you don't know the answer, just say that you don't know, don't try to make up an answer.
-            Always maintain a friendly and professional tone, and include relevant emojis where appropriate.
-            
-            Context: {context}
-            Chat History: {chat_history}
-            Question: {question}
-            Answer:"""
-            
-            prompt = PromptTemplate(
-                input_variables=["context", "chat_history", "question"],
-                template=template
-            )
-            
-            chain = ConversationalRetrievalChain.from_llm(
-                llm=ChatOpenAI(
-                    model="gpt-4",
-                    temperature=0.7,
-                    openai_api_key=os.getenv("OPENAI_API_KEY")
-                ),
-                retriever=self.vector_store.as_retriever(),
-                memory=memory,
-                combine_docs_chain_kwargs={"prompt": prompt},
-                verbose=True
-            )
-            
-            logger.info(f"Processing query: {query}")
-            response = chain({"question": query})
-            
-            if isinstance(response, dict) and "answer" in response:
-                return response["answer"]
-            elif isinstance(response, str):
-                return response
-            else:
-                logger.error(f"Unexpected response format: {response}")
-                return "I apologize, but I'm having trouble processing your request at the moment."
-            
+            return "".join([chunk async for chunk in self._astream_answer(query, session_id)])
         except Exception as e:
             logger.error(f"RAG processing error: {str(e)}")
-            return "I apologize, but I'm having trouble processing your request at the moment."
+            return FALLBACK_MESSAGE
     
     def clear_memory(self, session_id: str):
         """Clear conversation memory for a session"""
-        if session_id in self.conversation_memories:
-            del self.conversation_memories[session_id] 
\ No newline at end of file
+        self._run_sync(self.memory.aclear(session_id))
\ No newline at end of file
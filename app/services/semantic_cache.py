@@ -0,0 +1,245 @@
+from collections import OrderedDict
+from app.core import metrics
+from typing import Dict, Any, List, Optional, Tuple
+import faiss
+import logging
+import numpy as np
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Response cache keyed on query embeddings.
+
+    Questions are matched against previously answered ones by cosine similarity
+    in a small dedicated FAISS index; anything above the threshold is served from
+    the cache instead of running retrieval and the LLM. Entries expire after a TTL,
+    the least recently used are evicted beyond max_entries, and ainvalidate() drops
+    everything when the document corpus changes.
+
+    Answers are held in process memory, or shared by every worker through Redis
+    when a client is given. In Redis each entry is a hash holding the question,
+    answer and vector under a global ID, and a sorted set lists the live IDs.
+    Before each lookup a worker adds entries stored by other workers to its local
+    FAISS index. A generation counter, bumped on invalidation, tells every worker
+    to drop its index. Beyond max_entries, the oldest shared entries are evicted.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        threshold: float = 0.92,
+        max_entries: int = 5000,
+        ttl_seconds: int = 86400,
+        redis_client=None,
+        key_prefix: str = "semcache"
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self._generation_key = f"{key_prefix}:generation"
+        self._next_id_key = f"{key_prefix}:next_id"
+        self._ids_key = f"{key_prefix}:ids"
+        self._index: Optional[faiss.IndexIDMap2] = None
+        # id -> entry (memory backend) or id -> expiry (Redis backend), in LRU order
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        # Redis backend: generation the local index belongs to, and the highest shared ID loaded
+        self._generation: Optional[int] = None
+        self._synced_id = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0
+        }
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray([vector], dtype="float32")
+        faiss.normalize_L2(array)
+        return array
+
+    def _entry_key(self, entry_id: int) -> str:
+        return f"{self.key_prefix}:entry:{entry_id}"
+
+    def _remove(self, entry_id: int):
+        self._entries.pop(entry_id, None)
+        if self._index is not None:
+            self._index.remove_ids(np.array([entry_id], dtype="int64"))
+
+    def _reset(self):
+        self._index = None
+        self._entries.clear()
+        self._synced_id = 0
+
+    def _add(self, entry_id: int, query: np.ndarray, entry: Dict[str, Any]):
+        """Add an entry to the local index, evicting the least recently used beyond max_entries"""
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(query.shape[1]))
+        self._entries[entry_id] = entry
+        self._index.add_with_ids(query, np.array([entry_id], dtype="int64"))
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    async def _apull(self):
+        """Follow invalidations and load entries other workers stored since the last sync"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(self._generation_key)
+        pipe.zrangebyscore(self._ids_key, f"({self._synced_id}", "+inf")
+        generation, new_ids = await pipe.execute()
+        generation = int(generation or 0)
+        if generation != self._generation:
+            if self._generation is not None:
+                logger.info("Semantic cache invalidated by another worker")
+            had_synced = self._synced_id > 0
+            self._reset()
+            self._generation = generation
+            if had_synced:
+                new_ids = await self.redis.zrange(self._ids_key, 0, -1)
+        new_ids = [int(entry_id) for entry_id in new_ids]
+        if not new_ids:
+            return
+        self._synced_id = max(self._synced_id, *new_ids)
+        new_ids = [entry_id for entry_id in new_ids if entry_id not in self._entries]
+        pipe = self.redis.pipeline(transaction=False)
+        for entry_id in new_ids:
+            pipe.hmget(self._entry_key(entry_id), "generation", "vector")
+        gone = []
+        expires_at = time.time() + self.ttl_seconds
+        for entry_id, (entry_generation, vector) in zip(new_ids, await pipe.execute()):
+            if vector is None:
+                gone.append(entry_id)
+            elif int(entry_generation) == generation:
+                self._add(entry_id, np.frombuffer(vector, dtype="float32").reshape(1, -1), {"expires_at": expires_at})
+        if gone:
+            # Expired by TTL; stop listing them
+            await self.redis.zrem(self._ids_key, *gone)
+
+    async def alookup(self, question: str) -> Tuple[Optional[str], List[float]]:
+        """Return (cached answer or None, query embedding)
+
+        The embedding is returned so a miss can reuse it for retrieval.
+        """
+        with metrics.track(metrics.EMBED):
+            vector = await self.embeddings.aembed_query(question)
+        answer = None
+        try:
+            answer = await self._alookup_vector(vector)
+        except Exception as e:
+            logger.error(f"Semantic cache lookup failed: {e}")
+        self._stats["hits" if answer is not None else "misses"] += 1
+        return answer, vector
+
+    async def _alookup_vector(self, vector: List[float]) -> Optional[str]:
+        if self.redis is not None:
+            await self._apull()
+        if self._index is None or self._index.ntotal == 0:
+            return None
+        scores, ids = self._index.search(self._normalize(vector), 1)
+        score, entry_id = float(scores[0][0]), int(ids[0][0])
+        if entry_id < 0 or score < self.threshold or entry_id not in self._entries:
+            return None
+
+        if self.redis is not None:
+            question, answer = await self.redis.hmget(self._entry_key(entry_id), "question", "answer")
+            if answer is None:
+                # Expired in Redis or evicted by another worker
+                self._stats["expirations"] += 1
+                self._remove(entry_id)
+                return None
+            entry = {"question": question.decode(), "answer": answer.decode()}
+            # An eviction or invalidation may have run while Redis answered
+            if entry_id not in self._entries:
+                return None
+        else:
+            entry = self._entries[entry_id]
+            if entry["expires_at"] < time.time():
+                self._stats["expirations"] += 1
+                self._remove(entry_id)
+                return None
+
+        self._entries.move_to_end(entry_id)
+        logger.info(f"Semantic cache hit (similarity {score:.3f}) for: {entry['question']}")
+        return entry["answer"]
+
+    async def astore(self, question: str, answer: str, vector: List[float]):
+        """Cache an answer under the question's embedding"""
+        try:
+            query = self._normalize(vector)
+            if self.redis is not None:
+                entry_id = await self._astore_shared(question, answer, query)
+                if entry_id is None:
+                    return
+                entry = {"expires_at": time.time() + self.ttl_seconds}
+            else:
+                entry_id = self._next_id
+                self._next_id += 1
+                entry = {"question": question, "answer": answer, "expires_at": time.time() + self.ttl_seconds}
+            self._add(entry_id, query, entry)
+            self._stats["stores"] += 1
+        except Exception as e:
+            logger.error(f"Semantic cache store failed: {e}")
+
+    async def _astore_shared(self, question: str, answer: str, query: np.ndarray) -> Optional[int]:
+        """Write an entry to Redis and list it for other workers; returns its ID"""
+        if self._generation is None:
+            await self._apull()
+        generation = self._generation
+        entry_id = await self.redis.incr(self._next_id_key)
+        key = self._entry_key(entry_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, mapping={
+            "question": question,
+            "answer": answer,
+            "generation": generation,
+            "vector": query.tobytes()
+        })
+        pipe.expire(key, self.ttl_seconds)
+        pipe.zadd(self._ids_key, {entry_id: entry_id})
+        # Evict the oldest shared entries beyond max_entries
+        pipe.zrange(self._ids_key, 0, -(self.max_entries + 1))
+        pipe.zremrangebyrank(self._ids_key, 0, -(self.max_entries + 1))
+        *_, evicted, _ = await pipe.execute()
+        if evicted:
+            await self.redis.delete(*[self._entry_key(int(evicted_id)) for evicted_id in evicted])
+            self._stats["evictions"] += len(evicted)
+        if generation != self._generation:
+            # Invalidated while storing; the entry belongs to the old corpus
+            return None
+        return entry_id
+
+    async def ainvalidate(self):
+        """Drop every cached answer, e.g. after the document corpus changed"""
+        self._reset()
+        self._stats["invalidations"] += 1
+        if self.redis is not None:
+            # Other workers compare their generation against this counter on their next lookup
+            try:
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.incr(self._generation_key)
+                pipe.delete(self._ids_key)
+                generation, _ = await pipe.execute()
+                self._generation = int(generation)
+            except Exception as e:
+                self._generation = None
+                logger.error(f"Error publishing semantic cache invalidation: {e}")
+        logger.info("Semantic cache invalidated")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate and eviction counters"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "backend": "redis" if self.redis is not None else "memory"
+        }
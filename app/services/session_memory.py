@@ -0,0 +1,289 @@
+from collections import OrderedDict
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, get_buffer_string
+from langchain_core.output_parsers import StrOutputParser
+from app.core.concurrency import get_llm_semaphore
+from app.core.config import get_settings
+from app.utils.tokens import count_tokens, truncate_tokens
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import logging
+import time
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# (question, answer, tokens)
+Turn = Tuple[str, str, int]
+
+
+def _messages(summary: str, turns: List[Turn]) -> List[BaseMessage]:
+    """Prompt history: the running summary, then the turns as human/AI pairs"""
+    messages: List[BaseMessage] = []
+    if summary:
+        messages.append(SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+    for question, answer, _ in turns:
+        messages.extend([HumanMessage(content=question), AIMessage(content=answer)])
+    return messages
+
+
+def _fit_turn(turn: Turn, max_tokens: int) -> Turn:
+    """Truncate a turn larger than the budget, giving the question at most half of it"""
+    question, answer, tokens = turn
+    if tokens <= max_tokens:
+        return turn
+    question = truncate_tokens(question, max_tokens // 2)
+    answer = truncate_tokens(answer, max(max_tokens - count_tokens(question), 0))
+    return question, answer, count_tokens(question) + count_tokens(answer)
+
+
+def _split_to_budget(turns: List[Turn], max_tokens: int) -> Tuple[List[Turn], List[Turn]]:
+    """Split turns into (older ones over budget, newest ones within it)
+
+    The latest turn is always kept, truncated if it alone exceeds the budget.
+    """
+    kept = 0
+    total = 0
+    for _, _, tokens in reversed(turns):
+        if kept and total + tokens > max_tokens:
+            break
+        total += tokens
+        kept += 1
+    older, newest = turns[:len(turns) - kept], turns[len(turns) - kept:]
+    if len(newest) == 1:
+        newest = [_fit_turn(newest[0], max_tokens)]
+    return older, newest
+
+
+async def _summarize(summary_chain, summary: str, turns: List[Turn]) -> str:
+    """Fold turns into the running summary; the old summary is kept on failure"""
+    try:
+        async with get_llm_semaphore():
+            return await summary_chain.ainvoke({
+                "summary": summary,
+                "new_lines": get_buffer_string(_messages("", turns))
+            })
+    except Exception as e:
+        logger.error(f"Error summarizing conversation history: {e}")
+        return summary
+
+
+class SessionMemory:
+    """Bounded per-session conversation history held in process memory.
+
+    Sessions are kept in LRU order: idle ones expire after ttl_seconds and the
+    least recently used are evicted beyond max_sessions. Each session's history
+    is trimmed, oldest turn first, to max_history_tokens. With a summary LLM the
+    trimmed turns are folded into a running summary that is passed to the
+    prompt ahead of the remaining turns; otherwise they are dropped.
+    """
+
+    backend = "memory"
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        ttl_seconds: int = 86400,
+        max_history_tokens: int = 1000,
+        summary_llm=None
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_history_tokens = max_history_tokens
+        self.summary_chain = SUMMARY_PROMPT | summary_llm | StrOutputParser() if summary_llm else None
+        # session_id -> {"turns": [Turn], "summary", "tokens", "last_access"}
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._stats = {
+            "evictions": 0,
+            "expirations": 0,
+            "trimmed_turns": 0,
+            "summaries": 0
+        }
+
+    def _expire(self, now: float):
+        """Drop sessions idle for longer than the TTL; they sit at the LRU end"""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session["last_access"] < self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self._stats["expirations"] += 1
+
+    def _get(self, session_id: str, create: bool = False) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        self._expire(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = {"turns": [], "summary": "", "tokens": 0, "last_access": now}
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats["evictions"] += 1
+        session["last_access"] = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def ahistory(self, session_id: str) -> List[BaseMessage]:
+        """Messages to pass to the prompt: the running summary, then the recent turns"""
+        session = self._get(session_id)
+        if session is None:
+            return []
+        return _messages(session["summary"], session["turns"])
+
+    async def aappend(self, session_id: str, question: str, answer: str):
+        """Record a turn, then trim the history to the token budget"""
+        session = self._get(session_id, create=True)
+        tokens = count_tokens(question) + count_tokens(answer)
+        session["turns"].append((question, answer, tokens))
+
+        trimmed, session["turns"] = _split_to_budget(session["turns"], self.max_history_tokens)
+        session["tokens"] = sum(turn[2] for turn in session["turns"])
+        if not trimmed:
+            return
+        self._stats["trimmed_turns"] += len(trimmed)
+        if self.summary_chain:
+            session["summary"] = await _summarize(self.summary_chain, session["summary"], trimmed)
+            self._stats["summaries"] += 1
+
+    async def aclear(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire(time.time())
+        sessions = len(self._sessions)
+        return {
+            "backend": self.backend,
+            **self._stats,
+            "sessions": sessions,
+            "max_sessions": self.max_sessions,
+            "avg_history_tokens": round(sum(s["tokens"] for s in self._sessions.values()) / sessions, 1) if sessions else 0.0,
+            "summarized_sessions": sum(1 for s in self._sessions.values() if s["summary"])
+        }
+
+
+class RedisSessionMemory:
+    """Conversation history shared by every worker and node, stored in Redis.
+
+    Each session is a capped list of JSON turns plus an optional summary string,
+    both expiring after ttl_seconds of inactivity, so no session affinity is
+    needed. A history load is one pipelined round trip; the token window is
+    applied to what it returns. Appends trim the list to max_turns and, with a
+    summary LLM, fold turns beyond the token budget into the summary.
+    """
+
+    backend = "redis"
+
+    def __init__(
+        self,
+        redis_client,
+        ttl_seconds: int = 86400,
+        max_history_tokens: int = 1000,
+        max_turns: int = 20,
+        summary_llm=None,
+        key_prefix: str = "chat"
+    ):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_history_tokens = max_history_tokens
+        self.max_turns = max_turns
+        self.key_prefix = key_prefix
+        self.summary_chain = SUMMARY_PROMPT | summary_llm | StrOutputParser() if summary_llm else None
+        self._stats = {
+            "loads": 0,
+            "appends": 0,
+            "errors": 0,
+            "trimmed_turns": 0,
+            "summaries": 0,
+            "history_tokens": 0
+        }
+
+    def _keys(self, session_id: str) -> Tuple[str, str]:
+        return f"{self.key_prefix}:{session_id}:turns", f"{self.key_prefix}:{session_id}:summary"
+
+    async def _load(self, session_id: str) -> Tuple[str, List[Turn]]:
+        turns_key, summary_key = self._keys(session_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lrange(turns_key, 0, -1)
+            pipe.get(summary_key)
+            raw_turns, summary = await pipe.execute()
+        turns = [tuple(json.loads(raw)) for raw in raw_turns]
+        if isinstance(summary, bytes):
+            summary = summary.decode()
+        return summary or "", turns
+
+    async def ahistory(self, session_id: str) -> List[BaseMessage]:
+        """Messages to pass to the prompt, loaded in one round trip; empty if Redis is unavailable"""
+        try:
+            summary, turns = await self._load(session_id)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Error loading chat history for {session_id}: {e}")
+            return []
+        _, turns = _split_to_budget(turns, self.max_history_tokens)
+        self._stats["loads"] += 1
+        self._stats["history_tokens"] += sum(turn[2] for turn in turns)
+        return _messages(summary, turns)
+
+    async def aappend(self, session_id: str, question: str, answer: str):
+        """Append a turn, capping the list and refreshing the TTL in one transaction"""
+        turns_key, summary_key = self._keys(session_id)
+        turn = (question, answer, count_tokens(question) + count_tokens(answer))
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.rpush(turns_key, json.dumps(turn))
+                pipe.ltrim(turns_key, -self.max_turns, -1)
+                pipe.expire(turns_key, self.ttl_seconds)
+                pipe.expire(summary_key, self.ttl_seconds)
+                await pipe.execute()
+            self._stats["appends"] += 1
+            if self.summary_chain:
+                await self._fold_into_summary(session_id)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Error appending chat history for {session_id}: {e}")
+
+    async def _fold_into_summary(self, session_id: str):
+        summary, turns = await self._load(session_id)
+        trimmed, _ = _split_to_budget(turns, self.max_history_tokens)
+        if not trimmed:
+            return
+        summary = await _summarize(self.summary_chain, summary, trimmed)
+        turns_key, summary_key = self._keys(session_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            # Turns appended meanwhile are at the right end, so dropping from the left is safe
+            pipe.ltrim(turns_key, len(trimmed), -1)
+            pipe.set(summary_key, summary, ex=self.ttl_seconds)
+            await pipe.execute()
+        self._stats["trimmed_turns"] += len(trimmed)
+        self._stats["summaries"] += 1
+
+    async def aclear(self, session_id: str):
+        await self.redis.delete(*self._keys(session_id))
+
+    def stats(self) -> Dict[str, Any]:
+        loads = self._stats["loads"]
+        stats = {"backend": self.backend, **self._stats}
+        stats["avg_history_tokens"] = round(stats.pop("history_tokens") / loads, 1) if loads else 0.0
+        return stats
+
+
+def create_session_memory(summary_llm=None):
+    """Build the conversation history store for the configured backend"""
+    summary_llm = summary_llm if settings.HISTORY_SUMMARY_ENABLED else None
+    if settings.CHAT_HISTORY_BACKEND == "redis":
+        from app.core.redis import get_async_redis
+        return RedisSessionMemory(
+            get_async_redis(),
+            ttl_seconds=settings.SESSION_TTL_SECONDS,
+            max_history_tokens=settings.HISTORY_MAX_TOKENS,
+            max_turns=settings.HISTORY_MAX_TURNS,
+            summary_llm=summary_llm
+        )
+    return SessionMemory(
+        max_sessions=settings.SESSION_MAX_SESSIONS,
+        ttl_seconds=settings.SESSION_TTL_SECONDS,
+        max_history_tokens=settings.HISTORY_MAX_TOKENS,
+        summary_llm=summary_llm
+    )
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from app.core.config import get_settings
+from typing import Dict, Any
+import logging
+import time
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class InMemorySessionStore:
+    """Process-local session counters, for tests and running without Redis"""
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds: int = 2592000, max_sessions: int = 100000):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        # session_id -> {"message_count", "last_seen"}, least recently seen first
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def touch(self, session_id: str) -> int:
+        """Count a message for the session and return the new message count"""
+        now = time.time()
+        session = self._sessions.get(session_id)
+        if session is None or now - session["last_seen"] >= self.ttl_seconds:
+            session = {"message_count": 0}
+            self._sessions[session_id] = session
+        session["message_count"] += 1
+        session["last_seen"] = now
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session["message_count"]
+
+    async def get(self, session_id: str) -> Dict[str, Any]:
+        session = self._sessions.get(session_id)
+        if session is None or time.time() - session["last_seen"] >= self.ttl_seconds:
+            return {}
+        return dict(session)
+
+
+class RedisSessionStore:
+    """Session counters in Redis hashes, shared by every worker and node.
+
+    A touch is a single MULTI/EXEC round trip: HINCRBY the message count, HSET
+    the last-seen time and refresh the TTL, so concurrent messages never race.
+    """
+
+    backend = "redis"
+
+    def __init__(self, redis_client, ttl_seconds: int = 2592000, key_prefix: str = "session"):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.key_prefix}:{session_id}"
+
+    async def touch(self, session_id: str) -> int:
+        """Count a message for the session and return the new message count"""
+        key = self._key(session_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, "message_count", 1)
+            pipe.hset(key, "last_seen", time.time())
+            pipe.expire(key, self.ttl_seconds)
+            count, _, _ = await pipe.execute()
+        return int(count)
+
+    async def get(self, session_id: str) -> Dict[str, Any]:
+        data = await self.redis.hgetall(self._key(session_id))
+        if not data:
+            return {}
+        data = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in data.items()
+        }
+        return {"message_count": int(data["message_count"]), "last_seen": float(data["last_seen"])}
+
+
+async def is_first_message(store, session_id: str) -> bool:
+    """Touch the session and report whether this was its first message"""
+    try:
+        return await store.touch(session_id) == 1
+    except Exception as e:
+        logger.error(f"Error checking session: {e}")
+        return True  # On error, treat as first message
+
+
+def create_session_store():
+    """Build the session store for the configured backend"""
+    if settings.SESSION_STORE_BACKEND == "redis":
+        from app.core.redis import get_async_redis
+        return RedisSessionStore(get_async_redis(), ttl_seconds=settings.SESSION_STORE_TTL_SECONDS)
+    return InMemorySessionStore(ttl_seconds=settings.SESSION_STORE_TTL_SECONDS)
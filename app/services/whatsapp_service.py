@@ -1,16 +1,16 @@
 import httpx
 from app.core.config import get_settings
-from typing import Dict, Any
-import json
+from app.core import metrics
+from app.utils.message_chunks import split_message
+from typing import Dict, Any, List, Optional
 import logging
-import redis
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
 class WhatsAppService:
     def __init__(self):
-        self.base_url = "https://graph.facebook.com/v17.0"  # Using latest stable version
+        self.base_url = settings.WHATSAPP_API_BASE_URL
         self.access_token = settings.WHATSAPP_ACCESS_TOKEN
         self.phone_number_id = settings.WHATSAPP_PHONE_NUMBER_ID
         self.headers = {
@@ -18,108 +18,112 @@ class WhatsAppService:
             "Content-Type": "application/json"
         }
         
-        # Initialize Redis client
-        self.redis_client = redis.from_url(settings.REDIS_URL)
-        
-        # Welcome messages
-        self.welcome_message = """Hi! 👋 Welcome to Reindeer Holidays 🦌
-
-Thanks for reaching out!
-We create personalized travel packages to make your trips unforgettable 🌍✈️
-Let us know your destination, travel dates, and interests — and we'll get started with the perfect plan for you!
-
-Looking forward to planning your next adventure! 😊"""
-
-        self.welcome_back_message = """Welcome back! 👋 
-
-How can I help you with your travel plans today? 🌍"""
+        # Shared HTTP client, created on first use and closed on shutdown
+        self._client: Optional[httpx.AsyncClient] = None
     
-    def _is_first_message(self, from_number: str) -> bool:
-        """Check if this is the user's first message using Redis"""
+    def _create_client(self) -> httpx.AsyncClient:
+        """Create the pooled keep-alive client used for all Graph API calls"""
+        limits = httpx.Limits(
+            max_connections=settings.WHATSAPP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.WHATSAPP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.WHATSAPP_KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(
+            settings.WHATSAPP_READ_TIMEOUT,
+            connect=settings.WHATSAPP_CONNECT_TIMEOUT
+        )
         try:
-            # Check if session exists in Redis
-            session_key = f"whatsapp:session:{from_number}"
-            session_data = self.redis_client.get(session_key)
-            
-            if not session_data:
-                # First time user, create session
-                self.redis_client.set(session_key, json.dumps({
-                    "message_count": 1,
-                    "last_message": None
-                }))
-                return True
-            else:
-                # Update message count
-                data = json.loads(session_data)
-                data["message_count"] += 1
-                self.redis_client.set(session_key, json.dumps(data))
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error checking session: {e}")
-            return True  # On error, treat as first message
+            return httpx.AsyncClient(
+                headers=self.headers,
+                limits=limits,
+                timeout=timeout,
+                http2=settings.WHATSAPP_HTTP2
+            )
+        except ImportError:
+            logger.warning("HTTP/2 support not installed (pip install 'httpx[http2]'), falling back to HTTP/1.1")
+            return httpx.AsyncClient(headers=self.headers, limits=limits, timeout=timeout)
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+    
+    async def warmup(self):
+        """Open a pooled connection to the Graph API so the first reply skips the TCP/TLS handshake"""
+        try:
+            await self.client.head(self.base_url)
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not pre-connect to the WhatsApp API: {e}")
     
-    def _get_welcome_message(self, from_number: str) -> str:
-        """Get appropriate welcome message based on session"""
-        if self._is_first_message(from_number):
-            return self.welcome_message
-        return self.welcome_back_message
+    async def aclose(self):
+        """Close the shared HTTP client and its pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     async def send_message(self, to_number: str, message: str) -> Dict[str, Any]:
-        """Send a WhatsApp message using the WhatsApp Business API"""
+        """Send a WhatsApp message using the WhatsApp Business API
+        
+        Text longer than the WhatsApp body limit is sent as several messages,
+        in order, split at paragraph, line, sentence or word breaks.
+        """
+        message_ids = []
         try:
             url = f"{self.base_url}/{self.phone_number_id}/messages"
             
-            payload = {
-                "messaging_product": "whatsapp",
-                "to": to_number,
-                "type": "text",
-                "text": {
-                    "body": message
+            for part in split_message(message, settings.WHATSAPP_MAX_BODY_CHARS):
+                payload = {
+                    "messaging_product": "whatsapp",
+                    "to": to_number,
+                    "type": "text",
+                    "text": {
+                        "body": part
+                    }
                 }
-            }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=self.headers, json=payload)
-                response.raise_for_status()
                 
-                return {
-                    "status": "success",
-                    "message_id": response.json().get("messages", [{}])[0].get("id")
-                }
+                with metrics.track(metrics.SEND):
+                    response = await self.client.post(url, json=payload)
+                    response.raise_for_status()
+                message_ids.append(response.json().get("messages", [{}])[0].get("id"))
+            
+            return {
+                "status": "success",
+                "message_id": message_ids[0] if message_ids else None,
+                "message_ids": message_ids
+            }
         except Exception as e:
             logger.error(f"Error sending WhatsApp message: {str(e)}")
             return {
                 "status": "error",
-                "error": str(e)
+                "error": str(e),
+                "message_ids": message_ids
             }
     
-    def parse_webhook(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Parse incoming webhook data from WhatsApp Business API"""
+    def parse_webhook(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Extract every text message from a webhook payload, across all entries and changes
+        
+        Batched deliveries can carry several messages; non-text messages and
+        status callbacks are skipped.
+        """
+        messages = []
         try:
-            # Extract the message details from the webhook
-            entry = data.get("entry", [{}])[0]
-            changes = entry.get("changes", [{}])[0]
-            value = changes.get("value", {})
-            messages = value.get("messages", [{}])[0]
-            
-            from_number = messages.get("from", "")
-            message_text = messages.get("text", {}).get("body", "")
-            
-            # Check if it's a greeting
-            if message_text.lower() in ["hi", "hello", "hey", "greetings", "start"]:
-                message_text = self._get_welcome_message(from_number)
-            
-            return {
-                "message": message_text,
-                "from_number": from_number,
-                "timestamp": messages.get("timestamp", ""),
-                "message_id": messages.get("id", "")
-            }
-        except Exception as e:
-            return {
-                "error": str(e)
-            }
+            for entry in data.get("entry") or []:
+                for change in entry.get("changes") or []:
+                    value = change.get("value") or {}
+                    for message in value.get("messages") or []:
+                        message_text = (message.get("text") or {}).get("body", "")
+                        if not message_text:
+                            continue
+                        messages.append({
+                            "message": message_text,
+                            "from_number": message.get("from", ""),
+                            "timestamp": message.get("timestamp", ""),
+                            "message_id": message.get("id", "")
+                        })
+        except (AttributeError, TypeError) as e:
+            logger.error(f"Malformed webhook payload: {e}")
+        return messages
     
     def verify_webhook(self, signature: str, url: str, params: Dict[str, Any]) -> bool:
         """Verify the webhook signature from WhatsApp Business API"""
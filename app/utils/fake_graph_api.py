@@ -0,0 +1,96 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Callable, List, Optional
+import json
+import threading
+import time
+import uuid
+
+
+class FakeGraphAPI:
+    """Local stand-in for the WhatsApp Graph API messages endpoint.
+
+    Records every request and the client connection it arrived on, so callers
+    can assert on payloads and on connection reuse. Point the app at it with
+    WHATSAPP_API_BASE_URL=fake.base_url. on_request, if given, is called from
+    the server thread with each recorded request.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        status_code: int = 200,
+        on_request: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.latency = latency
+        self.status_code = status_code
+        self.on_request = on_request
+        self.requests: List[Dict[str, Any]] = []
+        self.connections: set = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v17.0"
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                request = {
+                    "path": self.path,
+                    "headers": dict(self.headers),
+                    "json": body
+                }
+                with fake._lock:
+                    fake.connections.add(self.client_address)
+                    fake.requests.append(request)
+                if fake.on_request:
+                    fake.on_request(request)
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                if fake.status_code == 200:
+                    response = {
+                        "messaging_product": "whatsapp",
+                        "contacts": [{"input": body.get("to"), "wa_id": body.get("to")}],
+                        "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]
+                    }
+                else:
+                    response = {"error": {"message": "Fake Graph API error", "code": fake.status_code}}
+                payload = json.dumps(response).encode()
+                self.send_response(fake.status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeGraphAPI":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeGraphAPI":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
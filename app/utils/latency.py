@@ -0,0 +1,23 @@
+from collections import deque
+from typing import Dict
+
+
+class LatencyStats:
+    """Rolling window of durations summarised as count, average, p95 and max in milliseconds"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self._samples: deque = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self._samples.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        samples = sorted(self._samples)
+        return {
+            "count": self.count,
+            "avg": round(1000 * sum(samples) / len(samples), 2) if samples else 0.0,
+            "p95": round(1000 * samples[int(0.95 * (len(samples) - 1))], 2) if samples else 0.0,
+            "max": round(1000 * samples[-1], 2) if samples else 0.0
+        }
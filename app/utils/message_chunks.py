@@ -0,0 +1,49 @@
+from typing import AsyncIterator, List
+
+# WhatsApp rejects text bodies longer than this
+WHATSAPP_MAX_BODY_CHARS = 4096
+
+# Preferred places to break an over-long message, best first
+BREAKS = ("\n\n", "\n", ". ", " ")
+
+
+def _split_point(text: str, limit: int) -> int:
+    """Index to cut an over-long text at: the last natural break within the limit"""
+    for separator in BREAKS:
+        index = text.rfind(separator, 0, limit)
+        if index > 0:
+            return index + len(separator)
+    return limit
+
+
+def split_message(text: str, limit: int = WHATSAPP_MAX_BODY_CHARS) -> List[str]:
+    """Split text into parts no longer than limit, preferring paragraph, line, sentence and word breaks"""
+    parts = []
+    text = text.strip()
+    while len(text) > limit:
+        cut = _split_point(text, limit)
+        parts.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        parts.append(text)
+    return parts
+
+
+async def stream_paragraphs(chunks: AsyncIterator[str], limit: int = WHATSAPP_MAX_BODY_CHARS) -> AsyncIterator[str]:
+    """Regroup streamed text chunks into completed paragraphs, each at most limit characters"""
+    buffer = ""
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            end = buffer.find("\n\n")
+            if 0 <= end <= limit:
+                paragraph, buffer = buffer[:end], buffer[end + 2:]
+            elif len(buffer) > limit:
+                cut = _split_point(buffer, limit)
+                paragraph, buffer = buffer[:cut], buffer[cut:]
+            else:
+                break
+            if paragraph.strip():
+                yield paragraph.strip()
+    if buffer.strip():
+        yield buffer.strip()
@@ -0,0 +1,42 @@
+from functools import lru_cache
+from typing import Optional
+import logging
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token for English text, used when no encoding is available
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache()
+def get_encoding(model: str = "gpt-4") -> Optional[tiktoken.Encoding]:
+    """tiktoken encoding for a model, or None if its BPE ranks cannot be loaded
+
+    tiktoken downloads the ranks on first use, which fails on offline hosts
+    without a populated TIKTOKEN_CACHE_DIR.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4") -> str:
+    """Cut text down to at most max_tokens tokens"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
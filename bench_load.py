@@ -0,0 +1,422 @@
+"""Load test: throughput and tail latency of /api/webhook/whatsapp, fully offline.
+
+Starts the real app under uvicorn with OpenAI replaced by local fakes
+(deterministic embeddings and a chat model with configurable latency) and
+replies going to a local stand-in Graph API. Simulated users each send a
+message, wait for the full reply and send the next, drawing messages from a
+realistic mix of greetings, policy questions, booking links and agent requests.
+
+Reports webhook requests/s, p50/p95/p99 latency of the webhook acknowledgement,
+the first reply message and the full reply, and peak memory per worker.
+
+    python bench_load.py --users 50 --duration 30 --workers 2
+    python bench_load.py --users 20 --duration 10 --json load.json --max-p95-ms 2000   # CI gate
+"""
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.chat_models.fake import FakeListChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from app.utils.fake_graph_api import FakeGraphAPI
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import httpx
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Settings for the server processes are passed in this environment variable
+CONFIG_ENV = "BENCH_LOAD_CONFIG"
+
+# Ends every fake answer, so the driver knows a streamed reply is complete
+END_MARKER = "🦌"
+
+ANSWERS = [
+    "Travellers need a passport valid for at least six months from the date of return. " + END_MARKER,
+    "Cancellations made 30 days or more before departure are refunded in full, less a processing fee.\n\n"
+    "Between 15 and 29 days before departure, 50% of the package cost is refunded.\n\n"
+    "Within 14 days of departure no refund is possible, but the booking can be moved once. " + END_MARKER,
+    "Here is a suggested plan for your trip:\n\n"
+    "Day 1: Arrival, hotel check-in and an evening dhow cruise with dinner.\n\n"
+    "Day 2: Half-day city tour followed by the Burj Khalifa observation deck.\n\n"
+    "Day 3: Desert safari with dune bashing, a camel ride and a barbecue dinner.\n\n"
+    "Day 4: Free day for shopping, then airport transfer. " + END_MARKER,
+]
+
+# (intent, weight, messages)
+MESSAGE_MIX = [
+    ("rag", 0.6, [
+        "What documents do I need for international travel?",
+        "What is the cancellation policy?",
+        "What does the Dubai package include?",
+        "Can you suggest an itinerary for 4 days in Dubai?",
+        "Is travel insurance mandatory?",
+        "What is the baggage allowance on domestic flights?",
+    ]),
+    ("greeting", 0.15, ["hi", "Hello", "hey!"]),
+    ("booking_link", 0.15, [
+        "I want to book a trip to Bali",
+        "Book a holiday package to Dubai",
+        "I need to book a vacation to Thailand",
+    ]),
+    ("function_agent", 0.1, [
+        "Please reserve a hotel for next week",
+        "Can you schedule my airport transfer?",
+    ]),
+]
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    """Fake chat model that waits latency seconds before answering and streams word by word"""
+
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        response = self._call(messages)
+        for token in re.split(r"(?<=\s)", response):
+            if self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class SlowFakeEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic fake embeddings with a fixed per-query latency"""
+
+    latency: float = 0.0
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self.embed_query(text)
+
+
+def install_fakes(config: Dict[str, Any]):
+    """Replace the OpenAI clients with local fakes; must run before the app is imported"""
+    import app.services.rag_service as rag_service
+    import app.services.function_service as function_service
+
+    rag_service.OpenAIEmbeddings = lambda **kwargs: SlowFakeEmbeddings(
+        size=config["embedding_size"], latency=config["embedding_latency"]
+    )
+    chat_model = lambda **kwargs: SlowFakeChatModel(
+        responses=ANSWERS, latency=config["llm_latency"], tokens_per_second=config["llm_tokens_per_second"]
+    )
+    rag_service.ChatOpenAI = chat_model
+    function_service.ChatOpenAI = chat_model
+
+
+def create_app():
+    """uvicorn app factory run in every worker: the real app wired to the stand-ins"""
+    config = json.loads(os.environ[CONFIG_ENV])
+    install_fakes(config)
+    import main
+    # Per-message INFO logs would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    return main.app
+
+
+def ingest_corpus(corpus: str, config: Dict[str, Any]):
+    """Build the vector store from a directory of PDFs with the fake embeddings"""
+    install_fakes(config)
+    import ingest
+    argv = sys.argv
+    sys.argv = ["ingest.py", "--uploads-dir", corpus]
+    try:
+        ingest.main()
+    finally:
+        sys.argv = argv
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds"""
+    return {
+        "count": len(values),
+        "p50": round(1000 * percentile(values, 50), 2),
+        "p95": round(1000 * percentile(values, 95), 2),
+        "p99": round(1000 * percentile(values, 99), 2),
+        "max": round(1000 * max(values), 2) if values else 0.0
+    }
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and all its descendants (Linux /proc)"""
+    pids = [pid]
+    for child_pid in pids:
+        try:
+            with open(f"/proc/{child_pid}/task/{child_pid}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def is_helper(pid: int) -> bool:
+    """Whether a process is multiprocessing's resource tracker rather than a worker"""
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return b"resource_tracker" in f.read()
+    except OSError:
+        return False
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def pick_message(rng: random.Random):
+    intent, _, messages = rng.choices(MESSAGE_MIX, weights=[weight for _, weight, _ in MESSAGE_MIX])[0]
+    return intent, rng.choice(messages)
+
+
+def webhook_payload(phone: str, message_id: str, text: str) -> Dict[str, Any]:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [{
+            "from": phone,
+            "id": message_id,
+            "timestamp": str(int(time.time())),
+            "type": "text",
+            "text": {"body": text}
+        }]}}]}]
+    }
+
+
+async def drive(args, url: str, fake: FakeGraphAPI, server_pid: int) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    # phone -> reply tracking for the user's outstanding message
+    waiting: Dict[str, Dict[str, Any]] = {}
+    results = {"ack": [], "first_reply": [], "full_reply": [], "by_intent": {}}
+    counts = {"sent": 0, "http_errors": 0, "timeouts": 0, "replies": 0}
+    peak_rss: Dict[int, float] = {}
+
+    def on_reply(phone: str, body: str):
+        state = waiting.get(phone)
+        if state is None:
+            return
+        now = time.perf_counter()
+        counts["replies"] += 1
+        if not state["first"].done():
+            state["first"].set_result(now)
+        # Greetings, booking links and agent replies are a single message; RAG replies end with the marker
+        if state["intent"] != "rag" or END_MARKER in body or "having trouble" in body:
+            if not state["done"].done():
+                state["done"].set_result(now)
+
+    fake.on_request = lambda request: loop.call_soon_threadsafe(
+        on_reply, request["json"].get("to", ""), request["json"].get("text", {}).get("body", "")
+    )
+
+    async def sample_memory():
+        while True:
+            for pid in process_tree(server_pid):
+                rss = rss_mb(pid)
+                if rss is not None:
+                    peak_rss[pid] = max(peak_rss.get(pid, 0.0), rss)
+            await asyncio.sleep(0.5)
+
+    async def user(n: int, client: httpx.AsyncClient, deadline: float):
+        rng = random.Random(args.seed + n)
+        phone = f"1555{n:07d}"
+        sequence = 0
+        while time.perf_counter() < deadline:
+            intent, text = pick_message(rng)
+            sequence += 1
+            state = {"intent": intent, "first": loop.create_future(), "done": loop.create_future()}
+            waiting[phone] = state
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json=webhook_payload(phone, f"wamid.bench.{n}.{sequence}", text))
+            except httpx.HTTPError:
+                counts["http_errors"] += 1
+                await asyncio.sleep(0.1)
+                continue
+            counts["sent"] += 1
+            results["ack"].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                counts["http_errors"] += 1
+                continue
+            try:
+                first = await asyncio.wait_for(asyncio.shield(state["first"]), args.reply_timeout)
+                done = await asyncio.wait_for(state["done"], args.reply_timeout)
+            except asyncio.TimeoutError:
+                counts["timeouts"] += 1
+                continue
+            results["first_reply"].append(first - start)
+            results["full_reply"].append(done - start)
+            results["by_intent"].setdefault(intent, []).append(done - start)
+            if args.think_time:
+                await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+    sampler = asyncio.create_task(sample_memory())
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(limits=limits, timeout=args.reply_timeout) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(user(n, client, deadline) for n in range(args.users)))
+        elapsed = time.perf_counter() - start
+    sampler.cancel()
+
+    workers = process_tree(server_pid)
+    # With several workers uvicorn's supervisor only forwards connections; report the workers
+    worker_pids = [pid for pid in workers[1:] if pid in peak_rss and not is_helper(pid)] or [server_pid]
+    return {
+        "config": {
+            "users": args.users,
+            "duration_seconds": args.duration,
+            "workers": args.workers,
+            "llm_latency_seconds": args.llm_latency,
+            "llm_tokens_per_second": args.llm_tokens_per_second,
+            "embedding_latency_seconds": args.embedding_latency,
+            "graph_latency_seconds": args.graph_latency
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        **counts,
+        "full_replies": len(results["full_reply"]),
+        "requests_per_second": round(counts["sent"] / elapsed, 2),
+        "replies_per_second": round(len(results["full_reply"]) / elapsed, 2),
+        "latency_ms": {
+            "webhook_ack": summarize(results["ack"]),
+            "first_reply": summarize(results["first_reply"]),
+            "full_reply": summarize(results["full_reply"])
+        },
+        "full_reply_by_intent_ms": {intent: summarize(values) for intent, values in sorted(results["by_intent"].items())},
+        "peak_rss_mb": {
+            "supervisor": round(peak_rss.get(server_pid, 0.0), 1) if worker_pids != [server_pid] else None,
+            "workers": [round(peak_rss.get(pid, 0.0), 1) for pid in worker_pids]
+        }
+    }
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n🚦 {report['config']['users']} users, {report['config']['workers']} worker(s), {report['elapsed_seconds']}s")
+    print(f"  Webhook requests: {report['sent']}  ({report['requests_per_second']} req/s)")
+    print(f"  Full replies:     {report['full_replies']}  ({report['replies_per_second']} replies/s)")
+    print(f"  Errors: {report['http_errors']}  Timeouts: {report['timeouts']}")
+    print(f"\n  {'latency (ms)':<22}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    rows = list(report["latency_ms"].items()) + [
+        (f"  {intent}", stats) for intent, stats in report["full_reply_by_intent_ms"].items()
+    ]
+    for name, stats in rows:
+        print(f"  {name:<22}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}{stats['max']:>10}")
+    memory = report["peak_rss_mb"]
+    print(f"\n  Peak RSS per worker (MB): {memory['workers']}")
+    if memory["supervisor"] is not None:
+        print(f"  Supervisor RSS (MB): {memory['supervisor']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the WhatsApp webhook")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to generate load")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds before the fake model answers")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0, help="Fake streaming speed (0 = instant)")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per fake query embedding")
+    parser.add_argument("--graph-latency", type=float, default=0.05, help="Seconds per fake Graph API send")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds a user waits between messages")
+    parser.add_argument("--reply-timeout", type=float, default=60.0)
+    parser.add_argument("--corpus", default=None, help="Directory of PDFs to index first (default: empty index)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Write the report to this file")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Exit non-zero if full-reply p95 exceeds this")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    fake = FakeGraphAPI(latency=args.graph_latency).start()
+    config = {
+        "embedding_size": 256,
+        "embedding_latency": args.embedding_latency,
+        "llm_latency": args.llm_latency,
+        "llm_tokens_per_second": args.llm_tokens_per_second,
+    }
+    env = {
+        **os.environ,
+        CONFIG_ENV: json.dumps(config),
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-bench"),
+        "WHATSAPP_ACCESS_TOKEN": "bench-token",
+        "WHATSAPP_PHONE_NUMBER_ID": "1234567890",
+        "WHATSAPP_API_BASE_URL": fake.base_url,
+        "VECTOR_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.db"),
+        # Users wait for each reply, so there are no bursts to merge
+        "COALESCE_WINDOW_SECONDS": "0"
+    }
+    if args.corpus:
+        os.environ.update(env)
+        ingest_corpus(args.corpus, config)
+        # Importing the app turned on INFO logging, which would log every request sent
+        logging.getLogger().setLevel(logging.WARNING)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "bench_load:create_app", "--factory",
+            "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"
+        ],
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        # The function agent prints its chain steps; warnings and errors still reach stderr
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(base_url, server)
+        report = asyncio.run(drive(args, f"{base_url}/api/webhook/whatsapp", fake, server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    p95 = report["latency_ms"]["full_reply"]["p95"]
+    if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+        print(f"\n❌ Full-reply p95 {p95}ms exceeds {args.max_p95_ms}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
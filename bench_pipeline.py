@@ -0,0 +1,83 @@
+"""Microbenchmark: per-message overhead of building the RAG chain per query vs reusing one pipeline.
+
+Runs fully offline: embeddings and the chat model are local fakes, so the numbers
+measure object construction and orchestration only, not OpenAI latency.
+
+    python bench_pipeline.py --messages 200
+"""
+from langchain_community.vectorstores import FAISS
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.chat_models.fake import FakeListChatModel
+from langchain_openai import ChatOpenAI
+from langchain.memory import ConversationBufferMemory
+from langchain.chains import ConversationalRetrievalChain
+from langchain.prompts import PromptTemplate
+from app.services.rag_pipeline import RAGPipeline, ANSWER_TEMPLATE
+import argparse
+import asyncio
+import time
+
+QUESTIONS = [
+    "What is the baggage allowance?",
+    "Do I need a visa for Dubai?",
+    "What is the cancellation policy?",
+    "What does the international package include?",
+]
+
+def build_store():
+    texts = [f"Policy clause {i}: travellers must follow guideline {i}." for i in range(200)]
+    return FAISS.from_texts(texts, FakeEmbeddings(size=256))
+
+def fake_llm():
+    return FakeListChatModel(responses=["Here is what the policy says."])
+
+async def per_query_chain(store, n: int) -> float:
+    """Baseline behaviour: build prompt, client, retriever and chain on every message"""
+    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    start = time.perf_counter()
+    for i in range(n):
+        prompt = PromptTemplate(
+            input_variables=["context", "chat_history", "question"],
+            template=ANSWER_TEMPLATE
+        )
+        # Constructed but not called, so only its setup cost is measured
+        ChatOpenAI(model="gpt-4", temperature=0.7, openai_api_key="sk-bench")
+        chain = ConversationalRetrievalChain.from_llm(
+            llm=fake_llm(),
+            retriever=store.as_retriever(),
+            memory=memory,
+            combine_docs_chain_kwargs={"prompt": prompt}
+        )
+        await chain.ainvoke({"question": QUESTIONS[i % len(QUESTIONS)]})
+    return time.perf_counter() - start
+
+async def shared_pipeline(store, n: int) -> float:
+    """Current behaviour: one pipeline, memory injected per call"""
+    pipeline = RAGPipeline(store, fake_llm())
+    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    start = time.perf_counter()
+    for i in range(n):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        result = await pipeline.arun(question, memory.chat_memory.messages)
+        memory.save_context({"question": question}, {"answer": result["answer"]})
+    return time.perf_counter() - start
+
+async def main(n: int):
+    store = build_store()
+    # Warm up imports and caches before timing
+    await per_query_chain(store, 2)
+    await shared_pipeline(store, 2)
+
+    before = await per_query_chain(store, n)
+    after = await shared_pipeline(store, n)
+
+    print(f"Messages: {n}")
+    print(f"Per-query chain:  {1000 * before / n:8.3f} ms/message")
+    print(f"Shared pipeline:  {1000 * after / n:8.3f} ms/message")
+    print(f"Speedup:          {before / after:8.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages))
@@ -0,0 +1,258 @@
+"""Offline retrieval benchmark: recall@k and MRR against latency and size across index configurations.
+
+Splits the PDFs in data/uploads with every chunk size / overlap combination,
+builds each FAISS index type over them and runs a labelled question set
+(data/eval/retrieval_questions.json) with dense and hybrid (dense + BM25)
+retrieval. A question is answered at k if one of its top k chunks comes from
+its source file and contains one of its evidence phrases.
+
+Embeddings are a local hashing model by default, so runs are deterministic,
+free and comparable across machines; --embeddings openai uses the configured
+model (and its on-disk cache) to check that the ranking of configurations holds.
+Each configuration runs in a forked child, so the memory it reports is its own
+rather than everything built before it.
+
+    python bench_retrieval.py
+    python bench_retrieval.py --chunk-sizes 500 1000 --overlaps 100 --types flat hnsw --json retrieval.json
+"""
+from langchain_community.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
+from app.core.config import get_settings
+from app.services.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+from app.services.faiss_index import DEFAULT_INDEX_SPEC, INDEX_TYPES, build_index
+from typing import Dict, Any, List
+import argparse
+import faiss
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import numpy as np
+import os
+import re
+import time
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+QUESTIONS_PATH = os.path.join("data", "eval", "retrieval_questions.json")
+MODES = ("dense", "hybrid")
+
+class HashingEmbeddings(Embeddings):
+    """Signed feature hashing of word unigrams and bigrams, L2-normalised
+
+    Same text, same vector in every process and on every machine, and texts
+    that share terms land close together, unlike random fake embeddings.
+    """
+
+    def __init__(self, size: int = 512):
+        self.size = size
+
+    def _bucket(self, feature: str):
+        digest = hashlib.sha256(feature.encode()).digest()
+        return int.from_bytes(digest[:4], "little") % self.size, 1.0 if digest[4] & 1 else -1.0
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        vector = np.zeros(self.size, dtype="float32")
+        for feature, tf in counts.items():
+            bucket, sign = self._bucket(feature)
+            vector[bucket] += sign * (1 + np.log(tf))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def rss_mb() -> float:
+    """Resident set size of this process"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[int(q * (len(samples) - 1))] if samples else 0.0
+
+def load_pages(uploads_dir: str):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(uploads_dir, "*.pdf"))):
+        pages.extend(PyPDFLoader(path).load())
+    return pages
+
+def relevant_positions(chunks, question: Dict[str, Any]) -> set:
+    evidence = [normalize(phrase) for phrase in question["evidence"]]
+    return {
+        i for i, chunk in enumerate(chunks)
+        if os.path.basename(chunk.metadata.get("source", "")) == question["source"]
+        and any(phrase in normalize(chunk.page_content) for phrase in evidence)
+    }
+
+def evaluate(rankings: List[List[int]], relevant: List[set], latencies: List[float], ks: List[int]) -> Dict[str, Any]:
+    """Recall@k, MRR and per-query latency for one configuration"""
+    first_hits = []
+    for ranking, wanted in zip(rankings, relevant):
+        rank = next((r for r, position in enumerate(ranking, start=1) if position in wanted), None)
+        first_hits.append(rank)
+    return {
+        **{f"recall@{k}": round(sum(1 for r in first_hits if r and r <= k) / len(first_hits), 3) for k in ks},
+        "mrr": round(sum(1 / r for r in first_hits if r) / len(first_hits), 3),
+        "latency_ms": {
+            "avg": round(1000 * sum(latencies) / len(latencies), 3),
+            "p95": round(1000 * percentile(latencies, 0.95), 3)
+        }
+    }
+
+def run_config(chunks, embeddings, questions, query_vectors, spec, ks, candidates, rrf_k):
+    """Build one index over the chunks and score every question in each mode"""
+    base_rss = rss_mb()
+    texts = [chunk.page_content for chunk in chunks]
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype="float32")
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = build_index(vectors, spec)
+    build_seconds = time.perf_counter() - start
+    size_kb = len(faiss.serialize_index(index)) / 1024
+
+    lexical = BM25Index()
+    lexical.add(list(range(len(texts))), texts)
+
+    relevant = [relevant_positions(chunks, question) for question in questions]
+    unanswerable = [q["question"] for q, wanted in zip(questions, relevant) if not wanted]
+    fetch = max(max(ks), candidates)
+
+    results = {}
+    for mode in MODES:
+        rankings, latencies = [], []
+        for question, vector in zip(questions, query_vectors):
+            start = time.perf_counter()
+            _, found = index.search(vector[None, :], min(fetch, len(texts)))
+            dense = [int(position) for position in found[0] if position >= 0]
+            if mode == "hybrid":
+                lexical_keys = [key for key, _ in lexical.search(question["question"], k=candidates)]
+                ranking = reciprocal_rank_fusion([dense, lexical_keys], k=rrf_k)
+            else:
+                ranking = dense
+            latencies.append(time.perf_counter() - start)
+            rankings.append(ranking[:max(ks)])
+        results[mode] = evaluate(rankings, relevant, latencies, ks)
+
+    return {
+        "chunks": len(texts),
+        "embed_s": round(embed_seconds, 3),
+        "build_s": round(build_seconds, 4),
+        "index_kb": round(size_kb, 1),
+        # Measured while the index and BM25 postings are still alive
+        "rss_delta_mb": round(rss_mb() - base_rss, 1),
+        "unlabelled_questions": unanswerable,
+        "modes": results
+    }
+
+def run_isolated(*args) -> Dict[str, Any]:
+    """run_config in a forked child, so every configuration starts from the same memory baseline"""
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=lambda: sender.send(run_config(*args)))
+    process.start()
+    # Only the child holds the sending end now, so recv() fails instead of hanging if it dies
+    sender.close()
+    try:
+        return receiver.recv()
+    finally:
+        process.join()
+
+def print_table(rows: List[Dict[str, Any]], ks: List[int]):
+    recall_headers = "".join(f"{f'R@{k}':>7}" for k in ks)
+    print(f"\n{'size':>5} {'ovlp':>5} {'type':>9} {'mode':>7} {'chunks':>7}{recall_headers} {'MRR':>6} {'build ms':>9} {'KB':>8} {'ΔRSS MB':>8} {'avg ms':>7} {'p95 ms':>7}")
+    for row in rows:
+        for mode, result in row["modes"].items():
+            recalls = "".join(f"{result[f'recall@{k}']:>7.3f}" for k in ks)
+            print(
+                f"{row['chunk_size']:>5} {row['chunk_overlap']:>5} {row['index_type']:>9} {mode:>7} {row['chunks']:>7}"
+                f"{recalls} {result['mrr']:>6.3f} {1000 * row['build_s']:>9.2f} {row['index_kb']:>8.1f} "
+                f"{row['rss_delta_mb']:>8.1f} {result['latency_ms']['avg']:>7.3f} {result['latency_ms']['p95']:>7.3f}"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads-dir", default="data/uploads")
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--embeddings", choices=("hashing", "openai"), default="hashing")
+    parser.add_argument("--dim", type=int, default=512, help="Hashing embedding size")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[500, settings.CHUNK_SIZE, 1500])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 100, settings.CHUNK_OVERLAP])
+    parser.add_argument("--types", choices=INDEX_TYPES, nargs="+", default=list(INDEX_TYPES))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--candidates", type=int, default=settings.HYBRID_CANDIDATES, help="Dense and BM25 hits fused in hybrid mode")
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    with open(args.questions) as f:
+        questions = json.load(f)
+    if args.embeddings == "openai":
+        from app.services.rag_service import create_embeddings
+        embeddings = create_embeddings()
+    else:
+        embeddings = HashingEmbeddings(args.dim)
+
+    pages = load_pages(args.uploads_dir)
+    if not pages:
+        logger.error(f"❌ No PDFs found in {args.uploads_dir}")
+        return
+    # Queries go through embed_query, as in the app: document embeddings may be cached or embedded differently
+    query_vectors = np.asarray([embeddings.embed_query(q["question"]) for q in questions], dtype="float32")
+    ks = sorted(set(args.k))
+    print(f"📚 {len(pages)} pages, {len(questions)} questions, {args.embeddings} embeddings")
+
+    rows = []
+    for chunk_size in args.chunk_sizes:
+        for chunk_overlap in args.overlaps:
+            if chunk_overlap >= chunk_size:
+                continue
+            splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            chunks = splitter.split_documents(pages)
+            for kind in args.types:
+                spec = {**DEFAULT_INDEX_SPEC, "type": kind}
+                result = run_isolated(chunks, embeddings, questions, query_vectors, spec, ks, args.candidates, settings.HYBRID_RRF_K)
+                if result["unlabelled_questions"]:
+                    logger.warning(f"No chunk matches the evidence of {len(result['unlabelled_questions'])} questions at size {chunk_size}/{chunk_overlap}")
+                rows.append({"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "index_type": kind, **result})
+
+    print_table(rows, ks)
+    best = max(rows, key=lambda row: (row["modes"]["hybrid"]["mrr"], -row["modes"]["hybrid"]["latency_ms"]["avg"]))
+    print(
+        f"\n🏆 Best hybrid MRR: size {best['chunk_size']}, overlap {best['chunk_overlap']}, "
+        f"{best['index_type']} (MRR {best['modes']['hybrid']['mrr']:.3f})"
+    )
+
+    if args.json:
+        report = {
+            "embeddings": args.embeddings,
+            "pages": len(pages),
+            "questions": len(questions),
+            "k": ks,
+            "results": rows
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
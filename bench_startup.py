@@ -0,0 +1,234 @@
+"""Startup benchmark: import time of the app and cold start to serving and to ready, fully offline.
+
+Import time is measured in fresh interpreters importing main, with a check
+that no heavy package (langchain, faiss, openai, ...) is loaded on import and
+the slowest direct imports from python -X importtime. Cold start launches
+the app under uvicorn with the same local fakes as bench_load.py and times how
+long the process takes to answer / (services built) and /ready (warmup done),
+along with the build and warmup phases it reports. The fakes are installed
+before the app is imported, so langchain is already loaded when the services
+are built and its import time falls before the build phase, not in it.
+
+    python bench_startup.py --runs 5
+    python bench_startup.py --corpus data/uploads --json startup.json --max-ready-ms 8000   # CI gate
+"""
+from bench_load import CONFIG_ENV, ingest_corpus
+from app.utils.fake_graph_api import FakeGraphAPI
+from typing import Any, Dict, List, Optional
+import argparse
+import httpx
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Packages that should only be imported when the lifespan builds the services
+HEAVY_MODULES = ("langchain", "langchain_core", "langchain_community", "langchain_openai", "faiss", "openai", "tiktoken", "numpy")
+
+IMPORT_SNIPPET = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Median, min and max in milliseconds"""
+    return {
+        "median": round(1000 * statistics.median(values), 1),
+        "min": round(1000 * min(values), 1),
+        "max": round(1000 * max(values), 1)
+    }
+
+
+def measure_import(runs: int, env: Dict[str, str]) -> Dict[str, Any]:
+    """Time `import main` in fresh interpreters"""
+    seconds, heavy = [], set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], env=env, cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        seconds.append(result["seconds"])
+        heavy.update(result["heavy"])
+    return {"ms": summarize(seconds), "heavy_modules": sorted(heavy)}
+
+
+def import_profile(env: Dict[str, str], top: int) -> List[Dict[str, Any]]:
+    """Slowest modules imported directly by main, by cumulative time from python -X importtime"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], env=env, cwd=ROOT, capture_output=True, text=True, check=True
+    ).stderr
+    # A module is reported after its imports, indented two spaces per level below its parent
+    pending, modules = [], []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            pending.append({"module": name.strip(), "ms": round(int(cumulative) / 1000, 1)})
+        elif depth == 0:
+            if name.strip() == "main":
+                modules = pending
+            pending = []
+    return sorted(modules, key=lambda module: module["ms"], reverse=True)[:top]
+
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float) -> Optional[httpx.Response]:
+    """Poll a URL until it answers 200; None if the server exits or the timeout passes"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            return None
+        try:
+            response = httpx.get(url, timeout=1.0)
+            if response.status_code == 200:
+                return response
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def measure_cold_start(env: Dict[str, str], port: int, timeout: float) -> Dict[str, Any]:
+    """Launch the app once and time it to serving and to ready"""
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench_load:create_app", "--factory", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        if wait_for(f"{base_url}/", server, timeout) is None:
+            raise RuntimeError(f"Server did not start (exit code {server.poll()})")
+        serving = time.perf_counter() - start
+        response = wait_for(f"{base_url}/ready", server, timeout)
+        if response is None:
+            raise RuntimeError("Server did not become ready")
+        ready = time.perf_counter() - start
+        return {"serving": serving, "ready": ready, "status": response.json(), "rss_mb": rss_mb(server.pid)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def print_report(report: Dict[str, Any]):
+    imports = report["import"]
+    print(f"\n🚀 import main: {imports['ms']['median']}ms median ({imports['ms']['min']}-{imports['ms']['max']}ms)")
+    if imports["heavy_modules"]:
+        print(f"  ⚠️  Heavy modules loaded on import: {', '.join(imports['heavy_modules'])}")
+    else:
+        print("  No heavy modules loaded on import")
+    print(f"\n  {'slowest imports':<40}{'ms':>10}")
+    for module in report["import_profile"]:
+        print(f"  {module['module']:<40}{module['ms']:>10}")
+    print(f"\n  {'cold start (ms)':<22}{'median':>10}{'min':>10}{'max':>10}")
+    for name, stats in report["cold_start_ms"].items():
+        print(f"  {name:<22}{stats['median']:>10}{stats['min']:>10}{stats['max']:>10}")
+    print(f"\n  Warmup steps (ms, last run): {report['warmup_steps_ms']}")
+    print(f"  RSS when ready: {report['rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline startup benchmark of the app")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per measurement")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--corpus", default=None, help="Directory of PDFs to index first (default: empty index)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for the server")
+    parser.add_argument("--json", default=None, help="Write the report to this file")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="Exit non-zero if median import time exceeds this")
+    parser.add_argument("--max-ready-ms", type=float, default=None, help="Exit non-zero if median time to ready exceeds this")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    fake = FakeGraphAPI().start()
+    config = {
+        "embedding_size": 256,
+        "embedding_latency": 0.0,
+        "llm_latency": 0.0,
+        "llm_tokens_per_second": 0.0
+    }
+    env = {
+        **os.environ,
+        CONFIG_ENV: json.dumps(config),
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-bench"),
+        "WHATSAPP_ACCESS_TOKEN": "bench-token",
+        "WHATSAPP_PHONE_NUMBER_ID": "1234567890",
+        "WHATSAPP_API_BASE_URL": fake.base_url,
+        "VECTOR_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.db")
+    }
+    try:
+        if args.corpus:
+            os.environ.update(env)
+            ingest_corpus(args.corpus, config)
+            logging.getLogger().setLevel(logging.WARNING)
+
+        imports = measure_import(args.runs, env)
+        profile = import_profile(env, args.top)
+        runs = [measure_cold_start(env, args.port, args.timeout) for _ in range(args.runs)]
+    finally:
+        fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    status = runs[-1]["status"]
+    report = {
+        "config": {"runs": args.runs, "corpus": args.corpus},
+        "import": imports,
+        "import_profile": profile,
+        "cold_start_ms": {
+            "to_serving": summarize([run["serving"] for run in runs]),
+            "to_ready": summarize([run["ready"] for run in runs]),
+            "build": summarize([run["status"]["build_ms"] / 1000 for run in runs]),
+            "warmup": summarize([run["status"]["warmup_ms"].get("total", 0.0) / 1000 for run in runs])
+        },
+        "warmup_steps_ms": {name: ms for name, ms in status["warmup_ms"].items() if name != "total"},
+        "rss_mb": round(runs[-1]["rss_mb"], 1)
+    }
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    import_ms = report["import"]["ms"]["median"]
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"\n❌ Import time {import_ms}ms exceeds {args.max_import_ms}ms")
+        failed = True
+    ready_ms = report["cold_start_ms"]["to_ready"]["median"]
+    if args.max_ready_ms is not None and ready_ms > args.max_ready_ms:
+        print(f"\n❌ Time to ready {ready_ms}ms exceeds {args.max_ready_ms}ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Bulk-ingest PDFs into the vector store.
+
+PDFs are parsed and split across a process pool, embedded in large concurrent
+batches, and the index is written once at the end. Files already recorded in
+the manifest with the same content are skipped unless --rebuild is given.
+
+    python ingest.py --uploads-dir data/uploads --workers 8
+    python ingest.py --rebuild
+"""
+from app.core.config import get_settings
+from app.services.index_store import IndexStore, file_sha256
+from app.services.faiss_index import index_spec_from_settings
+from app.services.mmap_store import current_version
+from app.services.rag_service import create_embeddings
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import time
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+def load_and_split(file_path: str, chunk_size: int, chunk_overlap: int):
+    """Parse and split one PDF; runs in a worker process"""
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    pages = PyPDFLoader(file_path).load()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return {
+        "file_path": file_path,
+        "sha256": file_sha256(file_path),
+        "pages": len(pages),
+        "chunks": splitter.split_documents(pages)
+    }
+
+def parse_all(pdf_paths, workers: int):
+    """Stage 1: parse and split every PDF across a process pool"""
+    documents = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(load_and_split, path, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+            for path in pdf_paths
+        ]
+        for path, future in zip(pdf_paths, futures):
+            try:
+                documents.append(future.result())
+            except Exception as e:
+                logger.error(f"❌ Failed to parse {path}: {e}")
+    return documents
+
+async def embed_all(embeddings, documents, batch_size: int, concurrency: int):
+    """Stage 2: embed all chunks in concurrent batches"""
+    texts = [chunk.page_content for doc in documents for chunk in doc["chunks"]]
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed(batch):
+        async with semaphore:
+            return await embeddings.aembed_documents(batch)
+
+    results = await asyncio.gather(*[embed(batch) for batch in batches])
+    vectors = [vector for batch in results for vector in batch]
+
+    # Hand each document its slice of the vectors
+    offset = 0
+    for doc in documents:
+        doc["vectors"] = vectors[offset:offset + len(doc["chunks"])]
+        offset += len(doc["chunks"])
+    return len(vectors)
+
+def rate(count: float, seconds: float) -> str:
+    return f"{count / seconds:,.1f}/s" if seconds > 0 else "n/a"
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest PDFs into the vector store")
+    parser.add_argument("--uploads-dir", default="data/uploads")
+    parser.add_argument("--vector-store", default=settings.VECTOR_STORE_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=256, help="Texts per embedding request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent embedding requests")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the existing index and ingest everything")
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(args.vector_store):
+        logger.info(f"Clearing existing vector store at {args.vector_store}")
+        shutil.rmtree(args.vector_store)
+
+    embeddings = create_embeddings()
+    store = IndexStore(args.vector_store, embeddings, index_spec=index_spec_from_settings(settings))
+    has_index = os.path.exists(os.path.join(args.vector_store, "index.faiss")) or any(
+        entry.get("shard") for entry in store.manifest.documents.values()
+    )
+    if has_index:
+        store.load([])
+
+    pdf_paths = sorted(
+        os.path.join(args.uploads_dir, f)
+        for f in os.listdir(args.uploads_dir)
+        if f.lower().endswith(".pdf")
+    )
+    seen = set()
+    pending = []
+    # Copies of content already ingested, or seen earlier in this run, are recorded without parsing
+    duplicates = []
+    for path in pdf_paths:
+        sha256 = file_sha256(path)
+        if store.is_unchanged(path, sha256):
+            continue
+        if sha256 in seen or store.is_duplicate(path, sha256):
+            duplicates.append({"file_path": path, "sha256": sha256, "pages": 0, "chunks": [], "vectors": []})
+            continue
+        seen.add(sha256)
+        pending.append(path)
+    pdf_paths = pending
+    if not pdf_paths and not duplicates:
+        if has_index and current_version(args.vector_store) is None:
+            # Stores built before snapshots were published still need one for mmap workers
+            store.compact()
+        logger.info("✅ Nothing to ingest, vector store is up to date")
+        return
+
+    start = time.perf_counter()
+    documents = parse_all(pdf_paths, args.workers)
+    parse_seconds = time.perf_counter() - start
+    pages = sum(doc["pages"] for doc in documents)
+    chunks = sum(len(doc["chunks"]) for doc in documents)
+    for doc in documents:
+        if not doc["chunks"]:
+            logger.warning(f"⚠️ No text extracted from {doc['file_path']}, recording it as empty")
+
+    start = time.perf_counter()
+    embedded = asyncio.run(embed_all(embeddings, documents, args.batch_size, args.concurrency))
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store.bulk_upsert(documents + duplicates)
+    write_seconds = time.perf_counter() - start
+
+    print(f"\n📚 Ingested {len(documents)} files, {pages} pages, {chunks} chunks")
+    print(f"  Parse + split:  {parse_seconds:7.2f}s  {rate(pages, parse_seconds)} pages  {rate(chunks, parse_seconds)} chunks")
+    print(f"  Embed:          {embed_seconds:7.2f}s  {rate(embedded, embed_seconds)} embeddings")
+    print(f"  Write index:    {write_seconds:7.2f}s")
+    if hasattr(embeddings, "stats"):
+        print(f"  Embedding cache: {embeddings.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from app.api import routes
+from app.api.routes import router, start_services, stop_services
+from app.core import metrics
 from app.core.config import get_settings
 
 settings = get_settings()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_services()
+    yield
+    await stop_services()
+
 app = FastAPI(
     title="AI Travel Agent",
     description="An intelligent travel assistant with RAG and function calling capabilities",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -31,6 +42,20 @@ async def root():
         "webhook_url": "/api/webhook/whatsapp"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Per-stage latency, token, queue and error metrics for Prometheus"""
+    depth = await routes.message_queue.depth()
+    if depth is not None:
+        metrics.QUEUE_DEPTH.set(depth)
+    return Response(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """Readiness probe: 503 until services are built and warmed up, with startup timings"""
+    status = routes.startup_status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
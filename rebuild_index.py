@@ -0,0 +1,100 @@
+"""Retrain and rebuild the vector store's FAISS index as another type.
+
+Defaults come from Settings (FAISS_INDEX_TYPE, FAISS_NLIST, ...); flags override
+them. Reports index size, search latency and recall@k against exact search
+before and after, so recall can be traded for latency and memory.
+
+    python rebuild_index.py --type hnsw --hnsw-m 32 --ef-search 64
+    python rebuild_index.py --type ivf_pq --nlist 256 --nprobe 16 --pq-bytes 16
+"""
+from app.core.config import get_settings
+from app.services.faiss_index import INDEX_TYPES, index_spec_from_settings, index_type, rebuild_store, stored_vectors
+from app.services.index_store import IndexStore
+from app.services.rag_service import create_embeddings
+import argparse
+import faiss
+import logging
+import numpy as np
+import os
+import time
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+def index_size_kb(path: str) -> float:
+    return os.path.getsize(os.path.join(path, "index.faiss")) / 1024
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int):
+    """Average search latency (ms/query) and recall@k against exact neighbours"""
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    latency_ms = 1000 * (time.perf_counter() - start) / len(queries)
+    recall = np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+    return latency_ms, recall
+
+def main():
+    defaults = index_spec_from_settings(settings)
+    parser = argparse.ArgumentParser(description="Rebuild the FAISS index as another type")
+    parser.add_argument("--vector-store", default=settings.VECTOR_STORE_PATH)
+    parser.add_argument("--type", choices=INDEX_TYPES, default=defaults["type"])
+    parser.add_argument("--nlist", type=int, default=defaults["nlist"])
+    parser.add_argument("--nprobe", type=int, default=defaults["nprobe"])
+    parser.add_argument("--hnsw-m", type=int, default=defaults["hnsw_m"])
+    parser.add_argument("--ef-construction", type=int, default=defaults["ef_construction"])
+    parser.add_argument("--ef-search", type=int, default=defaults["ef_search"])
+    parser.add_argument("--pq-bytes", type=int, default=defaults["pq_bytes"])
+    parser.add_argument("--k", type=int, default=4, help="Neighbours per query for the recall check")
+    parser.add_argument("--queries", type=int, default=200, help="Sample size for the recall check")
+    args = parser.parse_args()
+
+    spec = {
+        "type": args.type,
+        "nlist": args.nlist,
+        "nprobe": args.nprobe,
+        "hnsw_m": args.hnsw_m,
+        "ef_construction": args.ef_construction,
+        "ef_search": args.ef_search,
+        "pq_bytes": args.pq_bytes
+    }
+
+    if not os.path.exists(os.path.join(args.vector_store, "index.faiss")):
+        logger.error(f"❌ No index found at {args.vector_store}; run ingest.py first")
+        return
+
+    embeddings = create_embeddings()
+    # Load with the search parameters the app uses, so "before" is the index as served
+    store = IndexStore(args.vector_store, embeddings, index_spec=defaults)
+    vector_store = store.load([])
+    n = vector_store.index.ntotal
+    before_type = index_type(vector_store.index)
+    before_kb = index_size_kb(args.vector_store)
+
+    # Exact neighbours of slightly perturbed stored vectors serve as ground truth
+    vectors = stored_vectors(vector_store, list(range(n)), embeddings)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(n, size=min(args.queries, n), replace=False)
+    queries = vectors[sample] + rng.normal(0, 0.01, size=(len(sample), vectors.shape[1])).astype("float32")
+    k = min(args.k, n)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    before_latency, before_recall = measure(vector_store.index, queries, truth, k)
+
+    start = time.perf_counter()
+    store.index_spec = spec
+    with store.lock:
+        rebuild_store(vector_store, spec, embeddings)
+        store.compact()
+    build_seconds = time.perf_counter() - start
+    after_latency, after_recall = measure(vector_store.index, queries, truth, k)
+
+    print(f"\n🔁 Rebuilt {n} vectors in {build_seconds:.2f}s")
+    print(f"{'':10} {'type':>10} {'size KB':>10} {'ms/query':>10} {f'recall@{k}':>10}")
+    print(f"{'before':10} {before_type:>10} {before_kb:>10.1f} {before_latency:>10.4f} {before_recall:>10.3f}")
+    print(f"{'after':10} {index_type(vector_store.index):>10} {index_size_kb(args.vector_store):>10.1f} {after_latency:>10.4f} {after_recall:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import logging
+import os
+import tempfile
+from app.services.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHUNKS = {
+    "baggage:0": "Checked baggage is limited to 23kg. See clause 4.2.1 for excess fees.",
+    "baggage:1": "Cabin baggage must not exceed 7kg.",
+    "flights:0": "Flight EK-501 departs Dubai at 09:40 daily.",
+    "visa:0": "A visa is required for stays over 30 days."
+}
+
+def build() -> BM25Index:
+    index = BM25Index()
+    index.add(list(CHUNKS), list(CHUNKS.values()))
+    return index
+
+def test_tokenize_keeps_codes():
+    """Clause numbers and flight codes stay whole, and stopwords are dropped"""
+    assert tokenize("What is clause 4.2.1 for EK-501?") == ["clause", "4.2.1", "ek-501"]
+
+def test_exact_terms_rank_first():
+    """Chunks containing rare query terms rank first, and a full match normalises to about 1"""
+    index = build()
+    hits = index.search("EK-501 departure")
+    assert hits[0][0] == "flights:0"
+    assert [key for key, _ in index.search("baggage 23kg")][:2] == ["baggage:0", "baggage:1"]
+    assert index.search("clause 4.2.1", normalize=True)[0][1] > 0.8
+    assert index.search("refund") == []
+
+def test_remove_and_replace():
+    """Removed chunks are no longer found, and re-adding a key replaces its terms"""
+    index = build()
+    index.remove(["visa:0"])
+    assert index.search("visa") == []
+    index.add(["baggage:1"], ["Pets travel in the hold."])
+    assert index.search("cabin") == []
+    assert index.search("pets")[0][0] == "baggage:1"
+    assert index.stats()["chunks"] == 3
+    assert index.total_length == sum(index.lengths.values())
+
+def test_save_and_load():
+    """A saved subset of term counts loads into an equivalent index"""
+    index = build()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bm25.json")
+        index.save(path, ["baggage:0", "visa:0"])
+        loaded = BM25Index()
+        loaded.load(path)
+    assert len(loaded) == 2
+    assert loaded.term_counts(["visa:0"]) == index.term_counts(["visa:0"])
+
+def test_reciprocal_rank_fusion():
+    """Keys ranked well by both lists come first; a key in one list still appears"""
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]], k=60)
+    assert fused[0] == "b" and fused[1] == "a"
+    assert set(fused) == {"a", "b", "c", "d"}
+    assert reciprocal_rank_fusion([]) == []
+
+if __name__ == "__main__":
+    print("🔍 Testing the BM25 index...\n")
+    tests = [
+        test_tokenize_keeps_codes,
+        test_exact_terms_rank_first,
+        test_remove_and_replace,
+        test_save_and_load,
+        test_reciprocal_rank_fusion
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from app.services.coalescer import MessageCoalescer
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def job(sender: str, text: str, message_id: str = "") -> dict:
+    return {"from_number": sender, "message_text": text, "message_id": message_id or f"wamid.{text}"}
+
+def test_burst_merged_within_window():
+    """Messages from one sender inside the window are handled once, joined by newlines"""
+    handled = []
+
+    async def handler(merged):
+        handled.append(merged)
+
+    async def run():
+        coalescer = MessageCoalescer(handler, window_seconds=0.05, max_wait_seconds=1.0)
+        futures = []
+        for text in ["I want Bali", "in June", "for 2 people"]:
+            futures.append(await coalescer.submit(job("15550001111", text)))
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*futures)
+        return coalescer.stats()
+
+    stats = asyncio.run(run())
+    assert len(handled) == 1
+    assert handled[0]["message_text"] == "I want Bali\nin June\nfor 2 people"
+    assert handled[0]["message_ids"] == ["wamid.I want Bali", "wamid.in June", "wamid.for 2 people"]
+    assert stats["messages"] == 3 and stats["batches"] == 1 and stats["coalesced"] == 2
+
+def test_max_wait_cutoff():
+    """A sender who keeps typing is answered max_wait_seconds after the first message"""
+    handled = []
+
+    async def handler(merged):
+        handled.append((time.monotonic(), merged["message_text"].count("\n") + 1))
+
+    async def run():
+        coalescer = MessageCoalescer(handler, window_seconds=0.05, max_wait_seconds=0.15)
+        start = time.monotonic()
+        futures = []
+        # A new message every 20ms never leaves a 50ms quiet gap
+        for i in range(15):
+            futures.append(await coalescer.submit(job("15550001111", f"part {i}")))
+            await asyncio.sleep(0.02)
+        await asyncio.gather(*futures)
+        return start
+
+    start = asyncio.run(run())
+    assert len(handled) >= 2
+    first_at, first_count = handled[0]
+    assert first_at - start < 0.25
+    assert 1 < first_count < 15
+    assert sum(count for _, count in handled) == 15
+
+def test_senders_isolated():
+    """Bursts are per sender, and a sender's window does not delay another's"""
+    handled = {}
+
+    async def handler(merged):
+        handled[merged["from_number"]] = merged["message_text"]
+
+    async def run():
+        coalescer = MessageCoalescer(handler, window_seconds=0.05, max_wait_seconds=1.0)
+        a1 = await coalescer.submit(job("15550001111", "hello"))
+        b = await coalescer.submit(job("15550002222", "baggage allowance?"))
+        a2 = await coalescer.submit(job("15550001111", "visa for Japan"))
+        assert a1 is a2 and a1 is not b
+        await asyncio.gather(a1, b)
+
+    asyncio.run(run())
+    assert handled == {"15550001111": "hello\nvisa for Japan", "15550002222": "baggage allowance?"}
+
+def test_future_resolves_or_fails():
+    """The future resolves once the burst is handled, and carries the handler's error"""
+    async def handler(merged):
+        if merged["message_text"] == "fail":
+            raise RuntimeError("send failed")
+
+    async def run():
+        coalescer = MessageCoalescer(handler, window_seconds=0.01)
+        ok = await coalescer.submit(job("15550001111", "ok"))
+        failed = await coalescer.submit(job("15550002222", "fail"))
+        assert not ok.done()
+        results = await asyncio.gather(ok, failed, return_exceptions=True)
+        return results
+
+    ok, failed = asyncio.run(run())
+    assert ok is None
+    assert isinstance(failed, RuntimeError)
+
+def test_concurrency_capped():
+    """At most max_concurrency merged jobs are handled at a time"""
+    active = peak = 0
+
+    async def handler(merged):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+
+    async def run():
+        coalescer = MessageCoalescer(handler, window_seconds=0.01, max_concurrency=2)
+        futures = [await coalescer.submit(job(f"1555000{i:04d}", "hi")) for i in range(8)]
+        await asyncio.gather(*futures)
+
+    asyncio.run(run())
+    assert peak == 2
+
+def test_window_zero_and_close():
+    """A zero window handles each message alone; aclose flushes bursts still in their window"""
+    handled = []
+
+    async def handler(merged):
+        handled.append(merged["message_text"])
+
+    async def run():
+        unbatched = MessageCoalescer(handler, window_seconds=0)
+        await asyncio.gather(*[await unbatched.submit(job("15550001111", text)) for text in ["a", "b"]])
+        batched = MessageCoalescer(handler, window_seconds=60)
+        future = await batched.submit(job("15550001111", "c"))
+        await batched.aclose()
+        return future.done()
+
+    assert asyncio.run(run())
+    assert handled == ["a", "b", "c"]
+
+if __name__ == "__main__":
+    print("🔍 Testing message coalescing...\n")
+    tests = [
+        test_burst_merged_within_window,
+        test_max_wait_cutoff,
+        test_senders_isolated,
+        test_future_resolves_or_fails,
+        test_concurrency_capped,
+        test_window_zero_and_close
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
@@ -0,0 +1,72 @@
+import logging
+from langchain_core.documents import Document
+from app.services.context_assembler import ContextAssembler
+from app.utils.tokens import count_tokens
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+POLICY = (
+    "Checked baggage is limited to 23kg per passenger on all international flights. "
+    "Cabin baggage must not exceed 7kg and must fit in the overhead locker. "
+    "Excess baggage is charged per kilogram at the airport counter."
+)
+
+def doc(text: str, source: str = "baggage.pdf", page: int = 1) -> Document:
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+def test_overlapping_chunks_merged():
+    """Overlapping and contained chunks of the same page are sent once; other pages are kept apart"""
+    assembler = ContextAssembler()
+    first, second = POLICY[:140], POLICY[100:]
+    merged = assembler.merge([doc(first), doc(second), doc(POLICY[20:80]), doc(second, page=2)])
+    assert [d.page_content for d in merged] == [POLICY, second]
+    assert merged[0].metadata["page"] == 1 and merged[1].metadata["page"] == 2
+
+def test_short_coincidences_not_merged():
+    """Chunks sharing less than the minimum overlap are not joined"""
+    assembler = ContextAssembler()
+    merged = assembler.merge([doc("Visas are required for stays over 30 days."), doc("days. Travel insurance is recommended.")])
+    assert len(merged) == 2
+
+def test_redundant_passages_skipped():
+    """MMR prefers a distinct passage over a near-copy of one already picked"""
+    assembler = ContextAssembler(mmr_lambda=0.5)
+    picked = assembler.select([
+        doc("Checked baggage is limited to 23kg per passenger.", page=1),
+        doc("Checked baggage is limited to 23kg for each passenger.", page=2),
+        doc("Visas are required for stays over 30 days.", source="visa.pdf")
+    ])
+    assert [(d.metadata["source"], d.metadata["page"]) for d in picked] == [
+        ("baggage.pdf", 1), ("visa.pdf", 1), ("baggage.pdf", 2)
+    ]
+
+def test_token_budget():
+    """Passages are added until the budget is full; an over-budget best passage is truncated"""
+    passages = [doc(f"Passage {n}: " + "sunny beaches and temples " * 10, page=n) for n in range(5)]
+    tokens = count_tokens(passages[0].page_content)
+    assembler = ContextAssembler(token_budget=2 * tokens + 5)
+    context, stats = assembler.assemble(passages)
+    assert stats["chunks_out"] == 2
+    assert stats["tokens_out"] <= 2 * tokens + 5 and stats["tokens_saved"] > 0
+
+    tiny = ContextAssembler(token_budget=10)
+    context, stats = tiny.assemble(passages)
+    assert stats["chunks_out"] == 1 and stats["tokens_out"] <= 10
+    assert tiny.stats()["requests"] == 1
+
+if __name__ == "__main__":
+    print("🔍 Testing context assembly...\n")
+    tests = [
+        test_overlapping_chunks_merged,
+        test_short_coincidences_not_merged,
+        test_redundant_passages_skipped,
+        test_token_budget
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
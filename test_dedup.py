@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from app.services.dedup import MessageDeduplicator
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeRedis:
+    """In-process stand-in for SET NX and DEL, ignoring expiry"""
+
+    def __init__(self, fail: bool = False):
+        self.values, self.fail = {}, fail
+
+    async def set(self, key, value, nx=False, ex=None):
+        if self.fail:
+            raise ConnectionError("redis unavailable")
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+def test_redelivery_suppressed():
+    """A message ID seen before is a duplicate; a new one is not"""
+    async def run():
+        dedup = MessageDeduplicator()
+        return [await dedup.is_duplicate(message_id) for message_id in ["wamid.1", "wamid.2", "wamid.1"]], dedup.stats()
+
+    results, stats = asyncio.run(run())
+    assert results == [False, False, True]
+    assert stats["checked"] == 3 and stats["duplicates_local"] == 1 and stats["local_entries"] == 2
+
+def test_ttl_and_local_bound():
+    """IDs are forgotten after the TTL, and the local LRU keeps at most max_local_entries"""
+    async def run():
+        expiring = MessageDeduplicator(ttl_seconds=0)
+        await expiring.is_duplicate("wamid.1")
+        time.sleep(0.01)
+        expired = await expiring.is_duplicate("wamid.1")
+
+        bounded = MessageDeduplicator(max_local_entries=2)
+        for message_id in ["wamid.1", "wamid.2", "wamid.3"]:
+            await bounded.is_duplicate(message_id)
+        return expired, await bounded.is_duplicate("wamid.1"), bounded.stats()
+
+    expired, evicted, stats = asyncio.run(run())
+    assert not expired and not evicted
+    assert stats["local_entries"] == 2
+
+def test_release_allows_redelivery():
+    """A released ID is processed again on redelivery, locally and in Redis"""
+    async def run():
+        redis = FakeRedis()
+        worker_a = MessageDeduplicator(redis_client=redis)
+        worker_b = MessageDeduplicator(redis_client=redis)
+        await worker_a.is_duplicate("wamid.1")
+        await worker_a.release("wamid.1")
+        return await worker_a.is_duplicate("wamid.1"), await worker_b.is_duplicate("wamid.1")
+
+    again, elsewhere = asyncio.run(run())
+    assert not again
+    assert elsewhere
+
+def test_redis_shared_and_fails_open():
+    """A redelivery on another worker is caught through Redis; if Redis is down the message is let through"""
+    async def run():
+        redis = FakeRedis()
+        worker_a = MessageDeduplicator(redis_client=redis)
+        worker_b = MessageDeduplicator(redis_client=redis)
+        first = await worker_a.is_duplicate("wamid.1")
+        redelivered = await worker_b.is_duplicate("wamid.1")
+
+        broken = MessageDeduplicator(redis_client=FakeRedis(fail=True))
+        let_through = await broken.is_duplicate("wamid.2")
+        return first, redelivered, worker_b.stats(), let_through, broken.stats()
+
+    first, redelivered, stats, let_through, broken_stats = asyncio.run(run())
+    assert not first and redelivered
+    assert stats["duplicates_redis"] == 1 and stats["backend"] == "redis"
+    assert not let_through and broken_stats["errors"] == 1
+
+if __name__ == "__main__":
+    print("🔍 Testing message deduplication...\n")
+    tests = [
+        test_redelivery_suppressed,
+        test_ttl_and_local_bound,
+        test_release_allows_redelivery,
+        test_redis_shared_and_fails_open
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
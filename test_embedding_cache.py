@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from app.services.embedding_cache import CachedEmbeddings
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic fake embeddings that count the texts sent to the model"""
+
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+def cached(path: str, model: str = "text-embedding-3-small"):
+    underlying = CountingEmbeddings(size=16, calls=[])
+    return underlying, CachedEmbeddings(underlying, model, path)
+
+def rows(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+def test_unchanged_text_never_reembedded():
+    """Texts are keyed by content: repeats and texts seen before skip the model, even after a restart"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        underlying, cache = cached(path)
+        first = cache.embed_documents(["baggage policy", "visa rules", "baggage policy"])
+        assert underlying.calls == [["baggage policy", "visa rules"]]
+        assert first[0] == first[2]
+
+        underlying, reopened = cached(path)
+        second = reopened.embed_documents(["visa rules", "refund policy"])
+        assert underlying.calls == [["refund policy"]]
+        assert second[0] == first[1]
+        assert reopened.stats() == {"hits": 1, "misses": 1}
+
+def test_keyed_by_model():
+    """The same text under another embedding model is embedded again"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        _, small = cached(path, "text-embedding-3-small")
+        small.embed_documents(["visa rules"])
+        underlying, large = cached(path, "text-embedding-3-large")
+        large.embed_documents(["visa rules"])
+        assert underlying.calls == [["visa rules"]]
+        assert rows(path) == 2
+
+def test_async_matches_sync():
+    """Async embedding shares the cache and returns the same vectors"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        underlying, cache = cached(path)
+        sync_vectors = cache.embed_documents(["visa rules"])
+        async_vectors = asyncio.run(cache.aembed_documents(["visa rules", "refund policy"]))
+        assert async_vectors[0] == sync_vectors[0]
+        assert underlying.calls == [["visa rules"], ["refund policy"]]
+
+def test_queries_not_stored():
+    """User queries go straight to the model and are never written to disk"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        underlying, cache = cached(path)
+        vector = cache.embed_query("do I need a visa for Japan?")
+        asyncio.run(cache.aembed_query("do I need a visa for Japan?"))
+        assert vector == underlying.embed_query("do I need a visa for Japan?")
+        assert rows(path) == 0
+        assert cache.stats() == {"hits": 0, "misses": 0}
+
+if __name__ == "__main__":
+    print("🔍 Testing the embedding cache...\n")
+    tests = [
+        test_unchanged_text_never_reembedded,
+        test_keyed_by_model,
+        test_async_matches_sync,
+        test_queries_not_stored
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
@@ -0,0 +1,114 @@
+import logging
+import os
+import tempfile
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.documents import Document
+from app.services.index_store import IndexStore
+from app.services.mmap_store import current_version
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=16)
+V1, V2, OTHER = "1" * 64, "2" * 64, "3" * 64
+
+def chunks(*texts):
+    return [Document(page_content=text, metadata={"source": "test"}) for text in texts]
+
+def open_store(path: str, max_shards: int = 32) -> IndexStore:
+    store = IndexStore(path, EMBEDDINGS, max_shards=max_shards)
+    store.load(["welcome"])
+    return store
+
+def ids(store: IndexStore) -> list:
+    return sorted(doc_id for doc_id in store.vector_store.index_to_docstore_id.values() if ":" in str(doc_id))
+
+def test_replace_drops_previous_chunks():
+    """A new version of a file replaces its chunks, in memory and after a reload"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.upsert("data/uploads/visa.pdf", V1, chunks("visa old one", "visa old two"))
+        assert store.is_unchanged("data/uploads/visa.pdf", V1)
+        store.upsert("data/uploads/visa.pdf", V2, chunks("visa new"))
+        assert ids(store) == [f"{V2[:16]}:0"]
+        assert ids(open_store(tmp)) == [f"{V2[:16]}:0"]
+        assert [hit for hit, _ in store.lexical.search("old")] == []
+
+def test_tombstones_after_compaction():
+    """Chunks replaced after a compaction are tombstoned in the base until the next one"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.upsert("data/uploads/visa.pdf", V1, chunks("visa old"))
+        store.compact()
+        assert current_version(tmp) is not None
+        store.upsert("data/uploads/visa.pdf", V2, chunks("visa new"))
+        assert store.manifest.deleted_ids == [f"{V1[:16]}:0"]
+        assert ids(open_store(tmp)) == [f"{V2[:16]}:0"]
+        store.compact()
+        assert store.manifest.deleted_ids == []
+        assert not os.path.exists(os.path.join(tmp, "shards"))
+        assert ids(open_store(tmp)) == [f"{V2[:16]}:0"]
+
+def test_reupload_of_tombstoned_version():
+    """Going back to a version still tombstoned in the base keeps the re-added chunks"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.upsert("data/uploads/visa.pdf", V1, chunks("visa old"))
+        store.compact()
+        store.upsert("data/uploads/visa.pdf", V2, chunks("visa new"))
+        store.upsert("data/uploads/visa.pdf", V1, chunks("visa old"))
+        assert store.manifest.deleted_ids == []
+        assert ids(store) == [f"{V1[:16]}:0"]
+        assert ids(open_store(tmp)) == [f"{V1[:16]}:0"]
+
+def test_compacts_beyond_max_shards():
+    """Delta shards are folded into the base once there are more than max_shards"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp, max_shards=2)
+        for n, sha256 in enumerate([V1, V2, OTHER]):
+            store.upsert(f"data/uploads/{n}.pdf", sha256, chunks(f"document {n}"))
+        assert all(entry["shard"] is None for entry in store.manifest.documents.values())
+        assert os.path.exists(os.path.join(tmp, "index.faiss"))
+        assert len(ids(open_store(tmp))) == 3
+
+def test_identical_files():
+    """A file edited to match another is no longer skipped, and shares its chunks without duplicating them"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.upsert("data/uploads/a.pdf", V1, chunks("alpha"))
+        store.upsert("data/uploads/b.pdf", V2, chunks("beta"))
+        assert not store.is_unchanged("data/uploads/a.pdf", V2)
+        store.upsert("data/uploads/a.pdf", V2, chunks("beta"))
+        assert store.manifest.documents[os.path.normpath("data/uploads/a.pdf")]["duplicate_of"] == os.path.normpath("data/uploads/b.pdf")
+        assert ids(store) == [f"{V2[:16]}:0"]
+
+        # b changes; a still has the old content and takes its chunks over
+        store.upsert("data/uploads/b.pdf", OTHER, chunks("gamma"))
+        assert ids(open_store(tmp)) == [f"{V2[:16]}:0", f"{OTHER[:16]}:0"]
+        assert "duplicate_of" not in store.manifest.documents[os.path.normpath("data/uploads/a.pdf")]
+
+def test_empty_documents_recorded():
+    """Files without text are recorded by hash, and compacting with no index only writes the manifest"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = IndexStore(tmp, EMBEDDINGS)
+        added = store.bulk_upsert([{"file_path": "data/uploads/scan.pdf", "sha256": V1, "chunks": [], "vectors": []}])
+        assert added == 0 and store.vector_store is None
+        assert IndexStore(tmp, EMBEDDINGS).is_unchanged("data/uploads/scan.pdf", V1)
+
+if __name__ == "__main__":
+    print("🔍 Testing the index store...\n")
+    tests = [
+        test_replace_drops_previous_chunks,
+        test_tombstones_after_compaction,
+        test_reupload_of_tombstoned_version,
+        test_compacts_beyond_max_shards,
+        test_identical_files,
+        test_empty_documents_recorded
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
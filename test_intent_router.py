@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from app.services.intent_router import (
+    BOOKING_LINK,
+    FALLBACK_MESSAGE,
+    FUNCTION_AGENT,
+    GREETING,
+    RAG,
+    WELCOME_BACK_MESSAGE,
+    WELCOME_MESSAGE,
+    IntentRouter
+)
+from app.services.session_store import InMemorySessionStore
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeRAGService:
+    """Records the questions it answers; streams its answer in small chunks"""
+
+    def __init__(self, answer: str = "Bali is sunny in June.", fail: bool = False):
+        self.answer, self.fail, self.questions = answer, fail, []
+
+    async def aget_response(self, text, session_id):
+        self.questions.append(text)
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        return self.answer
+
+    async def astream_response(self, text, session_id):
+        self.questions.append(text)
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        for start in range(0, len(self.answer), 5):
+            yield self.answer[start:start + 5]
+
+class FakeFunctionService:
+    def __init__(self):
+        self.messages = []
+
+    async def process_message(self, text, session_id):
+        self.messages.append(text)
+        return {"output": "Your consultation is scheduled for Monday."}
+
+def make_router(rag=None, stream_replies: bool = False, max_message_chars: int = 4096):
+    return IntentRouter(rag or FakeRAGService(), FakeFunctionService(), InMemorySessionStore(), stream_replies, max_message_chars)
+
+def test_classify():
+    """Each message is classified once by the precompiled rules"""
+    router = make_router()
+    assert router.classify("Hello!") == (GREETING, None)
+    assert router.classify("I want to book a trip to Bali") == (BOOKING_LINK, "Bali")
+    assert router.classify("Can you schedule a call for tomorrow?") == (FUNCTION_AGENT, None)
+    assert router.classify("What is the baggage allowance?") == (RAG, None)
+
+def test_single_handler_per_intent():
+    """Greetings and booking links need no model; other messages reach exactly one handler"""
+    async def run():
+        rag = FakeRAGService()
+        router = make_router(rag)
+        replies = [
+            await router.route("hi", "15550001111"),
+            await router.route("hi", "15550001111"),
+            await router.route("I want to book a trip to New York", "15550001111"),
+            await router.route("Please reserve a consultation", "15550001111"),
+            await router.route("When is the best time to visit Bali?", "15550001111")
+        ]
+        return replies, rag.questions, router.function_service.messages, router.stats()
+
+    replies, questions, agent_messages, stats = asyncio.run(run())
+    assert replies[0] == WELCOME_MESSAGE and replies[1] == WELCOME_BACK_MESSAGE
+    assert replies[2].endswith("/destination/new")
+    assert replies[3] == "Your consultation is scheduled for Monday."
+    assert replies[4] == "Bali is sunny in June."
+    assert questions == ["When is the best time to visit Bali?"]
+    assert agent_messages == ["Please reserve a consultation"]
+    assert stats[GREETING]["count"] == 2 and stats[RAG]["count"] == 1
+
+def test_handler_error_falls_back():
+    """A failing handler is counted as an error and answered with the fallback message"""
+    async def run():
+        router = make_router(FakeRAGService(fail=True))
+        reply = await router.route("What is the refund policy?", "15550001111")
+        streamed = [part async for part in make_router(FakeRAGService(fail=True), stream_replies=True).route_stream("What is the refund policy?", "15550001111")]
+        return reply, streamed, router.stats()
+
+    reply, streamed, stats = asyncio.run(run())
+    assert reply == FALLBACK_MESSAGE
+    assert streamed == [FALLBACK_MESSAGE]
+    assert stats[RAG]["errors"] == 1
+
+def test_route_stream_paragraphs():
+    """With stream_replies, RAG answers are sent paragraph by paragraph; other intents as one message"""
+    async def run():
+        router = make_router(FakeRAGService("Day 1: Ubud.\n\nDay 2: Seminyak.\n\nEnjoy!"), stream_replies=True)
+        rag = [part async for part in router.route_stream("Plan my Bali trip", "15550001111")]
+        greeting = [part async for part in router.route_stream("hi", "15550001111")]
+        return rag, greeting
+
+    rag, greeting = asyncio.run(run())
+    assert rag == ["Day 1: Ubud.", "Day 2: Seminyak.", "Enjoy!"]
+    assert greeting == [WELCOME_MESSAGE]
+
+def test_streamed_messages_within_limit():
+    """Streamed paragraphs longer than the configured message limit are split at word breaks"""
+    async def run():
+        router = make_router(FakeRAGService("Bali has beaches, temples and rice terraces."), stream_replies=True, max_message_chars=20)
+        return [part async for part in router.route_stream("Tell me about Bali", "15550001111")]
+
+    parts = asyncio.run(run())
+    assert " ".join(parts) == "Bali has beaches, temples and rice terraces."
+    assert all(len(part) <= 20 for part in parts) and len(parts) > 1
+
+if __name__ == "__main__":
+    print("🔍 Testing intent routing...\n")
+    tests = [
+        test_classify,
+        test_single_handler_per_intent,
+        test_handler_error_falls_back,
+        test_route_stream_paragraphs,
+        test_streamed_messages_within_limit
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from langchain_core.language_models import FakeListChatModel
+from prometheus_client import REGISTRY
+from app.core.metrics import TokenUsageCallback
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def tokens(direction: str) -> float:
+    return REGISTRY.get_sample_value("travelbot_llm_tokens_total", {"model": "unknown", "direction": direction}) or 0.0
+
+def model(*responses: str) -> FakeListChatModel:
+    return FakeListChatModel(responses=list(responses), callbacks=[TokenUsageCallback()])
+
+def test_every_call_recorded():
+    """Invoked and streamed calls both add input and output tokens"""
+    async def run():
+        llm = model("Rephrased: what is the baggage allowance?", "The allowance is 23kg.")
+        await llm.ainvoke("And for baggage?")
+        return "".join([chunk.content async for chunk in llm.astream("What is the baggage allowance?")])
+
+    before = tokens("input"), tokens("output")
+    answer = asyncio.run(run())
+    assert answer == "The allowance is 23kg."
+    assert tokens("input") > before[0]
+    assert tokens("output") > before[1]
+
+def test_closed_stream_recorded():
+    """A stream closed early still counts its input and the output generated so far"""
+    async def run():
+        stream = model("I don't know, sorry. " * 10).astream("Is travel insurance mandatory?")
+        head = "".join([(await stream.__anext__()).content for _ in range(10)])
+        await stream.aclose()
+        return head
+
+    before = tokens("input"), tokens("output")
+    asyncio.run(run())
+    assert tokens("input") > before[0]
+    assert tokens("output") > before[1]
+
+if __name__ == "__main__":
+    print("🔍 Testing LLM token metrics...\n")
+    tests = [
+        test_every_call_recorded,
+        test_closed_stream_recorded
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from langchain.prompts import PromptTemplate
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from app.services.model_cascade import ModelCascade, ModelTier
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROMPT = PromptTemplate.from_template("{context}\n{chat_history}\nQuestion: {question}")
+INPUTS = {"context": "Checked baggage is limited to 23kg.", "chat_history": "", "question": "What is the baggage allowance?"}
+
+FAST_ANSWER = "You can check in one bag of up to 23kg on every international flight. " * 4
+STRONG_ANSWER = "The allowance is 23kg checked and 7kg in the cabin."
+
+def fail(_):
+    raise RuntimeError("fast model unavailable")
+
+def cascade(fast_answer: str = FAST_ANSWER, fast_llm=None) -> ModelCascade:
+    fast = ModelTier("fast", fast_llm or FakeListChatModel(responses=[fast_answer]), PROMPT, "gpt-3.5-turbo", 0.0005, 0.0015)
+    strong = ModelTier("strong", FakeListChatModel(responses=[STRONG_ANSWER]), PROMPT, "gpt-4", 0.03, 0.06)
+    return ModelCascade(strong, fast, min_retrieval_score=0.3, probe_chars=50)
+
+def answer(model_cascade: ModelCascade, retrieval_score=0.8, complex_query: bool = False) -> str:
+    async def run():
+        return "".join([chunk async for chunk in model_cascade.astream(INPUTS, retrieval_score, complex_query)])
+    return asyncio.run(run())
+
+def test_fast_tier_answers():
+    """A confident fast answer streams through whole and the strong model is never called"""
+    model_cascade = cascade()
+    assert answer(model_cascade) == FAST_ANSWER
+    stats = model_cascade.stats()
+    assert stats["tiers"]["fast"]["answered"] == 1 and stats["tiers"]["fast"]["hit_ratio"] == 1.0
+    assert stats["tiers"]["strong"]["calls"] == 0
+    assert stats["tiers"]["fast"]["output_tokens"] > 0 and stats["cost_usd"] > 0
+
+def test_unknown_answer_escalates():
+    """A fast answer admitting it does not know is discarded for the strong model's"""
+    model_cascade = cascade("I don't know the baggage allowance, sorry. " * 3)
+    assert answer(model_cascade) == STRONG_ANSWER
+    stats = model_cascade.stats()
+    assert stats["escalations"]["unknown"] == 1
+    assert stats["tiers"]["fast"]["calls"] == 1 and stats["tiers"]["strong"]["answered"] == 1
+
+def test_escalates_before_calling_fast():
+    """Complex questions and weak retrieval go straight to the strong model"""
+    model_cascade = cascade()
+    assert answer(model_cascade, complex_query=True) == STRONG_ANSWER
+    assert answer(model_cascade, retrieval_score=0.1) == STRONG_ANSWER
+    stats = model_cascade.stats()
+    assert stats["escalations"]["complex"] == 1 and stats["escalations"]["low_retrieval_score"] == 1
+    assert stats["tiers"]["fast"]["calls"] == 0
+
+def test_fast_error_escalates():
+    """A fast model that fails before the probe completes is replaced by the strong model"""
+    model_cascade = cascade(fast_llm=RunnableLambda(fail))
+    assert answer(model_cascade) == STRONG_ANSWER
+    assert model_cascade.stats()["escalations"]["error"] == 1
+
+if __name__ == "__main__":
+    print("🔍 Testing the model cascade...\n")
+    tests = [
+        test_fast_tier_answers,
+        test_unknown_answer_escalates,
+        test_escalates_before_calling_fast,
+        test_fast_error_escalates
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+from app.services.queue_service import InMemoryMessageQueue, MessageQueueService, QueueFullError, RedisStreamMessageQueue
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class RecordingQueue(InMemoryMessageQueue):
+    """In-memory queue that records which jobs were acknowledged"""
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.acked = 0
+
+    async def ack(self, token):
+        self.acked += 1
+        await super().ack(token)
+
+class FakeStreamRedis:
+    """Just enough of a Redis stream consumer group for RedisStreamMessageQueue"""
+
+    def __init__(self, pending=None):
+        self.entries = []
+        self.pending = list(pending or [])
+        self.autoclaims = 0
+
+    def register_script(self, script):
+        async def xadd(keys, args):
+            maxsize, payload = int(args[0]), args[1]
+            if maxsize and len(self.entries) + len(self.pending) >= maxsize:
+                return None
+            entry_id = f"{len(self.entries) + 1}-0".encode()
+            self.entries.append((entry_id, {b"job": payload.encode()}))
+            return entry_id
+        return xadd
+
+    async def xgroup_create(self, *args, **kwargs):
+        raise Exception("BUSYGROUP Consumer Group name already exists")
+
+    async def xautoclaim(self, *args, **kwargs):
+        self.autoclaims += 1
+        claimed, self.pending = self.pending, []
+        return b"0-0", claimed, []
+
+    async def xreadgroup(self, *args, **kwargs):
+        if not self.entries:
+            await asyncio.sleep(0.01)
+            return []
+        return [(b"stream", [self.entries.pop(0)])]
+
+def test_jobs_acked_after_handling():
+    """Each job is acknowledged once its handler returns, including when it fails"""
+    handled = []
+
+    async def handler(job):
+        if job["text"] == "boom":
+            raise RuntimeError("handler failed")
+        handled.append(job["text"])
+
+    async def run():
+        queue = RecordingQueue()
+        service = MessageQueueService(queue, handler, concurrency=2)
+        await service.start()
+        for text in ["a", "boom", "b"]:
+            await service.enqueue({"text": text})
+        await asyncio.sleep(0.05)
+        stats = await service.stats()
+        await service.stop()
+        return queue, stats
+
+    queue, stats = asyncio.run(run())
+    assert sorted(handled) == ["a", "b"]
+    assert queue.acked == 3
+    assert stats["processed"] == 2 and stats["failed"] == 1 and stats["in_flight"] == 0
+
+def test_deferred_job_acked_when_future_resolves():
+    """A handler that returns a future frees its worker, and the job is acknowledged when the future resolves"""
+    async def run():
+        queue = RecordingQueue()
+        futures = []
+
+        async def handler(job):
+            future = asyncio.get_running_loop().create_future()
+            futures.append(future)
+            return future
+
+        service = MessageQueueService(queue, handler, concurrency=1)
+        await service.start()
+        for i in range(3):
+            await service.enqueue({"text": str(i)})
+        await asyncio.sleep(0.05)
+        # One worker took all three while none had finished
+        in_flight = len(futures), queue.acked
+        for future in futures:
+            future.set_result(None)
+        await asyncio.sleep(0.01)
+        acked = queue.acked
+        await service.stop()
+        return in_flight, acked
+
+    in_flight, acked = asyncio.run(run())
+    assert in_flight == (3, 0)
+    assert acked == 3
+
+def test_capacity_counts_unacked_jobs():
+    """Jobs held by workers count against the queue capacity until acknowledged"""
+    async def run():
+        release = asyncio.Event()
+
+        async def handler(job):
+            await release.wait()
+
+        queue = RecordingQueue(maxsize=2)
+        service = MessageQueueService(queue, handler, concurrency=4, max_pending=2)
+        await service.start()
+        await service.enqueue({"text": "1"})
+        await service.enqueue({"text": "2"})
+        await asyncio.sleep(0.01)
+        try:
+            await service.enqueue({"text": "3"})
+            rejected = False
+        except QueueFullError:
+            rejected = True
+        release.set()
+        await asyncio.sleep(0.01)
+        await service.enqueue({"text": "4"})
+        await asyncio.sleep(0.01)
+        await service.stop()
+        return rejected, queue.acked
+
+    rejected, acked = asyncio.run(run())
+    assert rejected
+    assert acked == 3
+
+def test_cancelled_job_not_acked():
+    """A job cut off by shutdown is left unacknowledged so it can be redelivered"""
+    async def run():
+        started = asyncio.Event()
+
+        async def handler(job):
+            started.set()
+            await asyncio.sleep(60)
+
+        queue = RecordingQueue()
+        service = MessageQueueService(queue, handler, concurrency=1)
+        await service.start()
+        await service.enqueue({"text": "slow"})
+        await started.wait()
+        await service.stop()
+        return queue.acked, service._in_flight
+
+    acked, in_flight = asyncio.run(run())
+    assert acked == 0 and in_flight == 0
+
+def test_redis_queue_reclaims_and_bounds():
+    """Stale pending entries are reclaimed at start and again every claim_idle_ms; a full stream rejects jobs"""
+    async def run():
+        stale = (b"0-1", {b"job": json.dumps({"text": "stale"}).encode()})
+        redis = FakeStreamRedis(pending=[stale])
+        queue = RedisStreamMessageQueue(redis, "stream", "group", claim_idle_ms=200, maxsize=2)
+        await queue.start()
+        first = await queue.get()
+
+        await queue.put({"text": "new"})
+        redis.pending.append((b"0-2", {b"job": json.dumps({"text": "orphaned"}).encode()}))
+        second = await queue.get()
+        await asyncio.sleep(0.25)
+        third = await queue.get()
+
+        await queue.put({"text": "a"})
+        await queue.put({"text": "b"})
+        try:
+            await queue.put({"text": "c"})
+            rejected = False
+        except QueueFullError:
+            rejected = True
+        return [first[1]["text"], second[1]["text"], third[1]["text"]], redis.autoclaims, rejected
+
+    order, autoclaims, rejected = asyncio.run(run())
+    assert order == ["stale", "new", "orphaned"]
+    assert autoclaims >= 2
+    assert rejected
+
+if __name__ == "__main__":
+    print("🔍 Testing the message queue...\n")
+    tests = [
+        test_jobs_acked_after_handling,
+        test_deferred_job_acked_when_future_resolves,
+        test_capacity_counts_unacked_jobs,
+        test_cancelled_job_not_acked,
+        test_redis_queue_reclaims_and_bounds
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
@@ -1,10 +1,10 @@
 from app.services.rag_service import RAGService
+from app.services.index_store import IndexStore
 from app.core.config import get_settings
 import os
 import logging
 import shutil
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
+import tempfile
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,13 +17,6 @@ def count_documents_in_store(vector_store):
     except:
         return 0
 
-def clear_vector_store(vector_store_path):
-    """Delete the existing vector store directory"""
-    if os.path.exists(vector_store_path):
-        logger.info(f"Clearing existing vector store at {vector_store_path}")
-        shutil.rmtree(vector_store_path)
-        logger.info("✅ Vector store cleared")
-
 def process_uploads(rag_service, uploads_dir):
     """Process all PDFs in the uploads directory"""
     if not os.path.exists(uploads_dir):
@@ -79,12 +72,12 @@ def test_rag():
     """Test RAG functionality and check embeddings storage"""
     settings = get_settings()
     
-    # Clear existing vector store
-    vector_store_path = "data/vector_store"
-    clear_vector_store(vector_store_path)
+    # Build a fresh vector store in a temporary directory, leaving data/vector_store untouched
+    vector_store_path = tempfile.mkdtemp(prefix="test_rag_")
+    settings.VECTOR_STORE_PATH = vector_store_path
     
     # Initialize RAG service
-    rag_service = RAGService(None)  # No Redis for this test
+    rag_service = RAGService()
     
     # Process all PDFs in uploads directory
     uploads_dir = "data/uploads"
@@ -92,11 +85,8 @@ def test_rag():
     if process_uploads(rag_service, uploads_dir):
         # Check document count
         try:
-            embeddings = OpenAIEmbeddings(
-                model="text-embedding-3-small",
-                openai_api_key=settings.OPENAI_API_KEY
-            )
-            vector_store = FAISS.load_local(vector_store_path, embeddings)
+            # Load the base snapshot plus delta shards, as the service does
+            vector_store = IndexStore(vector_store_path, rag_service.embeddings).load([])
             doc_count = count_documents_in_store(vector_store)
             logger.info(f"Total document chunks in vector store: {doc_count}")
         except Exception as e:
@@ -108,10 +98,12 @@ def test_rag():
     # Check vector store files
     if os.path.exists(vector_store_path):
         logger.info("\nVector store files:")
-        for file in os.listdir(vector_store_path):
-            file_path = os.path.join(vector_store_path, file)
-            size = os.path.getsize(file_path) / 1024  # Size in KB
-            logger.info(f"- {file} ({size:.2f} KB)")
+        for root, _, files in os.walk(vector_store_path):
+            for file in files:
+                file_path = os.path.join(root, file)
+                size = os.path.getsize(file_path) / 1024  # Size in KB
+                logger.info(f"- {os.path.relpath(file_path, vector_store_path)} ({size:.2f} KB)")
+        shutil.rmtree(vector_store_path)
     else:
         logger.error("❌ Vector store directory not created")
 
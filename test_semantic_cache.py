@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from app.services.semantic_cache import SemanticCache
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Hand-picked vectors: the two baggage questions are near-duplicates, visa is unrelated
+VECTORS = {
+    "What is the baggage allowance?": [1.0, 0.0, 0.0],
+    "How much baggage can I bring?": [0.98, 0.2, 0.0],
+    "Do I need a visa for Japan?": [0.0, 0.0, 1.0],
+    "Is travel insurance mandatory?": [0.0, 1.0, 0.0]
+}
+
+class FixedEmbeddings:
+    async def aembed_query(self, text):
+        return VECTORS[text]
+
+class FakeRedis:
+    """In-process stand-in for the Redis commands the shared cache uses"""
+
+    def __init__(self):
+        self.values, self.hashes, self.sets = {}, {}, {}
+
+    async def get(self, key):
+        value = self.values.get(key)
+        return str(value).encode() if value is not None else None
+
+    async def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def _ranked(self, key):
+        return sorted(self.sets.get(key, {}), key=self.sets.get(key, {}).get)
+
+    async def zrangebyscore(self, key, low, high):
+        low = float(low.lstrip("("))
+        return [str(m).encode() for m in self._ranked(key) if self.sets[key][m] > low]
+
+    async def zrange(self, key, start, stop):
+        ranked = self._ranked(key)
+        stop = stop if stop >= 0 else len(ranked) + stop
+        return [str(m).encode() for m in ranked[start:stop + 1]]
+
+    async def zremrangebyrank(self, key, start, stop):
+        for member in await self.zrange(key, start, stop):
+            del self.sets[key][int(member)]
+
+    async def zadd(self, key, mapping):
+        self.sets.setdefault(key, {}).update({int(m): score for m, score in mapping.items()})
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.sets.get(key, {}).pop(int(member), None)
+
+    async def hset(self, key, mapping):
+        self.hashes[key] = {f: v if isinstance(v, bytes) else str(v).encode() for f, v in mapping.items()}
+
+    async def hmget(self, key, *fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def delete(self, *keys):
+        for key in keys:
+            for store in (self.values, self.hashes, self.sets):
+                store.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.calls = redis, []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+async def ask(cache: SemanticCache, question: str, answer: str = None):
+    """Look a question up, storing the given answer on a miss"""
+    cached, vector = await cache.alookup(question)
+    if cached is None and answer is not None:
+        await cache.astore(question, answer, vector)
+    return cached
+
+def test_near_duplicate_hit():
+    """A reworded question above the threshold is served from the cache; an unrelated one is not"""
+    async def run():
+        cache = SemanticCache(FixedEmbeddings(), threshold=0.9)
+        first = await ask(cache, "What is the baggage allowance?", "23kg checked")
+        reworded = await ask(cache, "How much baggage can I bring?")
+        unrelated = await ask(cache, "Do I need a visa for Japan?")
+        return first, reworded, unrelated, cache.stats()
+
+    first, reworded, unrelated, stats = asyncio.run(run())
+    assert first is None and unrelated is None
+    assert reworded == "23kg checked"
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["hit_rate"] == 0.3333
+
+def test_ttl_and_lru_eviction():
+    """Entries expire after the TTL, and the least recently used go beyond max_entries"""
+    async def run():
+        expiring = SemanticCache(FixedEmbeddings(), ttl_seconds=0)
+        await ask(expiring, "Do I need a visa for Japan?", "Yes")
+        time.sleep(0.01)
+        expired = await ask(expiring, "Do I need a visa for Japan?")
+
+        bounded = SemanticCache(FixedEmbeddings(), max_entries=2)
+        await ask(bounded, "What is the baggage allowance?", "23kg")
+        await ask(bounded, "Do I need a visa for Japan?", "Yes")
+        # Touch baggage so visa is the least recently used
+        await ask(bounded, "What is the baggage allowance?")
+        await ask(bounded, "Is travel insurance mandatory?", "Recommended")
+        visa = await ask(bounded, "Do I need a visa for Japan?")
+        baggage = await ask(bounded, "What is the baggage allowance?")
+        return expired, expiring.stats(), visa, baggage, bounded.stats()
+
+    expired, expiring_stats, visa, baggage, bounded_stats = asyncio.run(run())
+    assert expired is None and expiring_stats["expirations"] == 1
+    assert visa is None and baggage == "23kg"
+    assert bounded_stats["evictions"] == 1
+
+def test_invalidate():
+    """Invalidation drops every cached answer"""
+    async def run():
+        cache = SemanticCache(FixedEmbeddings())
+        await ask(cache, "Do I need a visa for Japan?", "Yes")
+        await cache.ainvalidate()
+        return await ask(cache, "Do I need a visa for Japan?"), cache.stats()
+
+    answer, stats = asyncio.run(run())
+    assert answer is None
+    assert stats["invalidations"] == 1 and stats["entries"] == 0
+
+def test_redis_shared_across_workers():
+    """With Redis, one worker's answer is a hit for another, and invalidation reaches every worker"""
+    async def run():
+        redis = FakeRedis()
+        worker_a = SemanticCache(FixedEmbeddings(), redis_client=redis)
+        worker_b = SemanticCache(FixedEmbeddings(), redis_client=redis)
+        await ask(worker_a, "What is the baggage allowance?", "23kg checked")
+        shared = await ask(worker_b, "How much baggage can I bring?")
+        await worker_b.ainvalidate()
+        after_invalidation = await ask(worker_a, "What is the baggage allowance?")
+        await ask(worker_a, "Do I need a visa for Japan?", "Yes")
+        after_restore = await ask(worker_b, "Do I need a visa for Japan?")
+        return shared, after_invalidation, after_restore
+
+    shared, after_invalidation, after_restore = asyncio.run(run())
+    assert shared == "23kg checked"
+    assert after_invalidation is None
+    assert after_restore == "Yes"
+
+def test_redis_shared_eviction():
+    """Shared entries beyond max_entries are evicted oldest first for every worker"""
+    async def run():
+        redis = FakeRedis()
+        worker_a = SemanticCache(FixedEmbeddings(), max_entries=1, redis_client=redis)
+        worker_b = SemanticCache(FixedEmbeddings(), max_entries=1, redis_client=redis)
+        await ask(worker_a, "Do I need a visa for Japan?", "Yes")
+        await ask(worker_b, "Is travel insurance mandatory?", "Recommended")
+        return await ask(worker_a, "Do I need a visa for Japan?"), await ask(worker_a, "Is travel insurance mandatory?")
+
+    visa, insurance = asyncio.run(run())
+    assert visa is None
+    assert insurance == "Recommended"
+
+if __name__ == "__main__":
+    print("🔍 Testing the semantic response cache...\n")
+    tests = [
+        test_near_duplicate_hit,
+        test_ttl_and_lru_eviction,
+        test_invalidate,
+        test_redis_shared_across_workers,
+        test_redis_shared_eviction
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import SystemMessage
+from app.services.session_memory import RedisSessionMemory, SessionMemory
+from app.utils.tokens import count_tokens
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeRedis:
+    """In-process stand-in for the list and string commands the Redis history uses"""
+
+    def __init__(self):
+        self.lists, self.values = {}, {}
+
+    async def lrange(self, key, start, stop):
+        return [item.encode() for item in self.lists.get(key, [])]
+
+    async def get(self, key):
+        value = self.values.get(key)
+        return value.encode() if value is not None else None
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    async def ltrim(self, key, start, stop):
+        items = self.lists.get(key, [])
+        start = start if start >= 0 else max(len(items) + start, 0)
+        self.lists[key] = items[start:len(items) if stop == -1 else stop + 1]
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.lists.pop(key, None)
+            self.values.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.calls = redis, []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+def turn_tokens(question: str, answer: str) -> int:
+    return count_tokens(question) + count_tokens(answer)
+
+def test_trimmed_oldest_first():
+    """History beyond the token budget is trimmed oldest turn first"""
+    question, answer = "Where should I go in June?", "Bali is dry and sunny in June."
+    budget = 2 * turn_tokens(question, answer)
+
+    async def run():
+        memory = SessionMemory(max_history_tokens=budget)
+        for _ in range(3):
+            await memory.aappend("15550001111", question, answer)
+        return await memory.ahistory("15550001111"), memory.stats()
+
+    history, stats = asyncio.run(run())
+    assert len(history) == 4
+    assert stats["trimmed_turns"] == 1 and stats["summaries"] == 0
+    assert stats["avg_history_tokens"] <= budget
+
+def test_oversized_latest_turn_truncated():
+    """A latest turn larger than the whole budget is truncated to fit"""
+    async def run():
+        memory = SessionMemory(max_history_tokens=50)
+        await memory.aappend("15550001111", "Tell me everything about Japan", "Japan is wonderful. " * 200)
+        return await memory.ahistory("15550001111"), memory.stats()
+
+    history, stats = asyncio.run(run())
+    assert len(history) == 2
+    assert history[0].content == "Tell me everything about Japan"
+    assert turn_tokens(history[0].content, history[1].content) <= 50
+    assert stats["avg_history_tokens"] <= 50
+
+def test_trimmed_turns_summarized():
+    """With a summary LLM, trimmed turns are folded into a summary passed ahead of the recent turns"""
+    question, answer = "What is the baggage allowance?", "23kg checked and 7kg cabin."
+
+    async def run():
+        llm = FakeListChatModel(responses=["The user asked about baggage."])
+        memory = SessionMemory(max_history_tokens=turn_tokens(question, answer), summary_llm=llm)
+        await memory.aappend("15550001111", question, answer)
+        await memory.aappend("15550001111", "Do I need a visa?", "Not for short stays.")
+        return await memory.ahistory("15550001111"), memory.stats()
+
+    history, stats = asyncio.run(run())
+    assert isinstance(history[0], SystemMessage)
+    assert "The user asked about baggage." in history[0].content
+    assert [m.content for m in history[1:]] == ["Do I need a visa?", "Not for short stays."]
+    assert stats["summaries"] == 1 and stats["summarized_sessions"] == 1
+
+def test_sessions_expire_and_evict():
+    """Idle sessions expire after the TTL, and the least recently used are evicted beyond max_sessions"""
+    async def run():
+        expiring = SessionMemory(ttl_seconds=0)
+        await expiring.aappend("15550001111", "hi", "hello")
+        time.sleep(0.01)
+        expired = await expiring.ahistory("15550001111")
+
+        bounded = SessionMemory(max_sessions=2)
+        for sender in ["15550001111", "15550002222"]:
+            await bounded.aappend(sender, "hi", "hello")
+        # Touch the first sender so the second is the least recently used
+        await bounded.ahistory("15550001111")
+        await bounded.aappend("15550003333", "hi", "hello")
+        kept = [bool(await bounded.ahistory(sender)) for sender in ["15550001111", "15550002222", "15550003333"]]
+        return expired, expiring.stats(), kept, bounded.stats()
+
+    expired, expiring_stats, kept, bounded_stats = asyncio.run(run())
+    assert expired == [] and expiring_stats["expirations"] == 1
+    assert kept == [True, False, True]
+    assert bounded_stats["evictions"] == 1 and bounded_stats["sessions"] == 2
+
+def test_redis_history_shared_and_summarized():
+    """The Redis history is visible to every worker, and turns over budget move into the shared summary"""
+    question, answer = "What is the baggage allowance?", "23kg checked and 7kg cabin."
+
+    async def run():
+        redis = FakeRedis()
+        llm = FakeListChatModel(responses=["The user asked about baggage."])
+        budget = turn_tokens(question, answer)
+        worker_a = RedisSessionMemory(redis, max_history_tokens=budget, summary_llm=llm)
+        worker_b = RedisSessionMemory(redis, max_history_tokens=budget)
+        await worker_a.aappend("15550001111", question, answer)
+        shared = await worker_b.ahistory("15550001111")
+        await worker_a.aappend("15550001111", "Do I need a visa?", "Not for short stays.")
+        summarized = await worker_b.ahistory("15550001111")
+        await worker_b.aclear("15550001111")
+        return shared, summarized, await worker_a.ahistory("15550001111")
+
+    shared, summarized, cleared = asyncio.run(run())
+    assert [m.content for m in shared] == [question, answer]
+    assert "The user asked about baggage." in summarized[0].content
+    assert [m.content for m in summarized[1:]] == ["Do I need a visa?", "Not for short stays."]
+    assert cleared == []
+
+if __name__ == "__main__":
+    print("🔍 Testing session memory...\n")
+    tests = [
+        test_trimmed_oldest_first,
+        test_oversized_latest_turn_truncated,
+        test_trimmed_turns_summarized,
+        test_sessions_expire_and_evict,
+        test_redis_history_shared_and_summarized
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from app.services.session_store import InMemorySessionStore, RedisSessionStore, is_first_message
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeRedis:
+    """In-process stand-in for the hash commands the Redis session store uses"""
+
+    def __init__(self):
+        self.hashes = {}
+
+    async def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = str(int(fields.get(field, b"0")) + amount).encode()
+        return int(fields[field])
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value).encode()
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def hgetall(self, key):
+        return {field.encode(): value for field, value in self.hashes.get(key, {}).items()}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.calls = redis, []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+class BrokenStore:
+    async def touch(self, session_id):
+        raise ConnectionError("redis unavailable")
+
+def test_message_counts():
+    """Each touch counts a message, and only the first is reported as the first message"""
+    async def run():
+        store = InMemorySessionStore()
+        first = [await is_first_message(store, "15550001111") for _ in range(3)]
+        return first, await store.get("15550001111"), await store.get("15550002222")
+
+    first, session, unknown = asyncio.run(run())
+    assert first == [True, False, False]
+    assert session["message_count"] == 3
+    assert unknown == {}
+
+def test_sessions_expire_and_evict():
+    """An idle session starts over after the TTL, and the least recently seen are evicted beyond max_sessions"""
+    async def run():
+        expiring = InMemorySessionStore(ttl_seconds=0)
+        await expiring.touch("15550001111")
+        time.sleep(0.01)
+        restarted = await expiring.touch("15550001111")
+
+        bounded = InMemorySessionStore(max_sessions=2)
+        for sender in ["15550001111", "15550002222", "15550001111", "15550003333"]:
+            await bounded.touch(sender)
+        kept = [bool(await bounded.get(sender)) for sender in ["15550001111", "15550002222", "15550003333"]]
+        return restarted, kept
+
+    restarted, kept = asyncio.run(run())
+    assert restarted == 1
+    assert kept == [True, False, True]
+
+def test_redis_counts_shared():
+    """With Redis, counts are shared by every worker"""
+    async def run():
+        redis = FakeRedis()
+        worker_a, worker_b = RedisSessionStore(redis), RedisSessionStore(redis)
+        first = await is_first_message(worker_a, "15550001111")
+        second = await is_first_message(worker_b, "15550001111")
+        return first, second, await worker_a.get("15550001111")
+
+    first, second, session = asyncio.run(run())
+    assert first and not second
+    assert session["message_count"] == 2 and session["last_seen"] > 0
+
+def test_error_treated_as_first_message():
+    """A store error is treated as a first message rather than failing the reply"""
+    assert asyncio.run(is_first_message(BrokenStore(), "15550001111"))
+
+if __name__ == "__main__":
+    print("🔍 Testing the session store...\n")
+    tests = [
+        test_message_counts,
+        test_sessions_expire_and_evict,
+        test_redis_counts_shared,
+        test_error_treated_as_first_message
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")
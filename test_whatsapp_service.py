@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from app.services.whatsapp_service import WhatsAppService
+from app.utils.fake_graph_api import FakeGraphAPI
+from app.utils.message_chunks import stream_paragraphs
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def make_service(fake: FakeGraphAPI) -> WhatsAppService:
+    """WhatsAppService pointed at the local stand-in Graph API"""
+    service = WhatsAppService()
+    service.base_url = fake.base_url
+    service.phone_number_id = "1234567890"
+    service.headers["Authorization"] = "Bearer test-token"
+    return service
+
+def test_send_message():
+    """A reply is posted to the messages endpoint and its message id returned"""
+    async def run():
+        with FakeGraphAPI() as fake:
+            service = make_service(fake)
+            result = await service.send_message("15550001111", "Hello from the test")
+            await service.aclose()
+            return fake, result
+
+    fake, result = asyncio.run(run())
+    assert result["status"] == "success"
+    assert result["message_id"].startswith("wamid.")
+    request = fake.requests[0]
+    assert request["path"] == "/v17.0/1234567890/messages"
+    assert request["headers"]["Authorization"].startswith("Bearer ")
+    assert request["json"]["text"]["body"] == "Hello from the test"
+
+def test_connection_reuse():
+    """Sequential and concurrent sends share pooled keep-alive connections"""
+    async def run():
+        with FakeGraphAPI(latency=0.01) as fake:
+            service = make_service(fake)
+            for i in range(10):
+                await service.send_message("15550001111", f"sequential {i}")
+            sequential_connections = len(fake.connections)
+            await asyncio.gather(*[
+                service.send_message("15550001111", f"concurrent {i}") for i in range(20)
+            ])
+            await service.aclose()
+            return fake, sequential_connections
+
+    fake, sequential_connections = asyncio.run(run())
+    assert sequential_connections == 1
+    assert len(fake.requests) == 30
+    # Concurrent sends open at most the pool limit, never one connection per message
+    assert len(fake.connections) <= 20
+
+def test_error_response():
+    """Graph API errors are reported, not raised"""
+    async def run():
+        with FakeGraphAPI(status_code=500) as fake:
+            service = make_service(fake)
+            result = await service.send_message("15550001111", "Hello")
+            await service.aclose()
+            return result
+
+    result = asyncio.run(run())
+    assert result["status"] == "error"
+
+def test_client_recreated_after_close():
+    """Closing on shutdown releases the pool; a later send opens a new one"""
+    async def run():
+        with FakeGraphAPI() as fake:
+            service = make_service(fake)
+            await service.send_message("15550001111", "first")
+            await service.aclose()
+            assert service._client is None
+            result = await service.send_message("15550001111", "second")
+            await service.aclose()
+            return fake, result
+
+    fake, result = asyncio.run(run())
+    assert result["status"] == "success"
+    assert len(fake.connections) == 2
+
+def test_parse_webhook_batch():
+    """Every text message in a batched webhook is parsed; statuses and media are skipped"""
+    def message(message_id, text):
+        return {"from": "15550001111", "id": message_id, "timestamp": "1700000000", "type": "text", "text": {"body": text}}
+
+    data = {"entry": [
+        {"changes": [
+            {"value": {"messages": [message("m1", "I want Bali"), message("m2", "in June")]}},
+            {"value": {"statuses": [{"id": "m0", "status": "read"}]}}
+        ]},
+        {"changes": [
+            {"value": {"messages": [{"from": "15550002222", "id": "m3", "type": "image", "image": {}}, message("m4", "hello")]}}
+        ]}
+    ]}
+    messages = WhatsAppService().parse_webhook(data)
+    assert [m["message_id"] for m in messages] == ["m1", "m2", "m4"]
+    assert messages[1]["message"] == "in June"
+    assert WhatsAppService().parse_webhook({"object": "whatsapp_business_account"}) == []
+
+def test_long_message_split():
+    """Text over the WhatsApp body limit is sent as several ordered messages split at paragraph breaks"""
+    paragraphs = [f"Day {day}:" + " sightseeing" * 100 for day in range(1, 9)]
+    text = "\n\n".join(paragraphs)
+
+    async def run():
+        with FakeGraphAPI() as fake:
+            service = make_service(fake)
+            result = await service.send_message("15550001111", text)
+            await service.aclose()
+            return fake, result
+
+    fake, result = asyncio.run(run())
+    bodies = [request["json"]["text"]["body"] for request in fake.requests]
+    assert result["status"] == "success"
+    assert len(bodies) > 1 and len(result["message_ids"]) == len(bodies)
+    assert all(len(body) <= 4096 for body in bodies)
+    assert bodies[0].startswith("Day 1:") and bodies[1].startswith("Day ")
+    assert "\n\n".join(bodies) == text
+
+def test_stream_paragraphs():
+    """Streamed chunks are regrouped into completed paragraphs as soon as each one ends"""
+    async def chunks():
+        for chunk in ["Day 1: Ar", "rive.\n", "\nDay 2", ": Tour.\n\n", "x" * 5000]:
+            yield chunk
+
+    async def run():
+        return [paragraph async for paragraph in stream_paragraphs(chunks())]
+
+    paragraphs = asyncio.run(run())
+    assert paragraphs[:2] == ["Day 1: Arrive.", "Day 2: Tour."]
+    assert [len(paragraph) for paragraph in paragraphs[2:]] == [4096, 904]
+
+if __name__ == "__main__":
+    print("🔍 Testing WhatsApp service against a local Graph API stand-in...\n")
+    tests = [
+        test_send_message,
+        test_connection_reuse,
+        test_error_response,
+        test_client_recreated_after_close,
+        test_parse_webhook_batch,
+        test_long_message_split,
+        test_stream_paragraphs
+    ]
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}: {e}")